@@ -12,6 +12,7 @@ from app.core.database import Base
 from app.core.config import settings
 from app.models.session import Session  # noqa
 from app.models.conversation import Conversation  # noqa
+from app.models.counter import Counter  # noqa
 
 # this is the Alembic Config object
 config = context.config
@@ -0,0 +1,29 @@
+"""Add checkpointed_at column to conversation table
+
+Revision ID: add_conversation_checkpointed_at
+Revises: add_pagination_indexes
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_conversation_checkpointed_at'
+down_revision: Union[str, None] = 'add_pagination_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('conversations',
+        sa.Column('checkpointed_at', sa.DateTime(), nullable=True,
+                 comment='Last checkpoint or heartbeat of the run producing the response')
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('conversations', 'checkpointed_at')
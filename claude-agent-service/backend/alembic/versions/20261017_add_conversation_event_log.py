@@ -0,0 +1,34 @@
+"""Add event_log and event_count columns to conversation table
+
+Revision ID: add_conversation_event_log
+Revises: add_session_run_fence
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_conversation_event_log'
+down_revision: Union[str, None] = 'add_session_run_fence'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('conversations',
+        sa.Column('event_log', sa.String(length=100), nullable=True,
+                 comment='Event log path relative to EVENT_LOG_ROOT')
+    )
+    op.add_column('conversations',
+        sa.Column('event_count', sa.Integer(), nullable=True,
+                 comment='Number of events in the event log')
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('conversations', 'event_count')
+    op.drop_column('conversations', 'event_log')
@@ -0,0 +1,31 @@
+"""Add status column to conversation table
+
+Revision ID: add_conversation_status
+Revises: add_tool_calls
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_conversation_status'
+down_revision: Union[str, None] = 'add_tool_calls'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing conversations were only written once finished
+    op.add_column('conversations',
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='completed',
+                 comment='in_progress while streaming, then completed or aborted')
+    )
+    op.alter_column('conversations', 'status', server_default=None)
+
+
+def downgrade() -> None:
+    op.drop_column('conversations', 'status')
@@ -0,0 +1,42 @@
+"""Add counters table
+
+Revision ID: add_counters
+Revises: add_conversation_event_log
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_counters'
+down_revision: Union[str, None] = 'add_conversation_event_log'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('counters',
+        sa.Column('name', sa.String(length=100), nullable=False,
+                 comment='sessions:active, sessions:total or conversations:<session_id>'),
+        sa.Column('value', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+    # Seed the counters from the existing rows
+    op.execute(
+        "INSERT INTO counters (name, value) "
+        "SELECT 'sessions:active', COUNT(*) FROM sessions WHERE is_active"
+    )
+    op.execute("INSERT INTO counters (name, value) SELECT 'sessions:total', COUNT(*) FROM sessions")
+    op.execute(
+        "INSERT INTO counters (name, value) "
+        "SELECT 'conversations:' || session_id, COUNT(*) FROM conversations GROUP BY session_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('counters')
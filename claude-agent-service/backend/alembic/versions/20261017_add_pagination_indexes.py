@@ -0,0 +1,27 @@
+"""Add composite indexes for keyset pagination
+
+Revision ID: add_pagination_indexes
+Revises: add_counters
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_pagination_indexes'
+down_revision: Union[str, None] = 'add_counters'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_conversations_session_id_created_at', 'conversations', ['session_id', 'created_at'])
+    op.create_index('ix_sessions_is_active_created_at', 'sessions', ['is_active', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sessions_is_active_created_at', table_name='sessions')
+    op.drop_index('ix_conversations_session_id_created_at', table_name='conversations')
@@ -0,0 +1,29 @@
+"""Add run_fence column to session table
+
+Revision ID: add_session_run_fence
+Revises: add_conversation_status
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_session_run_fence'
+down_revision: Union[str, None] = 'add_conversation_status'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('sessions',
+        sa.Column('run_fence', sa.BigInteger(), nullable=True,
+                 comment='Fencing token of the last run lock that wrote to this session')
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('sessions', 'run_fence')
@@ -0,0 +1,32 @@
+"""Add partial index for the stale conversation sweep
+
+Revision ID: add_stale_conversation_index
+Revises: add_conversation_checkpointed_at
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_stale_conversation_index'
+down_revision: Union[str, None] = 'add_conversation_checkpointed_at'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_conversations_in_progress_checkpoint',
+        'conversations',
+        [sa.text('coalesce(checkpointed_at, created_at)')],
+        postgresql_where=sa.text("status = 'in_progress'"),
+        sqlite_where=sa.text("status = 'in_progress'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_conversations_in_progress_checkpoint', table_name='conversations')
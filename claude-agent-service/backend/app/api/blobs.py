@@ -0,0 +1,83 @@
+"""
+Blob API endpoints
+"""
+import re
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import StreamingResponse
+
+from app.services.blob_store import blob_store, DIGEST_PATTERN
+
+router = APIRouter(prefix="/api/blobs", tags=["blobs"])
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(range_header: str, size: int) -> tuple[int, int]:
+    """Parse a single-range Range header into inclusive (start, end)"""
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match or match.groups() == ("", ""):
+        raise HTTPException(status_code=416, detail="Only a single byte range is supported")
+
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        start, end = max(0, size - length), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+@router.get("/{digest}")
+async def get_blob(
+    digest: str,
+    range_header: Optional[str] = Header(None, alias="Range")
+):
+    """
+    Fetch an offloaded tool result
+
+    Supports a single HTTP byte range (``Range: bytes=0-65535``) so large
+    results can be paged instead of downloaded at once.
+    """
+    if not DIGEST_PATTERN.match(digest):
+        raise HTTPException(status_code=400, detail="Invalid blob digest")
+
+    size = blob_store.size(digest)
+    if size is None:
+        raise HTTPException(status_code=404, detail=f"Blob {digest} not found")
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{digest}"',
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
+
+    status_code = 200
+    start, end = 0, size - 1
+    if range_header and size > 0:
+        start, end = parse_range(range_header, size)
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    headers["Content-Length"] = str(end - start + 1 if size > 0 else 0)
+
+    media_type = await blob_store.media_type(digest)
+    if media_type.startswith("text/") or media_type == "application/json":
+        # Tool results are stored as UTF-8
+        media_type += "; charset=utf-8"
+
+    return StreamingResponse(
+        blob_store.read_range(digest, start, end),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers
+    )
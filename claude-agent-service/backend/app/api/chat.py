@@ -1,382 +1,296 @@
 """
 Chat API endpoints
 """
-import json
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from claude_agent_sdk import (
-    ClaudeSDKClient,
-    ClaudeAgentOptions,
-    AssistantMessage,
-    TextBlock,
-    ToolUseBlock,
-    ResultMessage,
-    SystemMessage,
-    UserMessage,
-    ToolResultBlock
-)
-
-# Try to import StreamEvent, it might not be available in all SDK versions
-try:
-    from claude_agent_sdk import StreamEvent
-    HAS_STREAM_EVENT = True
-except ImportError:
-    StreamEvent = None
-    HAS_STREAM_EVENT = False
-
 from app.core.database import get_db
-from app.core.config import settings
+from app.core.metrics import CHAT_STAGE_SECONDS
+from app.core.tracing import tracer
 from app.services.session import session_service
-from app.schemas.chat import ChatRequest
+from app.services.cache import cache_service
+from app.services.activity import session_activity
+from app.models.conversation import ConversationStatus
+from app.services.client_pool import client_pool
+from app.services.standby_pool import standby_pool
+from app.services.event_stream import event_stream_service
+from app.services.event_log import event_log_service
+from app.services.run_engine import AgentRun, run_engine
+from app.services.run_scheduler import run_scheduler, QueueFullError
+from app.services.replay_cache import replay_cache
+from app.services.run_lock import run_lock_service, LockBusyError
+from app.schemas.chat import ChatRequest, EventSubscription
+from app.utils.sse import SSEWriter, encode_frame
+from app.utils.compression import compress_stream, negotiate
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no"
+}
 
-def get_claude_env() -> dict:
-    """Get Claude environment variables"""
-    return {
-        'ANTHROPIC_BEDROCK_BASE_URL': settings.ANTHROPIC_BEDROCK_BASE_URL,
-        'CLAUDE_CODE_SKIP_BEDROCK_AUTH': settings.CLAUDE_CODE_SKIP_BEDROCK_AUTH,
-        'CLAUDE_CODE_USE_BEDROCK': settings.CLAUDE_CODE_USE_BEDROCK,
-        'ANTHROPIC_AUTH_TOKEN': settings.ANTHROPIC_AUTH_TOKEN,
-        'ANTHROPIC_SMALL_FAST_MODEL': settings.ANTHROPIC_SMALL_FAST_MODEL,
-        'ANTHROPIC_MODEL': settings.ANTHROPIC_MODEL
-    }
 
+def event_stream_response(frames, accept_encoding: Optional[str]) -> StreamingResponse:
+    """SSE response, compressed per event when the client accepts gzip or brotli"""
+    headers = dict(SSE_HEADERS)
+    encoding = negotiate(accept_encoding)
+    if encoding:
+        frames = compress_stream(frames, encoding)
+        headers["Content-Encoding"] = encoding
+        headers["Vary"] = "Accept-Encoding"
 
-def get_claude_options(workspace_path: str, permission_mode: str = "acceptEdits",
-                      claude_session_id: str = None, max_turns: int = None) -> ClaudeAgentOptions:
-    """Get Claude Agent options"""
-    from pathlib import Path
-
-    settings_path = str(Path(workspace_path) / ".claude" / "settings.local.json")
-
-    options = ClaudeAgentOptions(
-        env=get_claude_env(),
-        cwd=workspace_path,
-        permission_mode=permission_mode,
-        system_prompt={
-            "type": "preset",
-            "preset": "claude_code"
-        },
-        setting_sources=['project'],
-        settings=settings_path,
-        include_partial_messages=True  # Enable streaming
+    return StreamingResponse(
+        frames,
+        media_type="text/event-stream",
+        headers=headers
     )
 
-    # Use Claude session ID to resume conversation
-    if claude_session_id:
-        options.resume = claude_session_id
 
-    if max_turns:
-        options.max_turns = max_turns
+async def start_chat_run(request: ChatRequest, db: AsyncSession) -> AgentRun:
+    """Resolve the session, record the conversation and start its agent run"""
+    with tracer.start_trace("chat.request") as span:
+        # Get or create session
+        session_id = request.session_id
+        with CHAT_STAGE_SECONDS.time(stage="session_lookup"), tracer.start_as_current_span("chat.session_lookup"):
+            if not session_id:
+                # Auto-create session
+                session = await session_service.create_session(db)
+                session_id = session.id
+            else:
+                session = await session_service.get_session_info(db, session_id)
+        span.set_attribute("session_id", session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+
+        # Reserve a run slot before recording anything; shed load when the queue is full.
+        # Requests for a session that is already running here wait in its FIFO queue.
+        try:
+            ticket = run_scheduler.enqueue(session_id)
+        except QueueFullError as e:
+            raise HTTPException(
+                status_code=429,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
 
-    return options
+        lease = None
+        try:
+            # Only one run per session across all workers. A run admitted right away takes the
+            # lock now, so a run on another worker is a 409 in reject mode; queued runs and
+            # runs in wait mode take it from inside the run once admitted.
+            if ticket.granted.is_set() and run_lock_service.mode == "reject":
+                try:
+                    with tracer.start_as_current_span("chat.run_lock"):
+                        lease = await run_lock_service.acquire(session_id)
+                except LockBusyError as e:
+                    raise HTTPException(status_code=409, detail=str(e))
+
+            # Create conversation record
+            with CHAT_STAGE_SECONDS.time(stage="conversation_insert"), \
+                    tracer.start_as_current_span("chat.conversation_insert"):
+                conversation = await session_service.create_conversation(
+                    db=db,
+                    session_id=session_id,
+                    user_message=request.message,
+                    permission_mode=request.permission_mode or "acceptEdits",
+                    resume_id=request.resume,
+                    max_turns=request.max_turns
+                )
+                await db.commit()
+        except Exception:
+            run_scheduler.release(ticket)
+            if lease is not None:
+                await lease.release()
+            raise
+
+        tracer.bind(conversation.id)
+        span.set_attribute("conversation_id", conversation.id)
+
+        # Run the agent in the background; callers follow it through run_engine.events.
+        # The run's task inherits this context, so its spans join the same trace.
+        return run_engine.start(
+            session_id=session_id,
+            conversation_id=conversation.id,
+            workspace_path=session.workspace_path,
+            claude_session_id=session.claude_session_id,
+            request=request,
+            ticket=ticket,
+            lease=lease
+        )
 
 
 @router.post("/stream")
 async def chat_stream(
     request: ChatRequest,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    accept_encoding: Optional[str] = Header(None)
 ):
     """Stream chat responses from Claude Agent"""
+    run = await start_chat_run(request, db)
 
-    # Get or create session
-    session_id = request.session_id
-    if not session_id:
-        # Auto-create session
-        session = await session_service.create_session(db)
-        await db.commit()
-        session_id = session.id
-    else:
-        session = await session_service.get_session(db, session_id)
-        if not session:
-            raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    async def generate():
+        """Generate streaming response"""
+        async for event_id, payload in run_engine.events(run.conversation_id, event_types=request.event_types()):
+            yield encode_frame(payload, event_id)
 
-    # Create conversation record
-    conversation = await session_service.create_conversation(
-        db=db,
-        session_id=session_id,
-        user_message=request.message,
-        permission_mode=request.permission_mode or "acceptEdits",
-        resume_id=request.resume,
-        max_turns=request.max_turns
-    )
-    await db.commit()
+    return event_stream_response(generate(), accept_encoding)
+
+
+@router.get("/{conversation_id}/events")
+async def chat_events(
+    conversation_id: str,
+    last_event_id: Optional[int] = Query(None, ge=0, description="Replay events after this ID"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    profile: Optional[Literal["minimal", "ui", "full"]] = Query(None, description="Event profile to stream"),
+    accept_encoding: Optional[str] = Header(None)
+):
+    """
+    Resume a conversation's event stream
+
+    Replays recorded events after Last-Event-ID (header or query parameter) and
+    then follows the live run until it finishes. Every event is recorded;
+    profile narrows what this stream sends.
+    """
+    after = last_event_id
+    if after is None and last_event_id_header:
+        try:
+            after = int(last_event_id_header)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    if not run_engine.get(conversation_id) and not await event_stream_service.exists(conversation_id):
+        raise HTTPException(status_code=404, detail=f"No event stream for conversation {conversation_id}")
 
-    conversation_id = conversation.id
-    workspace_path = session.workspace_path
+    event_types = EventSubscription(profile=profile).event_types() if profile else None
 
     async def generate():
-        """Generate streaming response"""
-        import logging
-        logger = logging.getLogger(__name__)
+        async for event_id, payload in run_engine.events(conversation_id, after or 0, event_types):
+            yield encode_frame(payload, event_id)
 
-        collected_response = []
-        claude_session_id_from_sdk = None
-        tool_calls_history = []  # Store all tool calls with results
-        full_response_from_result = ""  # Store text from ResultMessage
+    return event_stream_response(generate(), accept_encoding)
 
-        try:
-            logger.info(f"Starting stream for session {session_id}, message: {request.message[:50]}...")
-
-            # Send initial connection event
-            yield f"data: {json.dumps({'type': 'connected', 'session_id': session_id})}\n\n"
-            # Get Claude options - use existing Claude session ID if available
-            options = get_claude_options(
-                workspace_path=workspace_path,
-                permission_mode=request.permission_mode or "acceptEdits",
-                claude_session_id=session.claude_session_id or request.resume,
-                max_turns=request.max_turns
-            )
 
-            # Create Claude client
-            logger.info("Creating Claude SDK client...")
-            async with ClaudeSDKClient(options=options) as client:
-                # Send query
-                logger.info("Sending query to Claude...")
-                await client.query(request.message)
-                logger.info("Query sent, waiting for response...")
-
-                # Stream responses
-                async for message in client.receive_response():
-                    # Handle StreamEvent for real-time streaming
-                    if HAS_STREAM_EVENT and StreamEvent and isinstance(message, StreamEvent):
-                        event = message.event
-                        event_type = event.get("type")
-
-                        # Stream text deltas in real-time
-                        if event_type == "content_block_delta":
-                            delta = event.get("delta", {})
-
-                            # Text delta
-                            if delta.get("type") == "text_delta":
-                                text_chunk = delta.get("text", "")
-                                collected_response.append(text_chunk)
-
-                                # Send streaming text chunk
-                                event_data = {
-                                    "type": "text_delta",
-                                    "content": text_chunk,
-                                    "session_id": session_id,
-                                    "conversation_id": conversation_id
-                                }
-                                yield f"data: {json.dumps(event_data)}\n\n"
-
-                            # Tool input delta (工具调用参数的流式输入)
-                            elif delta.get("type") == "input_json_delta":
-                                partial_json = delta.get("partial_json", "")
-                                event_data = {
-                                    "type": "tool_input_delta",
-                                    "partial_json": partial_json,
-                                    "session_id": session_id,
-                                    "conversation_id": conversation_id
-                                }
-                                yield f"data: {json.dumps(event_data)}\n\n"
-
-                        # Content block start (文本或工具调用开始)
-                        elif event_type == "content_block_start":
-                            content_block = event.get("content_block", {})
-                            block_type = content_block.get("type")
-
-                            event_data = {
-                                "type": "content_block_start",
-                                "block_type": block_type,
-                                "index": event.get("index"),
-                                "session_id": session_id,
-                                "conversation_id": conversation_id
-                            }
-
-                            # 如果是工具调用,包含工具信息
-                            if block_type == "tool_use":
-                                event_data["tool"] = {
-                                    "id": content_block.get("id"),
-                                    "name": content_block.get("name")
-                                }
-
-                            yield f"data: {json.dumps(event_data)}\n\n"
-
-                        # Send other stream events
-                        elif event_type in ["message_start", "content_block_stop", "message_delta", "message_stop"]:
-                            event_data = {
-                                "type": "stream_event",
-                                "event_type": event_type,
-                                "data": event,
-                                "session_id": session_id,
-                                "conversation_id": conversation_id
-                            }
-                            yield f"data: {json.dumps(event_data)}\n\n"
-
-                    # Handle complete AssistantMessage
-                    elif isinstance(message, AssistantMessage):
-                        for block in message.content:
-                            # Tool use block (工具调用完成)
-                            if isinstance(block, ToolUseBlock):
-                                # Store tool call
-                                tool_call_record = {
-                                    "id": block.id,
-                                    "name": block.name,
-                                    "input": block.input,
-                                    "result": None,
-                                    "is_error": False
-                                }
-                                tool_calls_history.append(tool_call_record)
-
-                                event_data = {
-                                    "type": "tool_use",
-                                    "tool": {
-                                        "id": block.id,
-                                        "name": block.name,
-                                        "input": block.input
-                                    },
-                                    "session_id": session_id,
-                                    "conversation_id": conversation_id
-                                }
-                                yield f"data: {json.dumps(event_data)}\n\n"
-
-                            # Text block (完整文本,通常已通过 delta 发送)
-                            elif isinstance(block, TextBlock):
-                                # Text already streamed via deltas
-                                pass
-
-                    # Handle UserMessage (工具执行结果)
-                    elif isinstance(message, UserMessage):
-                        for block in message.content:
-                            if isinstance(block, ToolResultBlock):
-                                # Update tool call with result
-                                for tool_call in tool_calls_history:
-                                    if tool_call["id"] == block.tool_use_id:
-                                        tool_call["result"] = block.content
-                                        tool_call["is_error"] = block.is_error
-                                        break
-
-                                event_data = {
-                                    "type": "tool_result",
-                                    "tool_use_id": block.tool_use_id,
-                                    "content": block.content,
-                                    "is_error": block.is_error,
-                                    "session_id": session_id,
-                                    "conversation_id": conversation_id
-                                }
-                                yield f"data: {json.dumps(event_data)}\n\n"
-
-                    # Handle ResultMessage
-                    elif isinstance(message, ResultMessage):
-                        # Store the complete response text
-                        full_response_from_result = message.result
-
-                        # Send result message
-                        event_data = {
-                            "type": "result",
-                            "data": {
-                                "subtype": message.subtype,
-                                "is_error": message.is_error,
-                                "duration_ms": message.duration_ms,
-                                "total_cost_usd": message.total_cost_usd,
-                                "num_turns": message.num_turns,
-                                "usage": message.usage,
-                                "result": message.result
-                            },
-                            "session_id": session_id,
-                            "conversation_id": conversation_id
-                        }
-                        yield f"data: {json.dumps(event_data)}\n\n"
-
-                    # Handle SystemMessage
-                    elif isinstance(message, SystemMessage):
-                        # Capture Claude session ID from system message
-                        if message.subtype == "init" and message.data:
-                            claude_session_id_from_sdk = message.data.get("session_id")
-
-                        # Send system message
-                        event_data = {
-                            "type": "system",
-                            "subtype": message.subtype,
-                            "data": message.data,
-                            "session_id": session_id,
-                            "conversation_id": conversation_id
-                        }
-                        yield f"data: {json.dumps(event_data)}\n\n"
-
-            # Update conversation with response
-            # Use ResultMessage.result if no streaming text was collected
-            full_response = "".join(collected_response) if collected_response else full_response_from_result
-
-            logger.info(f"Saving response: {len(full_response)} chars, {len(tool_calls_history)} tool calls")
-
-            # Use a new database session from the same engine
-            from app.core.database import AsyncSessionLocal
-            async with AsyncSessionLocal() as update_db:
-                try:
-                    await session_service.update_conversation_response(
-                        update_db,
-                        conversation_id,
-                        full_response,
-                        tool_calls=tool_calls_history  # Save tool calls
-                    )
-                    # Update session activity and Claude session ID mapping
-                    await session_service.update_session_activity(
-                        update_db,
-                        session_id,
-                        increment_conversation=True,
-                        claude_session_id=claude_session_id_from_sdk
-                    )
-                    await update_db.commit()
-                except Exception as update_error:
-                    logger.error(f"Failed to update conversation: {update_error}")
-                    await update_db.rollback()
-
-            # Send completion event with Claude session ID
-            completion_data = {
-                'type': 'done',
-                'session_id': session_id,
-                'conversation_id': conversation_id,
-                'claude_session_id': claude_session_id_from_sdk
-            }
-            yield f"data: {json.dumps(completion_data)}\n\n"
-
-        except Exception as e:
-            # Log error
-            logger.error(f"Stream error: {e}", exc_info=True)
-
-            # If error is related to session not found, clear the saved claude_session_id
-            error_msg = str(e)
-            if "No conversation found" in error_msg or "session" in error_msg.lower():
-                logger.warning(f"Claude session may be expired, clearing saved session ID")
-                # Clear the invalid claude_session_id
-                from app.core.database import AsyncSessionLocal
-                async with AsyncSessionLocal() as clear_db:
-                    try:
-                        await session_service.update_session_activity(
-                            clear_db,
-                            session_id,
-                            increment_conversation=False,
-                            claude_session_id=None  # Clear invalid session ID
-                        )
-                        await clear_db.commit()
-                        logger.info("Cleared invalid Claude session ID")
-                    except:
-                        pass
-
-            # Send error event
-            error_data = {
-                "type": "error",
-                "error": str(e),
-                "detail": str(type(e).__name__),
-                "session_id": session_id,
-                "conversation_id": conversation_id,
-                "suggestion": "Claude session may be expired. Please try again with a new message."
-            }
-            yield f"data: {json.dumps(error_data)}\n\n"
+@router.get("/{conversation_id}/history")
+async def chat_history(
+    conversation_id: str,
+    after: int = Query(0, ge=0, description="Skip events up to this ID"),
+    raw: bool = Query(False, description="Download the raw event log instead of an SSE stream"),
+    db: AsyncSession = Depends(get_db),
+    accept_encoding: Optional[str] = Header(None)
+):
+    """
+    Re-stream every event of a finished conversation from its event log
+
+    Events are sent as fast as the client reads them, with their original IDs.
+    With raw=true the log file is returned as is (length-prefixed msgpack
+    records, see app.services.event_log) for offline analysis.
+    """
+    if run_engine.get(conversation_id) is not None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Conversation {conversation_id} is still running; follow it with /events"
+        )
+
+    conversation = await session_service.get_conversation(db, conversation_id)
+    if not conversation:
+        raise HTTPException(status_code=404, detail=f"Conversation {conversation_id} not found")
+    if not conversation.event_log:
+        raise HTTPException(status_code=404, detail=f"No event log for conversation {conversation_id}")
+
+    try:
+        path = event_log_service.path_for(conversation.event_log)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not path.exists():
+        raise HTTPException(status_code=404, detail=f"Event log of conversation {conversation_id} is missing")
+
+    if raw:
+        return FileResponse(path, media_type="application/x-msgpack", filename=path.name)
+
+    writer = SSEWriter(conversation.session_id, conversation_id)
 
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
+    async def generate():
+        async for event_id, data in event_log_service.read(conversation.event_log, after):
+            yield writer.frame(data, event_id)
+
+    return event_stream_response(generate(), accept_encoding)
+
+
+@router.post("/{conversation_id}/cancel")
+async def cancel_chat(
+    conversation_id: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Stop a running conversation
+
+    Claude is interrupted first and the run is killed if it does not stop in
+    time. Output produced so far is kept and the conversation is marked aborted.
+    """
+    if run_engine.get(conversation_id) is None:
+        conversation = await session_service.get_conversation(db, conversation_id)
+        if not conversation:
+            raise HTTPException(status_code=404, detail=f"Conversation {conversation_id} not found")
+        if conversation.status != ConversationStatus.IN_PROGRESS:
+            raise HTTPException(status_code=409, detail=f"Conversation {conversation_id} is not running")
+
+    if await run_engine.cancel(conversation_id):
+        return {"conversation_id": conversation_id, "status": "cancelled"}
+
+    # The run lives in another worker, which received the cancel request
+    return JSONResponse(
+        status_code=202,
+        content={"conversation_id": conversation_id, "status": "cancel_requested"}
     )
+
+
+@router.get("/{conversation_id}/trace")
+async def chat_trace(conversation_id: str):
+    """
+    Get the span timeline of a conversation's request and run
+
+    Offsets and durations are in milliseconds from the start of the trace; spans
+    of a run still in progress have no duration yet.
+    """
+    try:
+        spans = await tracer.get_timeline(conversation_id)
+    except ValueError:
+        spans = None
+    if not spans:
+        raise HTTPException(status_code=404, detail=f"No trace for conversation {conversation_id}")
+
+    origin = spans[0]["start_time"]
+    timeline = []
+    for span in spans:
+        end_time = span.pop("end_time")
+        start_time = span.pop("start_time")
+        span["offset_ms"] = (start_time - origin) / 1e6
+        span["duration_ms"] = (end_time - start_time) / 1e6 if end_time else None
+        for event in span["events"]:
+            event["offset_ms"] = (event.pop("timestamp") - origin) / 1e6
+        timeline.append(span)
+
+    return {
+        "conversation_id": conversation_id,
+        "trace_id": spans[0]["trace_id"],
+        "spans": timeline
+    }
+
+
+@router.get("/stats")
+async def chat_stats():
+    """Claude client pool, standby pool, run engine, admission, replay cache, run lock, session cache and session activity statistics"""
+    return {
+        "client_pool": client_pool.stats(),
+        "standby_pool": standby_pool.stats(),
+        "runs": run_engine.stats(),
+        "scheduler": run_scheduler.stats(),
+        "replay_cache": replay_cache.stats(),
+        "run_lock": run_lock_service.stats(),
+        "session_cache": {**session_service.stats(), "tiers": cache_service.stats()},
+        "session_activity": session_activity.stats()
+    }
@@ -0,0 +1,164 @@
+"""
+WebSocket chat endpoint
+"""
+import asyncio
+import logging
+from typing import Optional
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Query
+from pydantic import ValidationError
+
+from app.core.database import AsyncSessionLocal
+from app.api.chat import start_chat_run
+from app.services.run_engine import AgentRun
+from app.schemas.chat import ChatRequest
+from app.utils.ws_codec import WSCodec
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/chat", tags=["chat"])
+
+
+class ChatConnection:
+    """
+    One WebSocket connection carrying any number of turns
+
+    Client messages:
+    - ``{"type": "chat", ...ChatRequest fields}`` starts a turn
+    - ``{"type": "interrupt"}`` interrupts the turn in progress
+    - ``{"type": "ping"}`` is answered with ``{"type": "pong"}``
+    """
+
+    def __init__(self, websocket: WebSocket, codec: WSCodec):
+        self.websocket = websocket
+        self.codec = codec
+        self.session_id: Optional[str] = None
+        self.run: Optional[AgentRun] = None
+        self._forward_task: Optional[asyncio.Task] = None
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, frame):
+        async with self._send_lock:
+            if isinstance(frame, bytes):
+                await self.websocket.send_bytes(frame)
+            else:
+                await self.websocket.send_text(frame)
+
+    async def send_error(self, error: str, **extra):
+        await self.send(self.codec.encode({"type": "error", "error": error, **extra}))
+
+    @property
+    def busy(self) -> bool:
+        return self._forward_task is not None and not self._forward_task.done()
+
+    async def serve(self):
+        """Handle client messages until the socket closes"""
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+
+                try:
+                    data = self.codec.decode(message)
+                except Exception:
+                    await self.send_error("Malformed message")
+                    continue
+                if not isinstance(data, dict):
+                    await self.send_error("Message must be an object")
+                    continue
+
+                message_type = data.pop("type", None)
+                if message_type == "chat":
+                    await self.start_turn(data)
+                elif message_type == "interrupt":
+                    await self.interrupt()
+                elif message_type == "ping":
+                    await self.send(self.codec.encode({"type": "pong"}))
+                else:
+                    await self.send_error(f"Unknown message type: {message_type}")
+        finally:
+            # Stop forwarding; the run keeps going for RUN_ORPHAN_GRACE_SECONDS so
+            # it can be resumed via /events, then gets cancelled if nobody did
+            if self._forward_task is not None:
+                self._forward_task.cancel()
+
+    async def start_turn(self, data: dict):
+        """Start a run for a chat message and forward its events"""
+        if self.busy:
+            await self.send_error("A turn is already in progress; interrupt it or wait for done")
+            return
+
+        data.setdefault("session_id", self.session_id)
+        try:
+            request = ChatRequest(**data)
+        except ValidationError as e:
+            await self.send_error("Invalid chat message", detail=e.errors(include_url=False, include_context=False))
+            return
+
+        async with AsyncSessionLocal() as db:
+            try:
+                run = await start_chat_run(request, db)
+            except HTTPException as e:
+                extra = {"status_code": e.status_code}
+                if e.headers and "Retry-After" in e.headers:
+                    extra["retry_after"] = int(e.headers["Retry-After"])
+                await self.send_error(str(e.detail), **extra)
+                return
+
+        self.session_id = run.session_id
+        self.run = run
+        self._forward_task = asyncio.create_task(self._forward(run))
+
+    async def _forward(self, run: AgentRun):
+        subscription = run.subscribe(event_types=run.request.event_types())
+        if subscription is None:
+            return
+        events = aiter(subscription)
+        try:
+            async for event in events:
+                await self.send(self.codec.encode_event(run.writer, event.id, event.data, event.payload))
+        except (WebSocketDisconnect, RuntimeError):
+            # Socket closed mid-turn
+            pass
+        except Exception as e:
+            logger.error(f"Failed to forward events for conversation {run.conversation_id}: {e}", exc_info=True)
+        finally:
+            subscription.close()
+            await events.aclose()
+
+    async def interrupt(self):
+        """Interrupt the current turn through the run's Claude client"""
+        run = self.run
+        if run is None or not self.busy:
+            await self.send_error("No turn in progress")
+            return
+        try:
+            interrupted = await run.interrupt()
+        except Exception as e:
+            logger.error(f"Failed to interrupt conversation {run.conversation_id}: {e}")
+            await self.send_error(f"Interrupt failed: {e}")
+            return
+        if not interrupted:
+            await self.send_error("Turn has not reached Claude yet")
+            return
+        await self.send(self.codec.encode({
+            "type": "interrupt_sent",
+            "session_id": run.session_id,
+            "conversation_id": run.conversation_id
+        }))
+
+
+@router.websocket("/ws")
+async def chat_ws(
+    websocket: WebSocket,
+    encoding: Optional[str] = Query(None, description="Event encoding: msgpack (default when available) or json")
+):
+    """Multi-turn chat over a WebSocket with binary msgpack or JSON frames"""
+    try:
+        codec = WSCodec(encoding)
+    except ValueError as e:
+        await websocket.close(code=1003, reason=str(e))
+        return
+
+    await websocket.accept()
+    await ChatConnection(websocket, codec).serve()
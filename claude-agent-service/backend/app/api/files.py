@@ -76,7 +76,7 @@ async def list_files(
     Returns a flat list of files/directories for the specified path.
     """
     # Get session
-    session = await session_service.get_session(db, session_id)
+    session = await session_service.get_session_info(db, session_id)
     if not session:
         raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
 
@@ -153,7 +153,7 @@ async def get_file_content(
     Binary files will return an error.
     """
     # Get session
-    session = await session_service.get_session(db, session_id)
+    session = await session_service.get_session_info(db, session_id)
     if not session:
         raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
 
@@ -0,0 +1,51 @@
+"""
+Metrics endpoint
+"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.database import engine
+from app.core.metrics import metrics
+from app.services.client_pool import client_pool
+from app.services.standby_pool import standby_pool
+from app.services.run_engine import run_engine
+from app.services.run_scheduler import run_scheduler
+from app.services.replay_cache import replay_cache
+
+router = APIRouter(tags=["metrics"])
+
+
+@metrics.collector
+def collect_db_pool():
+    """SQLAlchemy connection pool usage"""
+    pool = engine.sync_engine.pool
+    yield "db_pool_size", "Configured database pool size", {}, pool.size()
+    yield "db_pool_checked_out", "Database connections in use", {}, pool.checkedout()
+    yield "db_pool_overflow", "Database connections above the pool size", {}, pool.overflow()
+
+
+@metrics.collector
+def collect_services():
+    """Gauges read from the service stats"""
+    pool = client_pool.stats()
+    yield "claude_client_pool_size", "Live pooled Claude clients", {}, pool["size"]
+    yield "claude_client_pool_busy", "Pooled Claude clients running a turn", {}, pool["busy"]
+    yield "claude_client_pool_hit_ratio", "Share of turns that reused a live client", {}, pool["hit_rate"]
+
+    yield "standby_pool_ready", "Warm standby sessions ready to be claimed", {}, standby_pool.stats().get("ready")
+
+    runs = run_engine.stats()
+    yield "chat_runs_active", "Agent runs in progress in this worker", {}, runs["active"]
+    yield "chat_subscribers", "Clients following a run", {}, runs["subscribers"]
+
+    scheduler = run_scheduler.stats()
+    yield "chat_runs_running", "Admitted runs holding a concurrency slot", {}, scheduler["running"]
+    yield "chat_run_queue_depth", "Runs waiting for admission", {}, scheduler["queue_depth"]
+
+    yield "replay_cache_hit_ratio", "Share of replay cache lookups that hit", {}, replay_cache.stats()["hit_rate"]
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
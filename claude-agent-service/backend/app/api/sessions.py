@@ -8,6 +8,7 @@ from sqlalchemy import select
 from pydantic import BaseModel
 
 from app.core.database import get_db
+from app.utils.pagination import paginate, page
 from app.services.session import session_service
 from app.schemas.session import SessionCreate, SessionResponse, SessionListResponse
 from app.models.conversation import Conversation
@@ -21,6 +22,7 @@ class ConversationMessage(BaseModel):
     role: str
     content: str
     tool_calls: Optional[List[dict]] = None  # Tool calls with results
+    status: Optional[str] = None  # in_progress / completed / aborted (assistant only)
     timestamp: str
 
     class Config:
@@ -31,6 +33,7 @@ class MessageHistoryResponse(BaseModel):
     """Message history response"""
     messages: List[ConversationMessage]
     total: int
+    next_cursor: Optional[str] = None  # Cursor of the next page of conversations
 
 
 @router.post("", response_model=SessionResponse, status_code=201)
@@ -45,7 +48,6 @@ async def create_session(
             session_id=request.session_id,
             workspace_name=request.workspace_name
         )
-        await db.commit()
         return session
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -59,22 +61,27 @@ async def list_sessions(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
     active_only: bool = Query(True),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page; replaces skip"),
     db: AsyncSession = Depends(get_db)
 ):
-    """List all sessions"""
+    """List all sessions, newest first"""
     try:
-        sessions, total = await session_service.list_sessions(
+        sessions, total, next_cursor = await session_service.list_sessions(
             db=db,
             skip=skip,
             limit=limit,
-            active_only=active_only
+            active_only=active_only,
+            cursor=cursor
         )
         return SessionListResponse(
             sessions=sessions,
             total=total,
             skip=skip,
-            limit=limit
+            limit=limit,
+            next_cursor=next_cursor
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list sessions: {str(e)}")
 
@@ -85,7 +92,7 @@ async def get_session(
     db: AsyncSession = Depends(get_db)
 ):
     """Get session by ID"""
-    session = await session_service.get_session(db, session_id)
+    session = await session_service.get_session_info(db, session_id)
     if not session:
         raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
     return session
@@ -102,7 +109,6 @@ async def delete_session(
         if not success:
             raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
 
-        await db.commit()
         return {"message": f"Session {session_id} deleted successfully"}
     except HTTPException:
         raise
@@ -116,6 +122,7 @@ async def get_session_messages(
     session_id: str,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page; replaces skip"),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -123,22 +130,27 @@ async def get_session_messages(
 
     Returns messages in chronological order (oldest first).
     Each conversation contains a user message and optionally an assistant response.
+    skip and limit count conversations; pass next_cursor back as cursor to
+    fetch the following page without re-reading the skipped rows.
     """
     # Verify session exists
-    session = await session_service.get_session(db, session_id)
+    session = await session_service.get_session_info(db, session_id)
     if not session:
         raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
 
-    # Get conversations for this session
-    stmt = (
-        select(Conversation)
-        .where(Conversation.session_id == session_id)
-        .order_by(Conversation.created_at.asc())  # Chronological order
-        .offset(skip)
-        .limit(limit)
-    )
+    # Get conversations for this session in chronological order
+    try:
+        stmt = paginate(
+            select(Conversation).where(Conversation.session_id == session_id),
+            Conversation,
+            limit,
+            skip=skip,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     result = await db.execute(stmt)
-    conversations = result.scalars().all()
+    conversations, next_cursor = page(list(result.scalars().all()), limit)
 
     # Convert to messages (user + assistant pairs)
     messages: List[ConversationMessage] = []
@@ -159,15 +171,15 @@ async def get_session_messages(
                 role="assistant",
                 content=conv.assistant_response,
                 tool_calls=conv.tool_calls,  # Include tool calls
+                status=conv.status,
                 timestamp=conv.completed_at.isoformat() if conv.completed_at else conv.created_at.isoformat()
             ))
 
     # Get total count
-    count_stmt = select(Conversation).where(Conversation.session_id == session_id)
-    count_result = await db.execute(count_stmt)
-    total_conversations = len(count_result.scalars().all())
+    total_conversations = await session_service.count_conversations(db, session_id)
 
     return MessageHistoryResponse(
         messages=messages,
-        total=total_conversations * 2  # Approximate (user + assistant)
+        total=total_conversations * 2,  # Approximate (user + assistant)
+        next_cursor=next_cursor
     )
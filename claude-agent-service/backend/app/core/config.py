@@ -31,10 +31,13 @@ class Settings(BaseSettings):
     POSTGRES_USER: str = "claude_agent"
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str = "claude_agent_db"
+    DATABASE_URL_OVERRIDE: Optional[str] = None  # full SQLAlchemy URL, e.g. sqlite+aiosqlite:///bench.db
 
     @property
     def DATABASE_URL(self) -> str:
         """Get database URL"""
+        if self.DATABASE_URL_OVERRIDE:
+            return self.DATABASE_URL_OVERRIDE
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
     # Redis Configuration
@@ -43,6 +46,7 @@ class Settings(BaseSettings):
     REDIS_PASSWORD: Optional[str] = None
     REDIS_DB: int = 0
     REDIS_CACHE_TTL: int = 3600  # 1 hour
+    REDIS_MAX_CONNECTIONS: int = 50
 
     @property
     def REDIS_URL(self) -> str:
@@ -52,11 +56,94 @@ class Settings(BaseSettings):
             return f"redis://:{self.REDIS_PASSWORD}@{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB}"
         return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB}"
 
+    # Local Cache Settings (in-process tier in front of the Redis cache)
+    LOCAL_CACHE_ENABLED: bool = True
+    LOCAL_CACHE_TTL: int = 30  # bounds staleness if an invalidation is missed
+    LOCAL_CACHE_MAX_ENTRIES: int = 10000
+    LOCAL_CACHE_MAX_BYTES: int = 16777216  # 16 MB per worker
+
     # Workspace Settings
     WORKSPACE_ROOT: str = "/workspace"
     MAX_SESSIONS: int = 100
     SESSION_TIMEOUT: int = 3600  # 1 hour
 
+    # Claude Client Pool Settings
+    CLIENT_POOL_MAX_SIZE: int = 20
+    CLIENT_POOL_IDLE_TIMEOUT: int = 600  # 10 minutes
+    CLAUDE_TRANSPORT_FACTORY: Optional[str] = None  # "module:callable" returning an SDK Transport for the options; the CLI subprocess by default
+
+    # Warm Standby Pool Settings (pre-created workspaces with a running client)
+    STANDBY_POOL_SIZE: int = 2
+    STANDBY_POOL_LOW_WATERMARK: int = 1
+
+    # Stream Settings
+    STREAM_COALESCE_MAX_WINDOW_MS: int = 200
+    STREAM_COALESCE_MAX_BYTES: int = 4096
+
+    # Resumable Event Stream Settings (Redis Stream per conversation)
+    EVENT_STREAM_MAXLEN: int = 10000
+    EVENT_STREAM_TTL: int = 3600  # 1 hour
+    EVENT_STREAM_IDLE_TIMEOUT: int = 300  # stop tailing after 5 minutes without events
+
+    # Run Engine Settings
+    RUN_REPLAY_BUFFER: int = 1000  # recent events kept in memory for in-process subscribers
+    SUBSCRIBER_BUFFER_SIZE: int = 512  # events buffered per slow client before the overflow policy applies
+    SUBSCRIBER_OVERFLOW_POLICY: str = "coalesce"  # coalesce, drop or spill
+    SUBSCRIBER_SPILL_DIR: Optional[str] = None  # system temp dir by default
+    RUN_ORPHAN_GRACE_SECONDS: int = 30  # cancel runs left without subscribers this long (0 = never)
+    RUN_CANCEL_INTERRUPT_TIMEOUT: int = 10  # wait this long after interrupt before killing the run
+
+    # Run Admission Settings
+    MAX_CONCURRENT_RUNS: int = 8  # runs executing at once across all sessions
+    RUN_QUEUE_MAX_DEPTH: int = 100  # waiting runs before new ones get 429
+
+    # Distributed Run Lock Settings (one run per session across workers)
+    RUN_LOCK_ENABLED: bool = True
+    RUN_LOCK_TTL_MS: int = 15000  # lease length; a crashed worker's lock expires after this
+    RUN_LOCK_HEARTBEAT_MS: int = 5000
+    RUN_LOCK_MODE: str = "reject"  # reject (409 when another worker runs the session) or wait
+    RUN_LOCK_WAIT_TIMEOUT: int = 30  # seconds to wait for the lock in wait mode
+
+    # Stale Conversation Settings (conversations left in progress by dead workers)
+    STALE_CONVERSATION_SWEEP_INTERVAL_MS: int = 30000  # also how often live runs are stamped
+    STALE_CONVERSATION_AFTER_MS: int = 300000  # unstamped this long -> aborted
+
+    # Session Activity Settings (last_activity and conversation_count are written behind)
+    SESSION_ACTIVITY_FLUSH_INTERVAL_MS: int = 1000
+
+    # Event Log Settings (every emitted event, kept on disk per conversation)
+    EVENT_LOG_ENABLED: bool = True
+    EVENT_LOG_ROOT: str = "/workspace/.event_logs"
+    EVENT_LOG_FLUSH_BYTES: int = 65536
+    EVENT_LOG_FLUSH_INTERVAL_MS: int = 1000
+
+    # Response Checkpoint Settings
+    CHECKPOINT_INTERVAL_MS: int = 1000
+    CHECKPOINT_MAX_BYTES: int = 16384
+
+    # Blob Store Settings (large tool results)
+    BLOB_STORE_ROOT: str = "/workspace/.blobs"
+    TOOL_RESULT_INLINE_MAX_BYTES: int = 32768
+    TOOL_RESULT_PREVIEW_CHARS: int = 2000
+
+    # Replay Cache Settings (clients opt in per request with replay_cache)
+    REPLAY_CACHE_ENABLED: bool = True
+    REPLAY_CACHE_TTL: int = 86400  # 1 day
+    REPLAY_CACHE_MAX_BYTES: int = 268435456  # 256 MB of recorded runs in Redis
+    REPLAY_CACHE_MAX_ENTRY_BYTES: int = 8388608  # larger runs are not cached
+    REPLAY_CACHE_MAX_TREE_BYTES: int = 67108864  # larger workspaces are not hashed
+
+    # Response Compression Settings (negotiated via Accept-Encoding)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # JSON responses smaller than this are sent as is
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
+    # Tracing Settings (per-conversation span timelines)
+    TRACING_ENABLED: bool = True
+    TRACE_ROOT: str = "/workspace/.traces"
+    TRACE_MAX_SPANS: int = 2000  # spans above this are dropped from a trace
+
     # CORS Settings
     CORS_ORIGINS: list[str] = ["*"]
     CORS_ALLOW_CREDENTIALS: bool = True
@@ -5,14 +5,16 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sess
 from sqlalchemy.orm import declarative_base
 from .config import settings
 
+# Pool sizing applies to server databases; SQLite (benchmarks) picks its own pool
+pool_options = {} if settings.DATABASE_URL.startswith("sqlite") else {"pool_size": 10, "max_overflow": 20}
+
 # Create async engine
 engine = create_async_engine(
     settings.DATABASE_URL,
     echo=settings.DEBUG,
     future=True,
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+    **pool_options
 )
 
 # Create async session factory
@@ -49,6 +51,7 @@ async def init_db():
         # Import all models here to ensure they are registered
         from app.models.session import Session  # noqa
         from app.models.conversation import Conversation  # noqa
+        from app.models.counter import Counter  # noqa
 
         await conn.run_sync(Base.metadata.create_all)
 
@@ -0,0 +1,236 @@
+"""
+In-process metrics
+
+A minimal registry of counters, gauges and histograms rendered in the
+Prometheus text exposition format at ``/metrics``, so no client library or
+external collector is needed. Values are per worker process.
+"""
+import functools
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> dict:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down"""
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Iterable[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: dict[tuple, list[int]] = {}
+        self._sums: dict[tuple, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * len(self.buckets)
+            self._sums[key] = 0.0
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a block in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        result = []
+        for key, counts in self._counts.items():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                result.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            result.append((f"{self.name}_sum", labels, self._sums[key]))
+            result.append((f"{self.name}_count", labels, cumulative))
+        return result
+
+
+def timed(histogram: Histogram, **labels):
+    """Decorator observing the duration of an async function"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class MetricsRegistry:
+    """Registered metrics plus collectors that read gauges at scrape time"""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], Iterable[tuple[str, str, dict, float]]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Optional[Iterable[float]] = None
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets=buckets or DEFAULT_BUCKETS))
+
+    def collector(self, func: Callable[[], Iterable[tuple[str, str, dict, float]]]):
+        """
+        Register a function yielding (name, documentation, labels, value) gauge
+        samples, called on every scrape
+        """
+        self._collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        collected: dict[str, tuple[str, list]] = {}
+        for collect in self._collectors:
+            try:
+                for name, documentation, labels, value in collect():
+                    collected.setdefault(name, (documentation, []))[1].append((labels, value))
+            except Exception:
+                # A broken collector must not take down the whole endpoint
+                continue
+        for name, (documentation, samples) in collected.items():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                if value is not None:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Global metrics registry
+metrics = MetricsRegistry()
+
+# Chat pipeline
+CHAT_STAGE_SECONDS = metrics.histogram(
+    "chat_stage_seconds",
+    "Duration of chat stream stages (first_* stages are measured from the start of the run)",
+    ["stage"]
+)
+CHAT_EVENTS_TOTAL = metrics.counter("chat_events_total", "Stream events published", ["type"])
+CHAT_RUNS_TOTAL = metrics.counter("chat_runs_total", "Finished agent runs", ["outcome"])
+RUN_QUEUE_WAIT_SECONDS = metrics.histogram(
+    "run_queue_wait_seconds", "Time from enqueueing a run until the scheduler admits it"
+)
+CLAUDE_CLIENT_SPAWN_SECONDS = metrics.histogram(
+    "claude_client_spawn_seconds", "Time to spawn and connect a Claude CLI process"
+)
+
+# Data access
+SESSION_SERVICE_SECONDS = metrics.histogram(
+    "session_service_seconds", "Duration of session service operations", ["operation"]
+)
+CACHE_REQUESTS_TOTAL = metrics.counter("cache_requests_total", "Redis cache lookups", ["result"])
+WORKSPACE_OPERATION_SECONDS = metrics.histogram(
+    "workspace_operation_seconds", "Duration of workspace operations", ["operation"]
+)
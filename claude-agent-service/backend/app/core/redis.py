@@ -27,7 +27,7 @@ async def init_redis():
         settings.REDIS_URL,
         encoding="utf-8",
         decode_responses=True,
-        max_connections=10
+        max_connections=settings.REDIS_MAX_CONNECTIONS
     )
 
     # Test connection
@@ -0,0 +1,291 @@
+"""
+Per-request tracing
+
+Lightweight spans with an OpenTelemetry-shaped API (``start_as_current_span``,
+``set_attribute``, ``add_event``, ``record_exception``, ``end``). A trace is
+started for every chat request and bound to its conversation; when the run
+finishes its spans are appended to ``TRACE_ROOT/<conversation_id>.jsonl``, one
+JSON object per span. Code running outside a trace gets a no-op span.
+"""
+import functools
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Iterator, Optional
+import aiofiles
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+STATUS_UNSET = "UNSET"
+STATUS_OK = "OK"
+STATUS_ERROR = "ERROR"
+
+
+class Span:
+    """A timed operation within a trace"""
+
+    def __init__(
+        self,
+        trace: "Trace",
+        name: str,
+        parent_id: Optional[str] = None,
+        attributes: Optional[dict] = None,
+        start_time: Optional[int] = None
+    ):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes) if attributes else {}
+        self.events: list[dict] = []
+        self.status = STATUS_UNSET
+        self.status_description: Optional[str] = None
+        self.start_time = start_time or time.time_ns()
+        self.end_time: Optional[int] = None
+
+    def is_recording(self) -> bool:
+        return self.end_time is None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict):
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, attributes: Optional[dict] = None, timestamp: Optional[int] = None):
+        self.events.append({
+            "name": name,
+            "timestamp": timestamp or time.time_ns(),
+            "attributes": attributes or {},
+        })
+
+    def set_status(self, status: str, description: Optional[str] = None):
+        self.status = status
+        self.status_description = description
+
+    def record_exception(self, exception: BaseException):
+        self.add_event("exception", {
+            "exception.type": type(exception).__name__,
+            "exception.message": str(exception),
+        })
+
+    def end(self, end_time: Optional[int] = None):
+        if self.end_time is None:
+            self.end_time = end_time or time.time_ns()
+            self.trace.finish_span(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "attributes": dict(self.attributes),
+            "events": [dict(event) for event in self.events],
+            "status": self.status,
+            "status_description": self.status_description,
+        }
+
+
+class NonRecordingSpan:
+    """Span used outside a trace; every operation is a no-op"""
+    trace = None
+    span_id = None
+
+    def is_recording(self) -> bool:
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: dict):
+        pass
+
+    def add_event(self, name: str, attributes: Optional[dict] = None, timestamp: Optional[int] = None):
+        pass
+
+    def set_status(self, status: str, description: Optional[str] = None):
+        pass
+
+    def record_exception(self, exception: BaseException):
+        pass
+
+    def end(self, end_time: Optional[int] = None):
+        pass
+
+
+INVALID_SPAN = NonRecordingSpan()
+
+_current_span: ContextVar[Any] = ContextVar("current_span", default=INVALID_SPAN)
+
+
+def get_current_span():
+    """The span of the current context, or a no-op span"""
+    return _current_span.get()
+
+
+class Trace:
+    """Spans of one chat request and its run"""
+
+    def __init__(self, max_spans: int):
+        self.trace_id = uuid.uuid4().hex
+        self.conversation_id: Optional[str] = None
+        self.max_spans = max_spans
+        self.spans: list[Span] = []
+        self.open: dict[str, Span] = {}
+        self.dropped = 0
+
+    def start_span(self, name: str, parent_id: Optional[str], attributes: Optional[dict], start_time: Optional[int]):
+        if len(self.spans) + len(self.open) >= self.max_spans:
+            self.dropped += 1
+            return INVALID_SPAN
+        span = Span(self, name, parent_id, attributes, start_time)
+        self.open[span.span_id] = span
+        return span
+
+    def finish_span(self, span: Span):
+        self.open.pop(span.span_id, None)
+        self.spans.append(span)
+
+    def timeline(self) -> list[dict]:
+        """Finished and still open spans, ordered by start time"""
+        spans = [span.to_dict() for span in self.spans + list(self.open.values())]
+        spans.sort(key=lambda span: span["start_time"])
+        return spans
+
+
+class FileSpanExporter:
+    """Appends the spans of a conversation to a JSON Lines file"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def path_for(self, conversation_id: str) -> Path:
+        # Conversation IDs are UUIDs; reject anything else before touching the filesystem
+        return self.root / f"{uuid.UUID(conversation_id)}.jsonl"
+
+    async def export(self, conversation_id: str, spans: list[dict]):
+        path = self.path_for(conversation_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = "".join(json.dumps(span, ensure_ascii=False, default=str) + "\n" for span in spans)
+        async with aiofiles.open(path, "a", encoding="utf-8") as f:
+            await f.write(data)
+
+    async def read(self, conversation_id: str) -> Optional[list[dict]]:
+        try:
+            async with aiofiles.open(self.path_for(conversation_id), "r", encoding="utf-8") as f:
+                content = await f.read()
+        except FileNotFoundError:
+            return None
+        return [json.loads(line) for line in content.splitlines() if line]
+
+
+class Tracer:
+    """Creates traces and spans and exports finished traces"""
+
+    def __init__(self):
+        self.enabled = settings.TRACING_ENABLED
+        self.max_spans = settings.TRACE_MAX_SPANS
+        self.exporter = FileSpanExporter(settings.TRACE_ROOT)
+        # Traces of runs still in progress, keyed by conversation ID
+        self._active: dict[str, Trace] = {}
+
+    @contextmanager
+    def start_trace(self, name: str, attributes: Optional[dict] = None) -> Iterator:
+        """Start a new trace whose root span is current for the block"""
+        if not self.enabled:
+            yield INVALID_SPAN
+            return
+        trace = Trace(self.max_spans)
+        span = trace.start_span(name, None, attributes, None)
+        with self.use_span(span, end_on_exit=True):
+            yield span
+
+    def start_span(
+        self,
+        name: str,
+        attributes: Optional[dict] = None,
+        start_time: Optional[int] = None,
+        parent=None
+    ):
+        """Start a child of `parent` (the current span by default); the caller ends it"""
+        parent = parent if parent is not None else get_current_span()
+        if parent.trace is None:
+            return INVALID_SPAN
+        return parent.trace.start_span(name, parent.span_id, attributes, start_time)
+
+    @contextmanager
+    def start_as_current_span(self, name: str, attributes: Optional[dict] = None) -> Iterator:
+        """Start a child span that is current for the block and ends with it"""
+        span = self.start_span(name, attributes)
+        with self.use_span(span, end_on_exit=True):
+            yield span
+
+    @contextmanager
+    def use_span(self, span, end_on_exit: bool = False) -> Iterator:
+        """Make a span current for the block, recording an exception that escapes it"""
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            span.set_status(STATUS_ERROR, str(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            if end_on_exit:
+                span.end()
+
+    def bind(self, conversation_id: str):
+        """Attach the current trace to a conversation so that it can be looked up"""
+        trace = get_current_span().trace
+        if trace is not None:
+            trace.conversation_id = conversation_id
+            self._active[conversation_id] = trace
+
+    async def export(self, trace: Optional[Trace]):
+        """Persist a finished trace and forget it"""
+        if trace is None or trace.conversation_id is None:
+            return
+        self._active.pop(trace.conversation_id, None)
+        spans = [span.to_dict() for span in trace.spans]
+        if trace.dropped:
+            logger.info(f"Trace {trace.trace_id} dropped {trace.dropped} spans above TRACE_MAX_SPANS")
+        try:
+            await self.exporter.export(trace.conversation_id, spans)
+        except Exception as e:
+            logger.warning(f"Failed to export trace of conversation {trace.conversation_id}: {e}")
+
+    async def get_timeline(self, conversation_id: str) -> Optional[list[dict]]:
+        """Spans of a conversation, from its live trace or the exported file"""
+        trace = self._active.get(conversation_id)
+        if trace is not None:
+            return trace.timeline()
+        spans = await self.exporter.read(conversation_id)
+        if spans is not None:
+            spans.sort(key=lambda span: span["start_time"])
+        return spans
+
+
+def traced(name: str):
+    """Decorator running an async function in a child span of the current trace"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Global tracer instance
+tracer = Tracer()
@@ -9,7 +9,17 @@ from app.core.config import settings
 from app.core.database import init_db, close_db
 from app.core.redis import init_redis, close_redis
 from app.services.cache import cache_service
-from app.api import sessions, chat, files
+from app.services.activity import session_activity
+from app.services.event_stream import event_stream_service
+from app.services.client_pool import client_pool
+from app.services.standby_pool import standby_pool
+from app.services.run_engine import run_engine
+from app.services.checkpoint import stale_conversation_sweeper
+from app.services.replay_cache import replay_cache
+from app.services.run_lock import run_lock_service
+from app.services.blob_store import blob_store
+from app.utils.compression import JSONCompressionMiddleware
+from app.api import sessions, chat, chat_ws, files, blobs, metrics
 
 
 @asynccontextmanager
@@ -30,11 +40,23 @@ async def lifespan(app: FastAPI):
     print("\n[2/3] Initializing Redis...")
     await init_redis()
     await cache_service.initialize()
+    await event_stream_service.initialize()
+    await run_engine.initialize()
+    await replay_cache.initialize()
+    await run_lock_service.initialize()
     print(f"✓ Redis initialized: {settings.REDIS_HOST}:{settings.REDIS_PORT}")
 
     # Workspace
     print(f"\n[3/3] Workspace root: {settings.WORKSPACE_ROOT}")
     print(f"✓ Max sessions: {settings.MAX_SESSIONS}")
+    await blob_store.initialize()
+    print(f"✓ Blob store: {settings.BLOB_STORE_ROOT}")
+    await client_pool.start()
+    print(f"✓ Claude client pool: max {settings.CLIENT_POOL_MAX_SIZE}, idle timeout {settings.CLIENT_POOL_IDLE_TIMEOUT}s")
+    await standby_pool.start()
+    print(f"✓ Standby pool: {settings.STANDBY_POOL_SIZE} warm sessions (low watermark {settings.STANDBY_POOL_LOW_WATERMARK})")
+    await session_activity.start()
+    await stale_conversation_sweeper.start(run_engine.conversation_ids)
 
     print("\n" + "=" * 60)
     print(f"🚀 {settings.APP_NAME} is ready!")
@@ -48,6 +70,12 @@ async def lifespan(app: FastAPI):
     print("Shutting down...")
     print("=" * 60)
 
+    await stale_conversation_sweeper.close()
+    await run_engine.close()
+    await session_activity.close()
+    await cache_service.close()
+    await standby_pool.close()
+    await client_pool.close()
     await close_redis()
     await close_db()
 
@@ -72,10 +100,16 @@ app.add_middleware(
     allow_headers=settings.CORS_ALLOW_HEADERS,
 )
 
+# Compress large JSON responses (chat streams compress per event themselves)
+app.add_middleware(JSONCompressionMiddleware)
+
 # Include routers
 app.include_router(sessions.router)
 app.include_router(chat.router)
+app.include_router(chat_ws.router)
 app.include_router(files.router)
+app.include_router(blobs.router)
+app.include_router(metrics.router)
 
 
 @app.get("/")
@@ -1,7 +1,7 @@
 """
 Conversation database model
 """
-from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Integer, JSON
+from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Integer, JSON, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -9,9 +9,27 @@ import uuid
 from app.core.database import Base
 
 
+class ConversationStatus:
+    """Conversation lifecycle states"""
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+    ABORTED = "aborted"
+
+
 class Conversation(Base):
     """Conversation model"""
     __tablename__ = "conversations"
+    __table_args__ = (
+        # Message history pages of a session in chronological order
+        Index("ix_conversations_session_id_created_at", "session_id", "created_at"),
+        # Only the unfinished conversations, for the stale conversation sweep
+        Index(
+            "ix_conversations_in_progress_checkpoint",
+            text("coalesce(checkpointed_at, created_at)"),
+            postgresql_where=text("status = 'in_progress'"),
+            sqlite_where=text("status = 'in_progress'")
+        ),
+    )
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     session_id = Column(String(36), ForeignKey("sessions.id", ondelete="CASCADE"), nullable=False)
@@ -20,14 +38,23 @@ class Conversation(Base):
     assistant_response = Column(Text, nullable=True)
 
     # Store tool calls and results as JSON
-    tool_calls = Column(JSON, nullable=True, comment="Tool calls with results [{id, name, input, result, is_error}]")
+    tool_calls = Column(JSON, nullable=True, comment="Tool calls with results [{id, name, input, result, is_error, result_ref?}]")
 
     permission_mode = Column(String(50), default="acceptEdits", nullable=False)
     resume_id = Column(String(100), nullable=True)
     max_turns = Column(Integer, nullable=True)
 
+    status = Column(String(20), default=ConversationStatus.IN_PROGRESS, nullable=False,
+                    comment="in_progress while streaming, then completed or aborted")
+
+    # Every emitted event, in the on-disk event log (path relative to EVENT_LOG_ROOT)
+    event_log = Column(String(100), nullable=True)
+    event_count = Column(Integer, nullable=True)
+
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     completed_at = Column(DateTime, nullable=True)
+    checkpointed_at = Column(DateTime, default=datetime.utcnow, nullable=True,
+                             comment="Last checkpoint or heartbeat of the run producing the response")
 
     # Relationship
     session = relationship("Session", back_populates="conversations")
@@ -0,0 +1,17 @@
+"""
+Counter database model
+"""
+from sqlalchemy import Column, String, BigInteger
+
+from app.core.database import Base
+
+
+class Counter(Base):
+    """Named count maintained in the same transaction as the rows it counts"""
+    __tablename__ = "counters"
+
+    name = Column(String(100), primary_key=True, comment="sessions:active, sessions:total or conversations:<session_id>")
+    value = Column(BigInteger, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<Counter(name={self.name}, value={self.value})>"
@@ -1,7 +1,7 @@
 """
 Session database model
 """
-from sqlalchemy import Column, String, DateTime, Integer, Boolean
+from sqlalchemy import Column, String, DateTime, Integer, BigInteger, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -12,6 +12,10 @@ from app.core.database import Base
 class Session(Base):
     """Session model"""
     __tablename__ = "sessions"
+    __table_args__ = (
+        # Session list pages (active sessions, newest first)
+        Index("ix_sessions_is_active_created_at", "is_active", "created_at"),
+    )
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     claude_session_id = Column(String(100), nullable=True, index=True, comment="Claude SDK session ID for resuming conversations")
@@ -25,6 +29,7 @@ class Session(Base):
 
     conversation_count = Column(Integer, default=0, nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
+    run_fence = Column(BigInteger, nullable=True, comment="Fencing token of the last run lock that wrote to this session")
 
     # Relationship
     conversations = relationship("Conversation", back_populates="session", cascade="all, delete-orphan")
@@ -1,8 +1,50 @@
 """
 Chat schemas
 """
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import Literal, Optional
+
+# Event types emitted on a chat stream
+STREAM_EVENT_TYPES = frozenset({
+    "connected", "queued", "text_delta", "tool_input_delta", "content_block_start",
+    "tool_use", "tool_result", "result", "system", "stream_event",
+    "gap", "done", "error", "cancelled",
+})
+
+# Always delivered: events that end a stream so clients know when to stop, and
+# gap so they know a resumed stream is missing events
+REQUIRED_EVENT_TYPES = frozenset({"gap", "done", "error", "cancelled"})
+
+EVENT_PROFILES = {
+    "minimal": frozenset({"text_delta", "tool_use", "tool_result", "result"}),
+    "ui": STREAM_EVENT_TYPES - {"stream_event", "system"},
+    "full": STREAM_EVENT_TYPES,
+}
+
+
+class EventSubscription(BaseModel):
+    """Which event types a chat stream should carry"""
+    profile: Literal["minimal", "ui", "full"] = Field(
+        "full", description="Preset event set: minimal, ui (no raw stream/system events) or full"
+    )
+    include: Optional[list[str]] = Field(None, description="Event types to send, replaces the profile")
+    exclude: Optional[list[str]] = Field(None, description="Event types to leave out")
+
+    @field_validator("include", "exclude")
+    @classmethod
+    def check_event_types(cls, value: Optional[list[str]]) -> Optional[list[str]]:
+        if value:
+            unknown = set(value) - STREAM_EVENT_TYPES
+            if unknown:
+                raise ValueError(f"Unknown event types: {', '.join(sorted(unknown))}")
+        return value
+
+    def event_types(self) -> frozenset:
+        """Resolve to the set of event types to send"""
+        selected = frozenset(self.include) if self.include is not None else EVENT_PROFILES[self.profile]
+        if self.exclude:
+            selected = selected - frozenset(self.exclude)
+        return selected | REQUIRED_EVENT_TYPES
 
 
 class ChatRequest(BaseModel):
@@ -12,6 +54,29 @@ class ChatRequest(BaseModel):
     resume: Optional[str] = Field(None, description="Resume from conversation ID")
     max_turns: Optional[int] = Field(None, description="Maximum turns")
     permission_mode: Optional[str] = Field("acceptEdits", description="Permission mode")
+    coalesce_ms: Optional[int] = Field(
+        None, ge=1,
+        description="Merge consecutive text/tool input deltas sent within this window (ms)"
+    )
+    coalesce_bytes: Optional[int] = Field(
+        None, ge=1,
+        description="Flush merged deltas early once they reach this many characters"
+    )
+    events: Optional[EventSubscription] = Field(
+        None,
+        description="Event types to stream; all events when omitted"
+    )
+    replay_cache: Literal["off", "use", "refresh"] = Field(
+        "off",
+        description="Replay cache: off, use (replay a recorded identical run) or refresh (run and re-record)"
+    )
+
+    def event_types(self) -> Optional[frozenset]:
+        """Event types this requester streams; None for all of them"""
+        if self.events is None:
+            return None
+        selected = self.events.event_types()
+        return None if selected == STREAM_EVENT_TYPES else selected
 
 
 class ChatStreamEvent(BaseModel):
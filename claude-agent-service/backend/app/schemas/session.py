@@ -12,6 +12,22 @@ class SessionCreate(BaseModel):
     workspace_name: Optional[str] = Field(None, description="Workspace folder name")
 
 
+class SessionInfo(BaseModel):
+    """Cached session fields, served without a database query"""
+    id: str
+    claude_session_id: Optional[str] = None
+    workspace_path: str
+    workspace_name: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+    last_activity: datetime
+    conversation_count: int
+    is_active: bool
+
+    class Config:
+        from_attributes = True
+
+
 class SessionResponse(BaseModel):
     """Session response"""
     id: str
@@ -34,3 +50,4 @@ class SessionListResponse(BaseModel):
     total: int
     skip: int
     limit: int
+    next_cursor: Optional[str] = Field(None, description="Cursor of the next page, None on the last page")
@@ -0,0 +1,151 @@
+"""
+Write-behind session activity
+
+Finished turns bump last_activity and conversation_count on their session row.
+Instead of locking and rewriting the row on every turn, the bumps are collected
+in memory and written every SESSION_ACTIVITY_FLUSH_INTERVAL_MS as one bulk
+UPDATE, so a busy session costs one row write per interval. Increments merge,
+so counts stay exact; a worker crash loses at most one interval of activity.
+Cached session info is refreshed in place with the written values.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Integer, String, DateTime, bindparam, column, select, update, values
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import SESSION_SERVICE_SECONDS, timed
+from app.models.session import Session
+from app.services.cache import cache_service
+
+logger = logging.getLogger(__name__)
+
+
+class SessionActivityWriter:
+    """Buffer of pending session activity, flushed in bulk"""
+
+    def __init__(self):
+        self.interval = settings.SESSION_ACTIVITY_FLUSH_INTERVAL_MS / 1000
+        # session_id -> (last_activity, conversations to add)
+        self._pending: dict[str, tuple[datetime, int]] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self.recorded = 0
+        self.flushes = 0
+        self.rows_written = 0
+
+    def record(self, session_id: str, increment_conversation: bool = True):
+        """Note activity on a session; written by the next flush"""
+        _, count = self._pending.get(session_id, (None, 0))
+        self._pending[session_id] = (datetime.utcnow(), count + int(increment_conversation))
+        self.recorded += 1
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="session-activity-writer")
+
+    async def close(self):
+        """Stop the flush loop and write what is still pending"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to flush session activity: {e}")
+
+    @timed(SESSION_SERVICE_SECONDS, operation="flush_session_activity")
+    async def flush(self):
+        """Write all pending activity in one statement"""
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            rows = [(session_id, at, count) for session_id, (at, count) in batch.items()]
+
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self._write(db, rows)
+                    result = await db.execute(
+                        select(Session.id, Session.last_activity, Session.conversation_count, Session.updated_at)
+                        .where(Session.id.in_(list(batch)))
+                    )
+                    written = result.all()
+                    await db.commit()
+            except Exception:
+                # Put the batch back under anything recorded meanwhile
+                for session_id, (at, count) in batch.items():
+                    newer_at, newer_count = self._pending.get(session_id, (at, 0))
+                    self._pending[session_id] = (max(at, newer_at), count + newer_count)
+                raise
+
+            self.flushes += 1
+            self.rows_written += len(rows)
+
+        try:
+            for session_id, last_activity, conversation_count, updated_at in written:
+                await cache_service.update_session_info(session_id, {
+                    "last_activity": last_activity.isoformat(),
+                    "conversation_count": conversation_count,
+                    "updated_at": updated_at.isoformat()
+                })
+        except Exception as e:
+            # The entries catch up when they expire
+            logger.warning(f"Failed to refresh cached session activity: {e}")
+
+    @staticmethod
+    async def _write(db, rows: list[tuple[str, datetime, int]]):
+        if db.bind.dialect.name == "postgresql":
+            # UPDATE sessions ... FROM (VALUES ...) AS activity(id, last_activity, increment)
+            activity = values(
+                column("id", String),
+                column("last_activity", DateTime),
+                column("increment", Integer),
+                name="activity"
+            ).data(rows)
+            stmt = (
+                update(Session)
+                .where(Session.id == activity.c.id)
+                .values(
+                    last_activity=activity.c.last_activity,
+                    conversation_count=Session.conversation_count + activity.c.increment
+                )
+            )
+            await db.execute(stmt)
+        else:
+            # Other backends (SQLite benchmarks) get a batched executemany
+            stmt = (
+                update(Session.__table__)
+                .where(Session.__table__.c.id == bindparam("session_id"))
+                .values(
+                    last_activity=bindparam("at"),
+                    conversation_count=Session.__table__.c.conversation_count + bindparam("increment")
+                )
+            )
+            await db.execute(stmt, [
+                {"session_id": session_id, "at": at, "increment": count}
+                for session_id, at, count in rows
+            ])
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "recorded": self.recorded,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written
+        }
+
+
+# Global session activity writer instance
+session_activity = SessionActivityWriter()
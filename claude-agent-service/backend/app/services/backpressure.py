@@ -0,0 +1,212 @@
+"""
+Bounded subscriber buffers
+
+Sits between a run (which publishes at agent speed) and one subscriber (which
+drains at client speed). When a slow client lets the buffer fill up, the
+overflow policy makes room instead of slowing down the run:
+
+- ``coalesce``: merge the new delta into the last buffered delta of the same type
+- ``drop``: discard raw ``stream_event`` frames, newest first then oldest
+- ``spill``: append the overflow to a temporary file and read it back in order
+
+Events that the coalesce or drop policy cannot absorb are spilled, so no
+meaningful event is ever lost. Spill file I/O runs in a worker thread, so a
+slow client never blocks the event loop that serves every other stream.
+"""
+import asyncio
+import json
+import struct
+import tempfile
+from collections import deque
+from typing import Callable, Optional
+
+from app.core.config import settings
+from app.services.coalesce import DELTA_FIELDS
+from app.utils.sse import dumps
+
+OVERFLOW_POLICIES = ("coalesce", "drop", "spill")
+
+# Events a client can do without (the SDK's raw message_start/stop etc.)
+DROPPABLE_EVENTS = {"stream_event"}
+
+# Spill record header: event id, data length, payload length
+SPILL_HEADER = struct.Struct(">QII")
+
+
+class SubscriberBuffer:
+    """
+    FIFO of run events for one subscriber with a bounded in-memory size
+
+    make_event(event_id, data, payload=None) builds an event, encoding data
+    when no payload is given.
+    """
+
+    def __init__(
+        self,
+        make_event: Callable[..., object],
+        max_size: Optional[int] = None,
+        policy: Optional[str] = None
+    ):
+        self.make_event = make_event
+        self.max_size = max_size or settings.SUBSCRIBER_BUFFER_SIZE
+        self.policy = policy or settings.SUBSCRIBER_OVERFLOW_POLICY
+        if self.policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {self.policy}")
+
+        self._events: deque = deque()
+        self._spill = None
+        # Spilled events: encoded records waiting to be written, then on disk
+        self._spill_out: list[bytes] = []
+        self._spilled_pending = 0
+        self._on_disk = 0
+        self._read_pos = 0
+        self._write_pos = 0
+        self._spill_lock = asyncio.Lock()
+        self._spill_task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self.closed = False
+
+        self.high_water = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.spilled = 0
+
+    def __len__(self) -> int:
+        return len(self._events) + self._spilled_pending
+
+    def put(self, event):
+        """Add an event without blocking"""
+        if self._spilled_pending:
+            # Keep order: once spilling, everything goes to disk until it drains
+            self._spill_write(event)
+        elif len(self._events) < self.max_size:
+            self._events.append(event)
+        elif not self._absorb(event):
+            self._spill_write(event)
+
+        self.high_water = max(self.high_water, len(self))
+        self._wakeup.set()
+
+    def close(self):
+        """Mark the end of the stream"""
+        self.closed = True
+        self._wakeup.set()
+
+    async def get(self):
+        """Get the next event, or None once the buffer is closed and drained"""
+        while True:
+            if not self._events and self._spilled_pending:
+                await self._spill_read()
+            if self._events:
+                return self._events.popleft()
+            if self.closed:
+                return None
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    def discard(self):
+        """Release the spill file once a pending write finished"""
+        self._spill_out.clear()
+        if self._spill_task is not None and not self._spill_task.done():
+            self._spill_task.add_done_callback(lambda _: self._close_spill())
+        else:
+            self._close_spill()
+
+    def _close_spill(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def _absorb(self, event) -> bool:
+        """Apply the overflow policy; return False if the event still needs a slot"""
+        if self.policy == "coalesce":
+            field = DELTA_FIELDS.get(event.type)
+            last = self._events[-1]
+            if field is not None and last.type == event.type:
+                data = dict(last.data)
+                data[field] = (last.data.get(field) or "") + (event.data.get(field) or "")
+                # The merged event takes the newer ID so a resume skips both parts
+                self._events[-1] = self.make_event(event.id, data)
+                self.coalesced += 1
+                return True
+
+        elif self.policy == "drop":
+            if event.type in DROPPABLE_EVENTS:
+                self.dropped += 1
+                return True
+            for buffered in self._events:
+                if buffered.type in DROPPABLE_EVENTS:
+                    self._events.remove(buffered)
+                    self._events.append(event)
+                    self.dropped += 1
+                    return True
+
+        return False
+
+    def _spill_write(self, event):
+        """Queue an event for the spill file; the write happens in the background"""
+        data = dumps(event.data)
+        self._spill_out.append(SPILL_HEADER.pack(event.id, len(data), len(event.payload)) + data + event.payload)
+        self._spilled_pending += 1
+        self.spilled += 1
+        if self._spill_task is None or self._spill_task.done():
+            self._spill_task = asyncio.create_task(self._flush_spill())
+
+    async def _flush_spill(self):
+        async with self._spill_lock:
+            await self._write_spill_out()
+
+    async def _write_spill_out(self):
+        """Append the queued records to the spill file; hold the spill lock"""
+        while self._spill_out:
+            records, self._spill_out = self._spill_out, []
+            await asyncio.to_thread(self._write_records, b"".join(records))
+            self._on_disk += len(records)
+
+    def _write_records(self, chunk: bytes):
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(dir=settings.SUBSCRIBER_SPILL_DIR)
+        self._spill.seek(self._write_pos)
+        self._spill.write(chunk)
+        self._write_pos = self._spill.tell()
+
+    async def _spill_read(self):
+        """Move up to max_size spilled events back into memory"""
+        async with self._spill_lock:
+            # Records still queued come after those on disk
+            await self._write_spill_out()
+            count = min(self._on_disk, self.max_size - len(self._events))
+            records = await asyncio.to_thread(self._read_records, count)
+            for event_id, data, payload in records:
+                self._events.append(self.make_event(event_id, data, payload))
+            self._on_disk -= count
+            self._spilled_pending -= count
+            if not self._on_disk and self._spill is not None:
+                # Drained: reuse the file from the start
+                await asyncio.to_thread(self._reset_spill)
+
+    def _read_records(self, count: int) -> list[tuple[int, dict, bytes]]:
+        self._spill.seek(self._read_pos)
+        records = []
+        for _ in range(count):
+            event_id, data_len, payload_len = SPILL_HEADER.unpack(self._spill.read(SPILL_HEADER.size))
+            data = json.loads(self._spill.read(data_len))
+            payload = self._spill.read(payload_len)
+            records.append((event_id, data, payload))
+        self._read_pos = self._spill.tell()
+        return records
+
+    def _reset_spill(self):
+        self._spill.seek(0)
+        self._spill.truncate()
+        self._read_pos = self._write_pos = 0
+
+    def stats(self) -> dict:
+        """Buffer occupancy and overflow counters"""
+        return {
+            "size": len(self),
+            "high_water": self.high_water,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+        }
@@ -0,0 +1,148 @@
+"""
+Content-addressed blob store
+
+Large tool results are written once to a local directory keyed by their
+sha256 digest (identical results from different sessions share one file) and
+replaced in stream events and the database by a reference plus a preview.
+A blob's media type, when known, is kept next to it in ``<digest>.type``.
+"""
+import asyncio
+import codecs
+import hashlib
+import json
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+import aiofiles
+
+from app.core.config import settings
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Chunk size used when streaming blobs back to clients
+READ_CHUNK_SIZE = 64 * 1024
+
+DEFAULT_MEDIA_TYPE = "application/octet-stream"
+
+# Bytes inspected to tell text from binary for blobs stored without a media type
+SNIFF_BYTES = 8192
+
+
+class BlobStore:
+    """Local sha256-addressed blob store"""
+
+    def __init__(self):
+        self.root = Path(settings.BLOB_STORE_ROOT)
+        self.inline_max_bytes = settings.TOOL_RESULT_INLINE_MAX_BYTES
+        self.preview_chars = settings.TOOL_RESULT_PREVIEW_CHARS
+
+    async def initialize(self):
+        """Create the store root"""
+        await asyncio.to_thread(self.root.mkdir, parents=True, exist_ok=True)
+
+    def path_for(self, digest: str) -> Path:
+        """Get the file path of a blob"""
+        if not DIGEST_PATTERN.match(digest):
+            raise ValueError(f"Invalid blob digest: {digest}")
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    async def put(self, data: bytes, media_type: Optional[str] = None) -> str:
+        """Store data and return its digest; existing blobs are not rewritten"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if not await asyncio.to_thread(path.exists):
+            await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+            await self._write(path, data)
+        if media_type and not await asyncio.to_thread(self._type_path(path).exists):
+            await self._write(self._type_path(path), media_type.encode())
+        return digest
+
+    @staticmethod
+    def _type_path(path: Path) -> Path:
+        return path.with_name(f"{path.name}.type")
+
+    @staticmethod
+    async def _write(path: Path, data: bytes):
+        """Write a file atomically"""
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        async with aiofiles.open(tmp_path, "wb") as f:
+            await f.write(data)
+        await asyncio.to_thread(os.replace, tmp_path, path)
+
+    async def media_type(self, digest: str) -> str:
+        """
+        Media type a blob was stored with
+
+        Blobs stored without one are served as UTF-8 text when their first
+        bytes decode as such, and as application/octet-stream otherwise.
+        """
+        path = self.path_for(digest)
+        try:
+            async with aiofiles.open(self._type_path(path), "rb") as f:
+                return (await f.read()).decode()
+        except FileNotFoundError:
+            pass
+
+        async with aiofiles.open(path, "rb") as f:
+            head = await f.read(SNIFF_BYTES)
+        try:
+            # Incremental, so a character cut off at the end of the sample is fine
+            codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        except UnicodeDecodeError:
+            return DEFAULT_MEDIA_TYPE
+        return DEFAULT_MEDIA_TYPE if b"\0" in head else "text/plain"
+
+    def size(self, digest: str) -> Optional[int]:
+        """Get the size of a blob, or None if it does not exist"""
+        try:
+            return self.path_for(digest).stat().st_size
+        except (FileNotFoundError, ValueError):
+            return None
+
+    async def read_range(self, digest: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """Yield the bytes of a blob from start to end (inclusive)"""
+        remaining = end - start + 1
+        async with aiofiles.open(self.path_for(digest), "rb") as f:
+            await f.seek(start)
+            while remaining > 0:
+                chunk = await f.read(min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    async def offload(self, content: Any) -> tuple[Any, Optional[dict]]:
+        """
+        Offload a tool result if it is larger than the inline threshold
+
+        Returns the content to send inline (the original content, or a text
+        preview) and the blob reference, which is None for small results.
+        """
+        if content is None:
+            return content, None
+
+        if isinstance(content, str):
+            text = content
+            media_type = "text/plain"
+        else:
+            text = json.dumps(content, ensure_ascii=False)
+            media_type = "application/json"
+
+        data = text.encode("utf-8")
+        if len(data) <= self.inline_max_bytes:
+            return content, None
+
+        digest = await self.put(data, media_type)
+        reference = {
+            "sha256": digest,
+            "size": len(data),
+            "media_type": media_type,
+            "url": f"/api/blobs/{digest}",
+        }
+        return text[:self.preview_chars], reference
+
+
+# Global blob store instance
+blob_store = BlobStore()
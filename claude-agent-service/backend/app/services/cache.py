@@ -1,12 +1,83 @@
 """
 Redis cache service
+
+Reads go through a small in-process LRU (L1) before Redis (L2). Every write or
+delete is broadcast on a pub/sub channel so the other workers drop their local
+copy; a short TTL bounds staleness should an invalidation be missed.
 """
+import asyncio
 import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
 from typing import Optional, Any
 from redis.asyncio import Redis
+from redis.exceptions import WatchError
 
 from app.core.redis import get_redis
 from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+INVALIDATE_CHANNEL = "cache:invalidate"
+
+# Approximate bookkeeping cost of one local entry beyond its key and value
+ENTRY_OVERHEAD = 100
+
+
+class LocalCache:
+    """LRU of raw cached values with a TTL and entry and byte bounds"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.evictions = 0
+        # Bumped by every invalidation; see CacheService.get
+        self.version = 0
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str):
+        self._remove(key)
+        cost = len(key) + len(value) + ENTRY_OVERHEAD
+        if cost > self.max_bytes:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self.size += cost
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, key: str):
+        self.version += 1
+        self._remove(key)
+
+    def clear(self):
+        self.version += 1
+        self._entries.clear()
+        self.size = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(key) + len(entry[1]) + ENTRY_OVERHEAD
 
 
 class CacheService:
@@ -15,23 +86,85 @@ class CacheService:
     def __init__(self):
         self.redis: Optional[Redis] = None
         self.ttl = settings.REDIS_CACHE_TTL
+        self.local: Optional[LocalCache] = None
+        if settings.LOCAL_CACHE_ENABLED:
+            self.local = LocalCache(
+                settings.LOCAL_CACHE_MAX_ENTRIES,
+                settings.LOCAL_CACHE_MAX_BYTES,
+                settings.LOCAL_CACHE_TTL
+            )
+        # Tags this worker's invalidations so it skips its own
+        self.instance_id = uuid.uuid4().hex
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self._listener: Optional[asyncio.Task] = None
 
     async def initialize(self):
         """Initialize Redis connection"""
         self.redis = await get_redis()
+        if self.local is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen_for_invalidations())
+
+    async def close(self):
+        """Stop the invalidation listener"""
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+
+    async def _listen_for_invalidations(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATE_CHANNEL)
+                # Anything written while unsubscribed may be stale
+                self.local.clear()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    origin, _, key = message["data"].partition(" ")
+                    if origin != self.instance_id:
+                        self.local.invalidate(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener failed, resubscribing: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
+
+    async def _invalidate(self, key: str):
+        """Drop a key from the local tier of every worker"""
+        if self.local is None:
+            return
+        self.local.invalidate(key)
+        await self.redis.publish(INVALIDATE_CHANNEL, f"{self.instance_id} {key}")
 
     async def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
         if not self.redis:
             return None
 
-        value = await self.redis.get(key)
-        if value:
-            try:
-                return json.loads(value)
-            except json.JSONDecodeError:
-                return value
-        return None
+        value = self.local.get(key) if self.local is not None else None
+        if value is not None:
+            self.l1_hits += 1
+            CACHE_REQUESTS_TOTAL.inc(result="l1_hit")
+        else:
+            version = self.local.version if self.local is not None else 0
+            value = await self.redis.get(key)
+            CACHE_REQUESTS_TOTAL.inc(result="hit" if value else "miss")
+            if not value:
+                self.misses += 1
+                return None
+            self.l2_hits += 1
+            # Skip the local copy if an invalidation arrived during the read
+            if self.local is not None and self.local.version == version:
+                self.local.set(key, value)
+
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return value
 
     async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """Set value in cache"""
@@ -44,6 +177,9 @@ class CacheService:
             value = json.dumps(value)
 
         await self.redis.set(key, value, ex=expire_time)
+        await self._invalidate(key)
+        if self.local is not None and isinstance(value, str):
+            self.local.set(key, value)
         return True
 
     async def delete(self, key: str) -> bool:
@@ -52,8 +188,38 @@ class CacheService:
             return False
 
         result = await self.redis.delete(key)
+        await self._invalidate(key)
         return bool(result)
 
+    async def update(self, key: str, fields: dict) -> bool:
+        """
+        Merge fields into a cached JSON object, keeping its TTL
+
+        Does nothing when the key is not cached. If the entry is rewritten
+        concurrently it is deleted rather than merged into a stale copy.
+        """
+        if not self.redis:
+            return False
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                value = await pipe.get(key)
+                if not value:
+                    return False
+                value = json.dumps({**json.loads(value), **fields})
+                pipe.multi()
+                pipe.set(key, value, keepttl=True)
+                await pipe.execute()
+            except WatchError:
+                await self.delete(key)
+                return False
+
+        await self._invalidate(key)
+        if self.local is not None:
+            self.local.set(key, value)
+        return True
+
     async def exists(self, key: str) -> bool:
         """Check if key exists"""
         if not self.redis:
@@ -66,7 +232,9 @@ class CacheService:
         if not self.redis:
             return 0
 
-        return await self.redis.incrby(key, amount)
+        value = await self.redis.incrby(key, amount)
+        await self._invalidate(key)
+        return value
 
     async def get_session_info(self, session_id: str) -> Optional[dict]:
         """Get session info from cache"""
@@ -76,6 +244,10 @@ class CacheService:
         """Set session info in cache"""
         return await self.set(f"session:{session_id}", info, ttl)
 
+    async def update_session_info(self, session_id: str, fields: dict) -> bool:
+        """Update fields of cached session info"""
+        return await self.update(f"session:{session_id}", fields)
+
     async def delete_session_info(self, session_id: str) -> bool:
         """Delete session info from cache"""
         return await self.delete(f"session:{session_id}")
@@ -88,6 +260,23 @@ class CacheService:
         keys = await self.redis.keys("session:*")
         return [key.replace("session:", "") for key in keys]
 
+    def stats(self) -> dict:
+        """Hits per tier and local cache occupancy"""
+        lookups = self.l1_hits + self.l2_hits + self.misses
+        stats = {
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "l1_hit_rate": round(self.l1_hits / lookups, 4) if lookups else None
+        }
+        if self.local is not None:
+            stats["local"] = {
+                "entries": len(self.local),
+                "bytes": self.local.size,
+                "evictions": self.local.evictions
+            }
+        return stats
+
 
 # Global cache service instance
 cache_service = CacheService()
@@ -0,0 +1,166 @@
+"""
+Incremental response checkpointing
+
+Buffers streamed text for a conversation and appends it to the conversations
+row every CHECKPOINT_INTERVAL_MS or CHECKPOINT_MAX_BYTES, so a crash loses at
+most one interval and the full response never has to be held in memory.
+
+Runs of a worker that crashed never write their final status. Every worker
+therefore stamps its in-flight conversations every
+STALE_CONVERSATION_SWEEP_INTERVAL_MS, and a conversation still in progress whose
+last checkpoint is older than STALE_CONVERSATION_AFTER_MS is marked aborted,
+keeping its partial response.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services.session import session_service
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCheckpointer:
+    """Write-behind buffer for the assistant response of one conversation"""
+
+    def __init__(self, conversation_id: str):
+        self.conversation_id = conversation_id
+        self.interval = settings.CHECKPOINT_INTERVAL_MS / 1000
+        self.max_bytes = settings.CHECKPOINT_MAX_BYTES
+
+        self._pending: list[str] = []
+        self._pending_size = 0
+        self._tool_calls_dirty = False
+        self._last_flush = time.monotonic()
+
+        self.text_written = 0
+        self.checkpoints = 0
+
+    @property
+    def has_text(self) -> bool:
+        """Whether any streamed text was received"""
+        return self.text_written > 0 or self._pending_size > 0
+
+    def add_text(self, chunk: str):
+        """Buffer a streamed text chunk"""
+        if chunk:
+            self._pending.append(chunk)
+            self._pending_size += len(chunk)
+
+    def mark_tool_calls(self):
+        """Note that the tool call list changed since the last checkpoint"""
+        self._tool_calls_dirty = True
+
+    def due(self) -> bool:
+        """Whether the buffer is big or old enough to be written"""
+        if not self._pending and not self._tool_calls_dirty:
+            return False
+        return (
+            self._pending_size >= self.max_bytes
+            or time.monotonic() - self._last_flush >= self.interval
+        )
+
+    async def maybe_flush(self, tool_calls: dict):
+        """Checkpoint if due"""
+        if self.due():
+            await self.flush(tool_calls)
+
+    async def flush(
+        self,
+        tool_calls: Optional[dict] = None,
+        status: Optional[str] = None,
+        response: Optional[str] = None
+    ) -> bool:
+        """
+        Write buffered text, the tool calls (keyed by tool_use_id) and optionally
+        a final status
+
+        On failure the buffered text is kept and retried with the next flush.
+        """
+        text = "".join(self._pending)
+        tool_call_list = None
+        if tool_calls is not None and (self._tool_calls_dirty or status is not None):
+            tool_call_list = list(tool_calls.values())
+
+        self._pending = []
+        self._pending_size = 0
+        self._last_flush = time.monotonic()
+
+        async with AsyncSessionLocal() as db:
+            try:
+                await session_service.checkpoint_conversation(
+                    db,
+                    self.conversation_id,
+                    text=text,
+                    tool_calls=tool_call_list,
+                    status=status,
+                    response=response
+                )
+                await db.commit()
+            except Exception as e:
+                logger.error(f"Failed to checkpoint conversation {self.conversation_id}: {e}")
+                await db.rollback()
+                if text:
+                    self._pending.insert(0, text)
+                    self._pending_size += len(text)
+                return False
+
+        self.text_written += len(text)
+        self._tool_calls_dirty = False
+        self.checkpoints += 1
+        return True
+
+
+class StaleConversationSweeper:
+    """Heartbeats this worker's runs and aborts conversations left behind by dead ones"""
+
+    def __init__(self):
+        self.interval = settings.STALE_CONVERSATION_SWEEP_INTERVAL_MS / 1000
+        self.stale_after = timedelta(milliseconds=settings.STALE_CONVERSATION_AFTER_MS)
+        self.aborted = 0
+        self._live: Callable[[], list[str]] = list
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, live_conversations: Callable[[], list[str]]):
+        """Sweep once, then keep sweeping; live_conversations lists this worker's runs"""
+        self._live = live_conversations
+        if self._task is None:
+            await self.sweep()
+            self._task = asyncio.create_task(self._run(), name="stale-conversation-sweeper")
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to sweep stale conversations: {e}")
+
+    async def sweep(self) -> int:
+        """Stamp the live runs, then abort what nobody stamped within STALE_CONVERSATION_AFTER_MS"""
+        async with AsyncSessionLocal() as db:
+            await session_service.touch_conversations(db, self._live())
+            aborted = await session_service.abort_stale_conversations(
+                db, datetime.utcnow() - self.stale_after
+            )
+            await db.commit()
+        if aborted:
+            self.aborted += aborted
+            logger.warning(f"Marked {aborted} conversation(s) of stopped runs as aborted")
+        return aborted
+
+
+# Global stale conversation sweeper instance
+stale_conversation_sweeper = StaleConversationSweeper()
@@ -0,0 +1,386 @@
+"""
+Claude SDK client pool
+
+Keeps one live ClaudeSDKClient (and its CLI subprocess) per active session so
+that follow-up turns reuse the running process instead of spawning the CLI and
+replaying the resume transcript on every message.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator, Callable, Optional
+
+from claude_agent_sdk import ClaudeSDKClient, ClaudeAgentOptions, SystemMessage
+
+from app.core.config import settings
+from app.core.metrics import CLAUDE_CLIENT_SPAWN_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of one response on a client's output queue
+_END = object()
+
+
+def get_claude_env() -> dict:
+    """Get Claude environment variables"""
+    return {
+        'ANTHROPIC_BEDROCK_BASE_URL': settings.ANTHROPIC_BEDROCK_BASE_URL,
+        'CLAUDE_CODE_SKIP_BEDROCK_AUTH': settings.CLAUDE_CODE_SKIP_BEDROCK_AUTH,
+        'CLAUDE_CODE_USE_BEDROCK': settings.CLAUDE_CODE_USE_BEDROCK,
+        'ANTHROPIC_AUTH_TOKEN': settings.ANTHROPIC_AUTH_TOKEN,
+        'ANTHROPIC_SMALL_FAST_MODEL': settings.ANTHROPIC_SMALL_FAST_MODEL,
+        'ANTHROPIC_MODEL': settings.ANTHROPIC_MODEL
+    }
+
+
+def get_claude_options(workspace_path: str, permission_mode: str = "acceptEdits",
+                      claude_session_id: str = None, max_turns: int = None) -> ClaudeAgentOptions:
+    """Get Claude Agent options"""
+    settings_path = str(Path(workspace_path) / ".claude" / "settings.local.json")
+
+    options = ClaudeAgentOptions(
+        env=get_claude_env(),
+        cwd=workspace_path,
+        permission_mode=permission_mode,
+        system_prompt={
+            "type": "preset",
+            "preset": "claude_code"
+        },
+        setting_sources=['project'],
+        settings=settings_path,
+        include_partial_messages=True  # Enable streaming
+    )
+
+    # Use Claude session ID to resume conversation
+    if claude_session_id:
+        options.resume = claude_session_id
+
+    if max_turns:
+        options.max_turns = max_turns
+
+    return options
+
+
+def claude_transcript_path(workspace_path: str, claude_session_id: str) -> Path:
+    """Where the Claude CLI keeps the resume transcript of a session run in workspace_path"""
+    config_dir = Path(os.environ.get("CLAUDE_CONFIG_DIR") or Path.home() / ".claude")
+    project = re.sub(r"[^a-zA-Z0-9]", "-", str(workspace_path))
+    return config_dir / "projects" / project / f"{claude_session_id}.jsonl"
+
+
+@lru_cache(maxsize=None)
+def get_transport_factory() -> Optional[Callable]:
+    """Resolve CLAUDE_TRANSPORT_FACTORY ("module:callable"), or None for the CLI subprocess"""
+    if not settings.CLAUDE_TRANSPORT_FACTORY:
+        return None
+    module_name, _, attribute = settings.CLAUDE_TRANSPORT_FACTORY.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def options_signature(options: ClaudeAgentOptions) -> tuple:
+    """Options that require a new CLI process when they change"""
+    return (str(options.cwd), options.permission_mode, options.max_turns)
+
+
+class PooledClient:
+    """
+    A ClaudeSDKClient owned by a dedicated background task
+
+    The SDK requires a client to be used from the task that connected it, so the
+    client lives inside its own task and turns are handed over through queues.
+    """
+
+    def __init__(self, key: str, options: ClaudeAgentOptions):
+        self.key = key
+        self.options = options
+        self.signature = options_signature(options)
+        # Claude session the CLI process is on; set by resume, then by each init message
+        self.claude_session_id: Optional[str] = options.resume
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        self.spawn_ms: Optional[float] = None
+
+        self._client: Optional[ClaudeSDKClient] = None
+        self._jobs: asyncio.Queue = asyncio.Queue()
+        self._ready = asyncio.Event()
+        self._error: Optional[BaseException] = None
+        self._task: Optional[asyncio.Task] = None
+        self._process = None
+
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+
+    @property
+    def alive(self) -> bool:
+        return self._task is not None and not self._task.done() and self._error is None
+
+    def matches(self, options: ClaudeAgentOptions) -> bool:
+        """Whether a turn with these options can run on this client"""
+        return self.signature == options_signature(options) and self.claude_session_id == options.resume
+
+    async def start(self):
+        """Spawn the CLI process and wait until the client is connected"""
+        started_at = time.perf_counter()
+        self._task = asyncio.create_task(self._run(), name=f"claude-client-{self.key}")
+        await self._ready.wait()
+        if self._error:
+            raise self._error
+        self.spawn_ms = (time.perf_counter() - started_at) * 1000
+
+    async def _run(self):
+        """Own the SDK client for its whole lifetime and serve queued turns"""
+        # Output queue of the turn in progress; whoever ends the turn clears it
+        out: Optional[asyncio.Queue] = None
+        try:
+            factory = get_transport_factory()
+            transport = factory(self.options) if factory else None
+            async with ClaudeSDKClient(options=self.options, transport=transport) as client:
+                self._client = client
+                # Keep a handle on the CLI process so it can be killed if shutdown fails
+                self._process = getattr(getattr(client, "_transport", None), "_process", None)
+                self._ready.set()
+
+                while True:
+                    job = await self._jobs.get()
+                    if job is None:
+                        break
+
+                    prompt, out = job
+                    try:
+                        await client.query(prompt)
+                        async for message in client.receive_response():
+                            if isinstance(message, SystemMessage) and message.subtype == "init" and message.data:
+                                self.claude_session_id = message.data.get("session_id", self.claude_session_id)
+                            out.put_nowait(message)
+                        out.put_nowait(_END)
+                        out = None
+                    except Exception as e:
+                        self._error = e
+                        out.put_nowait(e)
+                        out = None
+                        break
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+            if not isinstance(e, (Exception, asyncio.CancelledError)):
+                raise
+        finally:
+            self._client = None
+            # Fail the turn in progress and any turn still waiting for this client
+            stopped = RuntimeError(f"Claude client {self.key} stopped")
+            if out is not None:
+                out.put_nowait(stopped)
+            while not self._jobs.empty():
+                job = self._jobs.get_nowait()
+                if job is not None:
+                    job[1].put_nowait(stopped)
+            self._ready.set()
+
+    async def send(self, prompt: str) -> AsyncIterator:
+        """Send a query and yield messages until the ResultMessage"""
+        if not self.alive:
+            raise RuntimeError(f"Claude client {self.key} is not running")
+
+        out: asyncio.Queue = asyncio.Queue()
+        await self._jobs.put((prompt, out))
+
+        while True:
+            item = await out.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    async def interrupt(self):
+        """Interrupt the response currently being generated"""
+        if self._client is not None:
+            await self._client.interrupt()
+
+    async def close(self, timeout: float = 5.0):
+        """Disconnect the client and terminate its CLI process"""
+        if self._task is None or self._task.done():
+            self._reap()
+            return
+
+        await self._jobs.put(None)
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=timeout)
+        except (asyncio.TimeoutError, Exception):
+            await self.terminate()
+        self._reap()
+
+    async def terminate(self, timeout: float = 5.0):
+        """Stop the client immediately, even in the middle of a turn"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.wait({self._task}, timeout=timeout)
+        self._reap()
+
+    def _reap(self):
+        """Kill the CLI process if the SDK left it running"""
+        process, self._process = self._process, None
+        if process is not None and process.returncode is None:
+            try:
+                process.kill()
+                logger.warning(f"Killed lingering Claude CLI process for {self.key}")
+            except ProcessLookupError:
+                pass
+
+
+class ClaudeClientPool:
+    """Session-scoped pool of live Claude SDK clients with LRU and idle eviction"""
+
+    def __init__(self):
+        self.max_size = settings.CLIENT_POOL_MAX_SIZE
+        self.idle_timeout = settings.CLIENT_POOL_IDLE_TIMEOUT
+
+        self._clients: "OrderedDict[str, PooledClient]" = OrderedDict()
+        self._reaper: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.adopted = 0
+        self.spawn_count = 0
+        self.spawn_ms_total = 0.0
+        self.last_spawn_ms: Optional[float] = None
+
+    async def start(self):
+        """Start the idle reaper"""
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_idle())
+
+    async def close(self):
+        """Stop the reaper and close every pooled client"""
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+
+        clients = list(self._clients.values())
+        self._clients.clear()
+        await asyncio.gather(*(c.close() for c in clients), return_exceptions=True)
+
+    @asynccontextmanager
+    async def acquire(self, key: str, options: ClaudeAgentOptions):
+        """
+        Get the live client for a session, spawning one on a miss
+
+        The client is held exclusively until the context exits. A client whose
+        turn raised is discarded so the next turn starts from a fresh process;
+        a cancelled turn terminates the process right away.
+        """
+        pooled = self._clients.get(key)
+        if pooled and pooled.started and (
+            not pooled.alive or not pooled.matches(options)
+        ):
+            await self.discard(key)
+            pooled = None
+
+        if pooled:
+            self.hits += 1
+            self._clients.move_to_end(key)
+        else:
+            self.misses += 1
+            pooled = PooledClient(key, options)
+            self._clients[key] = pooled
+
+        async with pooled.lock:
+            if not pooled.started:
+                try:
+                    await pooled.start()
+                except Exception:
+                    self._clients.pop(key, None)
+                    raise
+                self._record_spawn(pooled.spawn_ms)
+                logger.info(f"Spawned Claude client for {key} in {pooled.spawn_ms:.0f} ms")
+                await self._enforce_capacity()
+
+            try:
+                yield pooled
+            except BaseException as e:
+                if self._clients.get(key) is pooled:
+                    self._clients.pop(key, None)
+                if isinstance(e, Exception):
+                    await pooled.close()
+                else:
+                    await pooled.terminate()
+                raise
+            finally:
+                pooled.last_used = time.monotonic()
+
+    async def adopt(self, key: str, pooled: PooledClient):
+        """Take ownership of an already running client, e.g. from the standby pool"""
+        previous = self._clients.pop(key, None)
+        if previous and previous is not pooled:
+            asyncio.create_task(previous.close())
+        pooled.key = key
+        pooled.last_used = time.monotonic()
+        self._clients[key] = pooled
+        self.adopted += 1
+        await self._enforce_capacity()
+
+    async def discard(self, key: str):
+        """Close and forget the client for a session"""
+        pooled = self._clients.pop(key, None)
+        if pooled:
+            await pooled.close()
+
+    def _record_spawn(self, spawn_ms: float):
+        CLAUDE_CLIENT_SPAWN_SECONDS.observe(spawn_ms / 1000)
+        self.spawn_count += 1
+        self.spawn_ms_total += spawn_ms
+        self.last_spawn_ms = spawn_ms
+
+    async def _enforce_capacity(self):
+        """Evict least recently used idle clients above the size cap"""
+        for key in list(self._clients.keys()):
+            if len(self._clients) <= self.max_size:
+                break
+            pooled = self._clients[key]
+            if pooled.lock.locked():
+                continue
+            self.evictions += 1
+            await self.discard(key)
+
+    async def _reap_idle(self):
+        """Periodically close clients idle longer than the timeout"""
+        interval = max(1, min(self.idle_timeout // 2, 30))
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for key, pooled in list(self._clients.items()):
+                if pooled.lock.locked():
+                    continue
+                if not pooled.alive or now - pooled.last_used > self.idle_timeout:
+                    self.evictions += 1
+                    await self.discard(key)
+
+    def stats(self) -> dict:
+        """Pool size, hit/miss counters and spawn latency"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._clients),
+            "max_size": self.max_size,
+            "busy": sum(1 for c in self._clients.values() if c.lock.locked()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "adopted": self.adopted,
+            "spawn_count": self.spawn_count,
+            "avg_spawn_ms": self.spawn_ms_total / self.spawn_count if self.spawn_count else None,
+            "last_spawn_ms": self.last_spawn_ms,
+        }
+
+
+# Global client pool instance
+client_pool = ClaudeClientPool()
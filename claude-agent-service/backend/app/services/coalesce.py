@@ -0,0 +1,114 @@
+"""
+Stream delta coalescing
+
+Merges runs of consecutive text_delta / tool_input_delta events into a single
+event so that a stream emits one frame per time window instead of one frame per
+model token.
+"""
+import asyncio
+import time
+from typing import AsyncIterator, Optional
+
+# Coalescible event types and the field that carries their text
+DELTA_FIELDS = {
+    "text_delta": "content",
+    "tool_input_delta": "partial_json",
+}
+
+
+class DeltaCoalescer:
+    """Buffers consecutive deltas until the window elapses or the batch grows too big"""
+
+    def __init__(self, window_ms: int, max_bytes: int):
+        self.window = window_ms / 1000
+        self.max_bytes = max_bytes
+
+        self._pending: Optional[dict] = None
+        self._parts: list[str] = []
+        self._size = 0
+        self._deadline: Optional[float] = None
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """Monotonic time at which the pending batch must be flushed"""
+        return self._deadline
+
+    def push(self, event: dict) -> list[dict]:
+        """Add an event and return the events that are ready to be sent"""
+        field = DELTA_FIELDS.get(event.get("type"))
+        if field is None:
+            return self.flush() + [event]
+
+        ready = []
+        if self._pending is not None and self._pending["type"] != event["type"]:
+            ready = self.flush()
+
+        chunk = event.get(field) or ""
+        if self._pending is None:
+            self._pending = dict(event)
+            self._deadline = time.monotonic() + self.window
+        self._parts.append(chunk)
+        self._size += len(chunk)
+
+        if self._size >= self.max_bytes or time.monotonic() >= self._deadline:
+            ready.extend(self.flush())
+        return ready
+
+    def flush(self) -> list[dict]:
+        """Return the pending batch as one merged event"""
+        if self._pending is None:
+            return []
+
+        event = self._pending
+        event[DELTA_FIELDS[event["type"]]] = "".join(self._parts)
+
+        self._pending = None
+        self._parts = []
+        self._size = 0
+        self._deadline = None
+        return [event]
+
+
+async def coalesce_events(source: AsyncIterator[dict], coalescer: DeltaCoalescer) -> AsyncIterator[dict]:
+    """
+    Apply a coalescer to an event stream
+
+    A pending batch is flushed when its window expires even if the source is
+    idle, so coalescing never delays text by more than the window.
+    """
+    pending_next: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending_next is None:
+                pending_next = asyncio.ensure_future(source.__anext__())
+
+            timeout = None
+            if coalescer.deadline is not None:
+                timeout = max(0.0, coalescer.deadline - time.monotonic())
+
+            done, _ = await asyncio.wait({pending_next}, timeout=timeout)
+            if not done:
+                for event in coalescer.flush():
+                    yield event
+                continue
+
+            try:
+                event = pending_next.result()
+            except StopAsyncIteration:
+                pending_next = None
+                break
+            pending_next = None
+
+            for ready in coalescer.push(event):
+                yield ready
+
+        for event in coalescer.flush():
+            yield event
+    finally:
+        if pending_next is not None and not pending_next.done():
+            pending_next.cancel()
+            try:
+                await pending_next
+            except BaseException:
+                pass
+        await source.aclose()
@@ -0,0 +1,88 @@
+"""
+Maintained row counts
+
+Totals that requests need on every call (active sessions for admission,
+sessions and conversations for list totals) are kept in the counters table and
+changed in the same transaction as the rows they count, so reading one is a
+primary-key lookup instead of a COUNT over the table. A missing counter is
+seeded from a COUNT query the first time it is used.
+"""
+from typing import Optional
+from sqlalchemy import Select, select, update, delete as sql_delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.counter import Counter
+
+ACTIVE_SESSIONS = "sessions:active"
+TOTAL_SESSIONS = "sessions:total"
+
+
+def conversations_counter(session_id: str) -> str:
+    return f"conversations:{session_id}"
+
+
+class CounterService:
+    """Transactional counters in the counters table"""
+
+    async def get(self, db: AsyncSession, name: str, seed: Select) -> int:
+        """Current value, seeding the counter from ``seed`` (a COUNT select) when missing"""
+        value = await db.scalar(select(Counter.value).where(Counter.name == name))
+        if value is not None:
+            return value
+        await self._seed(db, name, seed)
+        return await db.scalar(select(Counter.value).where(Counter.name == name))
+
+    async def add(
+        self,
+        db: AsyncSession,
+        name: str,
+        delta: int,
+        seed: Select,
+        limit: Optional[int] = None
+    ) -> Optional[int]:
+        """
+        Add ``delta`` to a counter and return the new value
+
+        Call it before inserting or deleting the counted rows, so a missing
+        counter is seeded with the count before the change. With a limit the
+        update only happens while the result stays within it, and None is
+        returned otherwise; the row lock makes the check atomic across workers.
+        """
+        for _ in range(2):
+            stmt = (
+                update(Counter)
+                .where(Counter.name == name)
+                .values(value=Counter.value + delta)
+                .returning(Counter.value)
+            )
+            if limit is not None:
+                stmt = stmt.where(Counter.value + delta <= limit)
+            value = (await db.execute(stmt)).scalar_one_or_none()
+            if value is not None:
+                return value
+            if not await self._seed(db, name, seed):
+                # The counter exists, so the limit was reached
+                return None
+        return None
+
+    async def discard(self, db: AsyncSession, name: str):
+        """Drop a counter whose rows are gone"""
+        await db.execute(sql_delete(Counter).where(Counter.name == name))
+
+    async def _seed(self, db: AsyncSession, name: str, seed: Select) -> bool:
+        """Create a missing counter; False when it already exists"""
+        if await db.scalar(select(Counter.name).where(Counter.name == name)) is not None:
+            return False
+        value = await db.scalar(seed)
+        try:
+            async with db.begin_nested():
+                db.add(Counter(name=name, value=value or 0))
+        except IntegrityError:
+            # Seeded concurrently by another request
+            pass
+        return True
+
+
+# Global counter service instance
+counter_service = CounterService()
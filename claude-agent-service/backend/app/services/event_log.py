@@ -0,0 +1,154 @@
+"""
+Per-conversation event logs
+
+Every event a run publishes is appended to a compact on-disk log, so a past
+conversation can be re-streamed exactly as it was emitted (and analysed offline)
+after its Redis Stream has expired. A log is a sequence of records, each a
+4-byte big-endian length followed by the msgpack encoding of
+``[event_id, event_data]``. The conversation row stores the log's path relative
+to EVENT_LOG_ROOT and its event count.
+"""
+import asyncio
+import logging
+import struct
+import time
+import uuid
+from pathlib import Path
+from typing import Iterator, Optional
+import aiofiles
+import msgpack
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct(">I")
+
+LOG_SUFFIX = ".events"
+
+# Records read from disk per batch when streaming a log back
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def encode_record(event_id: int, data: dict) -> bytes:
+    """One length-prefixed log record"""
+    body = msgpack.packb([event_id, data], use_bin_type=True)
+    return RECORD_HEADER.pack(len(body)) + body
+
+
+def iter_records(buffer: bytes) -> Iterator[tuple[int, dict]]:
+    """Decode the complete records of a buffer; a torn record at the end is ignored"""
+    offset = 0
+    size = len(buffer)
+    while offset + RECORD_HEADER.size <= size:
+        (length,) = RECORD_HEADER.unpack_from(buffer, offset)
+        end = offset + RECORD_HEADER.size + length
+        if end > size:
+            return
+        event_id, data = msgpack.unpackb(buffer[offset + RECORD_HEADER.size:end], raw=False)
+        yield event_id, data
+        offset = end
+
+
+def read_event_log(path: str) -> Iterator[tuple[int, dict]]:
+    """(event_id, event) pairs of a log file, for offline analysis"""
+    return iter_records(Path(path).read_bytes())
+
+
+class EventLogWriter:
+    """Buffered appender for one conversation's log"""
+
+    def __init__(self, path: Path, flush_bytes: int, flush_interval: float):
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.count = 0
+        self.failed = False
+        self._buffer = bytearray()
+        self._last_flush = time.monotonic()
+
+    async def append(self, event_id: int, data: dict):
+        """Buffer an event, writing the buffer out when it is large or old enough"""
+        if self.failed:
+            return
+        self._buffer += encode_record(event_id, data)
+        self.count += 1
+        if len(self._buffer) >= self.flush_bytes or time.monotonic() - self._last_flush >= self.flush_interval:
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer or self.failed:
+            return
+        data, self._buffer = bytes(self._buffer), bytearray()
+        self._last_flush = time.monotonic()
+        try:
+            async with aiofiles.open(self.path, "ab") as f:
+                await f.write(data)
+        except OSError as e:
+            # Losing the log must never break the live run
+            self.failed = True
+            logger.warning(f"Failed to write event log {self.path}: {e}")
+
+
+class EventLogService:
+    """Local directory of per-conversation event logs"""
+
+    def __init__(self):
+        self.enabled = settings.EVENT_LOG_ENABLED
+        self.root = Path(settings.EVENT_LOG_ROOT)
+        self.flush_bytes = settings.EVENT_LOG_FLUSH_BYTES
+        self.flush_interval = settings.EVENT_LOG_FLUSH_INTERVAL_MS / 1000
+
+    @staticmethod
+    def relative_path(conversation_id: str) -> str:
+        """Log path below the root; conversation IDs are UUIDs"""
+        name = str(uuid.UUID(conversation_id))
+        return f"{name[:2]}/{name}{LOG_SUFFIX}"
+
+    def path_for(self, relative_path: str) -> Path:
+        path = (self.root / relative_path).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid event log path: {relative_path}")
+        return path
+
+    async def open(self, conversation_id: str) -> Optional[EventLogWriter]:
+        """Start the log of a conversation; None when logging is disabled"""
+        if not self.enabled:
+            return None
+        path = self.root / self.relative_path(conversation_id)
+        try:
+            await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+            # A conversation runs once; start from an empty file
+            await asyncio.to_thread(path.write_bytes, b"")
+        except OSError as e:
+            logger.warning(f"Failed to create event log {path}: {e}")
+            return None
+        return EventLogWriter(path, self.flush_bytes, self.flush_interval)
+
+    async def read(self, relative_path: str, after: int = 0):
+        """Yield the (event_id, event) pairs of a log after an event ID"""
+        pending = b""
+        async with aiofiles.open(self.path_for(relative_path), "rb") as f:
+            while True:
+                chunk = await f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    return
+                pending += chunk
+                consumed = 0
+                for event_id, data in iter_records(pending):
+                    consumed += RECORD_HEADER.unpack_from(pending, consumed)[0] + RECORD_HEADER.size
+                    if event_id > after:
+                        yield event_id, data
+                pending = pending[consumed:]
+
+    async def delete(self, relative_paths: list[str]):
+        """Remove the logs of deleted conversations"""
+        for relative_path in relative_paths:
+            try:
+                await asyncio.to_thread(self.path_for(relative_path).unlink, missing_ok=True)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to delete event log {relative_path}: {e}")
+
+
+# Global event log service instance
+event_log_service = EventLogService()
@@ -0,0 +1,174 @@
+"""
+Resumable chat event streams
+
+Every event emitted for a conversation is appended to a bounded Redis Stream
+under an explicit, monotonically increasing ID (``0-<n>``), so a client that
+lost its connection can replay everything after its ``Last-Event-ID`` and then
+keep following the live run.
+"""
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+from redis.asyncio import Redis
+
+from app.core.redis import get_redis
+from app.core.config import settings
+from app.utils.sse import dumps
+
+logger = logging.getLogger(__name__)
+
+# Event types after which a conversation stream receives no further events
+TERMINAL_EVENTS = {"done", "error", "cancelled"}
+
+
+class EventStreamWriter:
+    """
+    Records a run's events off the streaming hot path
+
+    add() only queues the event; a background task writes whatever queued up
+    meanwhile as one pipelined batch, so a run never waits on Redis per event.
+    """
+
+    def __init__(self, service: "EventStreamService", conversation_id: str):
+        self.service = service
+        self.conversation_id = conversation_id
+        self._pending: list[tuple[int, str, str]] = []
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self._task = asyncio.create_task(self._run(), name=f"event-stream-{conversation_id}")
+
+    def add(self, event_id: int, event_type: str, payload: str):
+        self._pending.append((event_id, event_type, payload))
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            batch, self._pending = self._pending, []
+            await self.service.append_batch(self.conversation_id, batch)
+            if self._closed and not self._pending:
+                return
+
+    async def close(self):
+        """Write out the queued events and stop"""
+        self._closed = True
+        self._wakeup.set()
+        await self._task
+
+
+class EventStreamService:
+    """Per-conversation event log backed by Redis Streams"""
+
+    def __init__(self):
+        self.redis: Optional[Redis] = None
+        self.maxlen = settings.EVENT_STREAM_MAXLEN
+        self.ttl = settings.EVENT_STREAM_TTL
+
+    async def initialize(self):
+        """Initialize Redis connection"""
+        self.redis = await get_redis()
+
+    @staticmethod
+    def _key(conversation_id: str) -> str:
+        return f"chat:events:{conversation_id}"
+
+    async def append_batch(self, conversation_id: str, events: list[tuple[int, str, str]]) -> bool:
+        """
+        Append encoded (event_id, type, payload) events in one round trip
+
+        Failures are logged and swallowed: losing resumability must never break
+        the live stream that is being recorded.
+        """
+        if not self.redis or not events:
+            return False
+
+        key = self._key(conversation_id)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for event_id, event_type, payload in events:
+                    pipe.xadd(
+                        key,
+                        {"type": event_type, "data": payload},
+                        id=f"0-{event_id}",
+                        maxlen=self.maxlen,
+                        approximate=True
+                    )
+                # Refresh the expiry at the start and at the end of a run only
+                if events[0][0] == 1 or any(event_type in TERMINAL_EVENTS for _, event_type, _ in events):
+                    pipe.expire(key, self.ttl)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to record events {events[0][0]}-{events[-1][0]} for {conversation_id}: {e}")
+            return False
+
+    def writer(self, conversation_id: str) -> "EventStreamWriter":
+        """Start a background writer for a run's events"""
+        return EventStreamWriter(self, conversation_id)
+
+    async def exists(self, conversation_id: str) -> bool:
+        """Check if a conversation has a recorded event stream"""
+        if not self.redis:
+            return False
+
+        return bool(await self.redis.exists(self._key(conversation_id)))
+
+    async def follow(
+        self,
+        conversation_id: str,
+        last_event_id: int = 0,
+        block_ms: int = 5000
+    ) -> AsyncIterator[tuple[int, str, str]]:
+        """
+        Yield (event_id, type, payload) for events after last_event_id
+
+        Replays recorded events and then tails the live stream until a terminal
+        event, the stream expires, or nothing arrives for EVENT_STREAM_IDLE_TIMEOUT.
+
+        MAXLEN trimming (or a failed write) can leave the stream without some of
+        the requested events; a ``gap`` event carrying the ID of the last missing
+        event is yielded in their place so the client can fetch /history instead.
+        """
+        if not self.redis:
+            return
+
+        key = self._key(conversation_id)
+        cursor = f"0-{last_event_id}"
+        expected = last_event_id + 1
+        idle_ms = 0
+
+        while True:
+            result = await self.redis.xread({key: cursor}, count=500, block=block_ms)
+            if not result:
+                idle_ms += block_ms
+                if idle_ms >= settings.EVENT_STREAM_IDLE_TIMEOUT * 1000 or not await self.redis.exists(key):
+                    return
+                continue
+
+            idle_ms = 0
+            for entry_id, fields in result[0][1]:
+                cursor = entry_id
+                event_id = int(entry_id.split("-", 1)[1])
+                if event_id > expected:
+                    logger.info(f"Events {expected}-{event_id - 1} of {conversation_id} are no longer in the stream")
+                    yield event_id - 1, "gap", self._gap_payload(conversation_id, expected, event_id - 1)
+                expected = event_id + 1
+
+                event_type = fields.get("type")
+                yield event_id, event_type, fields.get("data")
+                if event_type in TERMINAL_EVENTS:
+                    return
+
+    @staticmethod
+    def _gap_payload(conversation_id: str, first: int, last: int) -> str:
+        return dumps({
+            "type": "gap",
+            "from_event_id": first,
+            "to_event_id": last,
+            "conversation_id": conversation_id,
+        }).decode()
+
+
+# Global event stream service instance
+event_stream_service = EventStreamService()
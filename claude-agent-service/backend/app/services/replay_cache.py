@@ -0,0 +1,294 @@
+"""
+Deterministic replay cache
+
+Scripted prompts are often sent to freshly created, identical workspaces. A run
+whose key (message, permission mode, max turns, model, workspace content hash
+and resume state) was seen before can be replayed from its recorded event log
+and file effects instead of running the agent again. The recorded Claude
+session's transcript is copied into the replaying workspace, so the next turn
+resumes from it as if the agent had run there.
+
+Entries live in Redis with a TTL; an index sorted by creation time bounds the
+total size and evicts the oldest entries first. File contents are kept in the
+blob store.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.services.blob_store import blob_store
+from app.services.client_pool import claude_transcript_path
+from app.services.standby_pool import STANDBY_MARKER
+
+logger = logging.getLogger(__name__)
+
+# Events that belong to one delivery, not to the recorded run
+UNRECORDED_EVENTS = {"connected", "queued", "done", "error", "cancelled"}
+
+ENTRY_PREFIX = "replay:entry:"
+INDEX_KEY = "replay:index"
+SIZES_KEY = "replay:sizes"
+
+# Part of every key; bump when the entry layout changes so old entries are never read
+ENTRY_FORMAT = 2
+
+
+class TreeTooLarge(Exception):
+    """The workspace is too big to be hashed for the replay cache"""
+
+
+def snapshot_tree(root: str) -> dict[str, str]:
+    """Map every regular file of a workspace (relative path) to its sha256"""
+    root_path = Path(root)
+    snapshot = {}
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(root_path):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = Path(dirpath) / name
+            if path.is_symlink() or not path.is_file():
+                continue
+            relative = path.relative_to(root_path).as_posix()
+            if relative == STANDBY_MARKER:
+                continue
+
+            data = path.read_bytes()
+            total += len(data)
+            if total > settings.REPLAY_CACHE_MAX_TREE_BYTES:
+                raise TreeTooLarge(root)
+            snapshot[relative] = hashlib.sha256(data).hexdigest()
+    return snapshot
+
+
+def tree_hash(snapshot: dict[str, str]) -> str:
+    """Content hash of a whole workspace snapshot"""
+    digest = hashlib.sha256()
+    for relative in sorted(snapshot):
+        digest.update(relative.encode())
+        digest.update(b"\0")
+        digest.update(snapshot[relative].encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+@dataclass
+class Recording:
+    """A run being recorded under its cache key"""
+    key: str
+    workspace_path: str
+    before: dict[str, str]
+    events: list[dict] = field(default_factory=list)
+    claude_session_id: Optional[str] = None
+    complete: bool = False
+
+    def add(self, event: dict):
+        """Record a produced event"""
+        event_type = event.get("type")
+        if event_type == "system" and event.get("subtype") == "init":
+            # Describes the recorded CLI session (its cwd and ID), not the replaying one
+            self.claude_session_id = (event.get("data") or {}).get("session_id")
+        elif event_type == "done":
+            self.complete = not event.get("cancelled")
+        elif event_type in ("error", "cancelled"):
+            self.complete = False
+        elif event_type not in UNRECORDED_EVENTS:
+            self.events.append(event)
+
+
+class ReplayCache:
+    """Redis-backed cache of recorded agent runs"""
+
+    def __init__(self):
+        self.redis: Optional[Redis] = None
+        self.enabled = settings.REPLAY_CACHE_ENABLED
+        self.ttl = settings.REPLAY_CACHE_TTL
+        self.max_bytes = settings.REPLAY_CACHE_MAX_BYTES
+        self.max_entry_bytes = settings.REPLAY_CACHE_MAX_ENTRY_BYTES
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.skipped = 0
+        self.evictions = 0
+
+    async def initialize(self):
+        """Initialize Redis connection"""
+        self.redis = await get_redis()
+
+    async def prepare(
+        self,
+        workspace_path: str,
+        message: str,
+        permission_mode: str,
+        max_turns: Optional[int],
+        resume_state: Optional[str]
+    ) -> Optional[Recording]:
+        """Hash the workspace and derive the cache key; None if the run is not cacheable"""
+        if not self.enabled or not self.redis:
+            return None
+
+        try:
+            before = await asyncio.to_thread(snapshot_tree, workspace_path)
+        except TreeTooLarge:
+            self.skipped += 1
+            logger.info(f"Workspace {workspace_path} is too large for the replay cache")
+            return None
+
+        key_material = json.dumps([
+            ENTRY_FORMAT,
+            message,
+            permission_mode,
+            max_turns,
+            settings.ANTHROPIC_MODEL,
+            tree_hash(before),
+            resume_state,
+        ], ensure_ascii=False)
+        key = hashlib.sha256(key_material.encode()).hexdigest()
+        return Recording(key=key, workspace_path=workspace_path, before=before)
+
+    async def lookup(self, recording: Recording) -> Optional[dict]:
+        """Get the recorded run for a key"""
+        try:
+            value = await self.redis.get(ENTRY_PREFIX + recording.key)
+        except Exception as e:
+            logger.warning(f"Replay cache lookup failed: {e}")
+            value = None
+
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    async def store(self, recording: Recording, response: Optional[str], tool_calls: Optional[list]):
+        """Save a completed run with its file effects"""
+        if not recording.complete:
+            return
+
+        after = await asyncio.to_thread(snapshot_tree, recording.workspace_path)
+        written = {}
+        for relative, digest in after.items():
+            if recording.before.get(relative) != digest:
+                data = await asyncio.to_thread((Path(recording.workspace_path) / relative).read_bytes)
+                written[relative] = await blob_store.put(data)
+        deleted = sorted(set(recording.before) - set(after))
+
+        # A replay must leave a session the next turn can resume
+        session = await self._save_session(recording)
+        if session is None:
+            self.skipped += 1
+            return
+
+        entry = json.dumps({
+            "events": recording.events,
+            "effects": {"written": written, "deleted": deleted},
+            "session": session,
+            "response": response,
+            "tool_calls": tool_calls,
+            "created_at": time.time(),
+        }, ensure_ascii=False)
+        size = len(entry.encode())
+        if size > self.max_entry_bytes:
+            self.skipped += 1
+            return
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(ENTRY_PREFIX + recording.key, entry, ex=self.ttl)
+                pipe.zadd(INDEX_KEY, {recording.key: time.time()})
+                pipe.hset(SIZES_KEY, recording.key, size)
+                await pipe.execute()
+            self.stores += 1
+            await self._evict()
+        except Exception as e:
+            logger.warning(f"Failed to store replay cache entry: {e}")
+
+    async def _save_session(self, recording: Recording) -> Optional[dict]:
+        """Keep the recorded Claude session's transcript; None when there is none"""
+        if not recording.claude_session_id:
+            return None
+        path = claude_transcript_path(recording.workspace_path, recording.claude_session_id)
+        try:
+            data = await asyncio.to_thread(path.read_bytes)
+        except FileNotFoundError:
+            logger.info(f"No transcript for Claude session {recording.claude_session_id}, not caching the run")
+            return None
+        return {
+            "claude_session_id": recording.claude_session_id,
+            "workspace_path": recording.workspace_path,
+            "transcript": await blob_store.put(data, "application/x-ndjson")
+        }
+
+    async def restore_session(self, workspace_path: str, entry: dict) -> str:
+        """Install the recorded Claude session for a workspace and return its ID"""
+        session = entry["session"]
+        data = await asyncio.to_thread(blob_store.path_for(session["transcript"]).read_bytes)
+        # The transcript names the recording workspace as the session's cwd
+        recorded_cwd = json.dumps(session["workspace_path"])[1:-1].encode()
+        data = data.replace(recorded_cwd, json.dumps(workspace_path)[1:-1].encode())
+
+        target = claude_transcript_path(workspace_path, session["claude_session_id"])
+        await asyncio.to_thread(target.parent.mkdir, parents=True, exist_ok=True)
+        await asyncio.to_thread(target.write_bytes, data)
+        return session["claude_session_id"]
+
+    async def _evict(self):
+        """Drop expired index entries, then the oldest entries above the size bound"""
+        expired = await self.redis.zrangebyscore(INDEX_KEY, "-inf", time.time() - self.ttl)
+        if expired:
+            await self._remove(expired)
+
+        sizes = await self.redis.hgetall(SIZES_KEY)
+        total = sum(int(size) for size in sizes.values())
+        while total > self.max_bytes:
+            oldest = await self.redis.zpopmin(INDEX_KEY)
+            if not oldest:
+                break
+            key = oldest[0][0]
+            total -= int(sizes.get(key, 0))
+            await self._remove([key])
+            self.evictions += 1
+
+    async def _remove(self, keys: list[str]):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.delete(*(ENTRY_PREFIX + key for key in keys))
+            pipe.zrem(INDEX_KEY, *keys)
+            pipe.hdel(SIZES_KEY, *keys)
+            await pipe.execute()
+
+    async def apply_effects(self, workspace_path: str, effects: dict):
+        """Reproduce the recorded file changes in a workspace"""
+        root = Path(workspace_path)
+        for relative, digest in effects.get("written", {}).items():
+            target = root / relative
+            target.parent.mkdir(parents=True, exist_ok=True)
+            data = await asyncio.to_thread(blob_store.path_for(digest).read_bytes)
+            await asyncio.to_thread(target.write_bytes, data)
+        for relative in effects.get("deleted", []):
+            (root / relative).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        """Hit/miss and store counters"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "skipped": self.skipped,
+            "evictions": self.evictions,
+        }
+
+
+# Global replay cache instance
+replay_cache = ReplayCache()
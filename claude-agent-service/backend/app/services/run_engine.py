@@ -0,0 +1,892 @@
+"""
+Background agent run engine
+
+Each chat turn runs as a managed asyncio task that is independent of any HTTP
+connection. Events are numbered, fanned out to in-process subscribers and then
+recorded in batches to the conversation's Redis Stream (the cross-worker bus),
+so the original caller, a second tab or an observer can all follow the same run.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from claude_agent_sdk import (
+    AssistantMessage,
+    TextBlock,
+    ToolUseBlock,
+    ResultMessage,
+    SystemMessage,
+    UserMessage,
+    ToolResultBlock
+)
+
+# Try to import StreamEvent, it might not be available in all SDK versions
+try:
+    from claude_agent_sdk import StreamEvent
+    HAS_STREAM_EVENT = True
+except ImportError:
+    StreamEvent = None
+    HAS_STREAM_EVENT = False
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.redis import get_redis
+from app.core.metrics import CHAT_EVENTS_TOTAL, CHAT_RUNS_TOTAL, CHAT_STAGE_SECONDS
+from app.core.tracing import INVALID_SPAN, tracer
+from app.schemas.chat import ChatRequest
+from app.models.conversation import ConversationStatus
+from app.services.session import session_service
+from app.services.checkpoint import ResponseCheckpointer
+from app.services.blob_store import blob_store
+from app.services.client_pool import PooledClient, client_pool, get_claude_options
+from app.services.backpressure import SubscriberBuffer
+from app.services.coalesce import DeltaCoalescer, coalesce_events
+from app.services.event_stream import EventStreamWriter, event_stream_service
+from app.services.run_scheduler import RunTicket, run_scheduler
+from app.services.run_lock import LockBusyError, RunLease, run_lock_service
+from app.services.replay_cache import Recording, replay_cache
+from app.services.event_log import EventLogWriter, event_log_service
+from app.utils.sse import SSEWriter
+
+logger = logging.getLogger(__name__)
+
+# Pub/sub channel used to cancel runs that live in another worker
+CANCEL_CHANNEL = "chat:cancel"
+
+
+@dataclass
+class RunEvent:
+    """A numbered event of a run, encoded once for every subscriber"""
+    id: int
+    type: str
+    data: dict
+    payload: bytes
+
+
+class Subscription:
+    """
+    A subscriber's view of a run: buffered replay followed by live events
+
+    The run never waits for a subscriber; a slow client fills a bounded
+    SubscriberBuffer whose overflow policy decides what to do with the excess.
+    """
+
+    def __init__(self, run: "AgentRun", event_types: Optional[frozenset] = None):
+        self.run = run
+        # Event types this subscriber asked for; None means all of them
+        self.event_types = event_types
+        self.buffer = SubscriberBuffer(run.make_event)
+
+    def put(self, event: RunEvent):
+        if self.event_types is None or event.type in self.event_types:
+            self.buffer.put(event)
+
+    def close(self):
+        self.buffer.close()
+
+    async def __aiter__(self) -> AsyncIterator[RunEvent]:
+        try:
+            while True:
+                event = await self.buffer.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            self.run.unsubscribe(self)
+            self.buffer.discard()
+
+
+class AgentRun:
+    """One agent turn for a conversation"""
+
+    def __init__(
+        self,
+        session_id: str,
+        conversation_id: str,
+        workspace_path: str,
+        claude_session_id: Optional[str],
+        request: ChatRequest,
+        ticket: RunTicket,
+        lease: Optional[RunLease] = None
+    ):
+        self.session_id = session_id
+        self.conversation_id = conversation_id
+        self.workspace_path = workspace_path
+        self.claude_session_id = claude_session_id
+        self.request = request
+        self.ticket = ticket
+        self.lease: Optional[RunLease] = None
+        self._hold(lease)
+
+        self.writer = SSEWriter(session_id, conversation_id)
+        self.last_event_id = 0
+        self.recent: deque[RunEvent] = deque(maxlen=settings.RUN_REPLAY_BUFFER)
+        self.subscribers: set[Subscription] = set()
+        self.buffer_high_water = 0
+        self.buffer_overflow = {"coalesced": 0, "dropped": 0, "spilled": 0}
+        self.finished = False
+        self.started_at = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+        self.client: Optional[PooledClient] = None
+        self.cancel_reason: Optional[str] = None
+        self.recording: Optional[Recording] = None
+        self.span = INVALID_SPAN
+        self.event_log: Optional[EventLogWriter] = None
+        self.stream: Optional[EventStreamWriter] = None
+        self._orphan_timer: Optional[asyncio.TimerHandle] = None
+        self._cancel_task: Optional[asyncio.Task] = None
+
+    def subscribe(self, last_event_id: int = 0, event_types: Optional[frozenset] = None) -> Optional[Subscription]:
+        """
+        Attach a subscriber that receives every event after last_event_id,
+        or only those whose type is in event_types
+
+        Returns None when those events are no longer in the in-memory replay
+        buffer; the caller should then read the recorded Redis Stream instead.
+        """
+        oldest = self.recent[0].id if self.recent else self.last_event_id + 1
+        if last_event_id + 1 < oldest:
+            return None
+
+        subscription = Subscription(self, event_types)
+        for event in self.recent:
+            if event.id > last_event_id:
+                subscription.put(event)
+
+        if self.finished:
+            subscription.close()
+        else:
+            self.subscribers.add(subscription)
+            if self._orphan_timer is not None:
+                self._orphan_timer.cancel()
+                self._orphan_timer = None
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription in self.subscribers:
+            self.subscribers.discard(subscription)
+            if not self.subscribers and not self.finished:
+                self._schedule_orphan_cancel()
+        stats = subscription.buffer.stats()
+        if stats["coalesced"] or stats["dropped"] or stats["spilled"]:
+            logger.info(f"Slow subscriber on conversation {self.conversation_id}: {stats}")
+        self._record_buffer_stats(stats)
+
+    def _record_buffer_stats(self, stats: dict):
+        """Fold a subscriber's buffer counters into the run totals"""
+        self.buffer_high_water = max(self.buffer_high_water, stats["high_water"])
+        for key in ("coalesced", "dropped", "spilled"):
+            self.buffer_overflow[key] += stats[key]
+
+    def make_event(self, event_id: int, data: dict, payload: Optional[bytes] = None) -> RunEvent:
+        """Build a RunEvent, encoding data unless the payload is given"""
+        return RunEvent(
+            id=event_id,
+            type=data["type"],
+            data=data,
+            payload=payload if payload is not None else self.writer.encode(data)
+        )
+
+    def buffer_stats(self) -> dict:
+        """High-water mark and overflow counters across this run's subscribers"""
+        live = [subscription.buffer.stats() for subscription in self.subscribers]
+        stats = {
+            "high_water": max([self.buffer_high_water] + [s["high_water"] for s in live]),
+            "buffered": sum(s["size"] for s in live),
+        }
+        for key, total in self.buffer_overflow.items():
+            stats[key] = total + sum(s[key] for s in live)
+        return stats
+
+    def _hold(self, lease: Optional[RunLease]):
+        """Adopt the session's run lock; losing it cancels the run"""
+        self.lease = lease
+        if lease is not None:
+            lease.on_lost = lambda: asyncio.create_task(self.cancel("run lock lost"))
+
+    @property
+    def fence(self) -> Optional[int]:
+        """Fencing token of the run's session lock"""
+        return self.lease.token if self.lease is not None else None
+
+    async def _publish(self, data: dict):
+        """Number, fan out and record one event"""
+        self.last_event_id += 1
+        event = self.make_event(self.last_event_id, data)
+        CHAT_EVENTS_TOTAL.inc(type=event.type)
+
+        # Local subscribers first; recording must not delay the live stream
+        self.recent.append(event)
+        for subscription in list(self.subscribers):
+            subscription.put(event)
+
+        if self.stream is not None:
+            self.stream.add(event.id, event.type, event.payload.decode())
+        if self.event_log is not None:
+            await self.event_log.append(event.id, data)
+
+    async def run(self):
+        """Drive the agent until the turn completes"""
+        events = self._record(self._agent_events())
+
+        # Merge token-sized deltas into one frame per window if the client asked for it
+        if self.request.coalesce_ms:
+            events = coalesce_events(events, DeltaCoalescer(
+                window_ms=min(self.request.coalesce_ms, settings.STREAM_COALESCE_MAX_WINDOW_MS),
+                max_bytes=self.request.coalesce_bytes or settings.STREAM_COALESCE_MAX_BYTES
+            ))
+
+        # The run's task inherited the request's trace context; chat.run joins that trace
+        self.span = tracer.start_span("chat.run", {
+            "session_id": self.session_id,
+            "conversation_id": self.conversation_id,
+        })
+        outcome = "completed"
+        try:
+            self.stream = event_stream_service.writer(self.conversation_id)
+            self.event_log = await event_log_service.open(self.conversation_id)
+            with tracer.use_span(self.span):
+                async for data in events:
+                    await self._publish(data)
+                    if data["type"] == "error":
+                        outcome = "error"
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            # Terminal event so that followers of the Redis Stream stop waiting
+            await self._publish({'type': 'cancelled', 'reason': self.cancel_reason or 'shutdown'})
+            raise
+        except Exception as e:
+            outcome = "error"
+            # The agent reports its own errors; this is the run's plumbing (event log, stream)
+            logger.error(f"Run of conversation {self.conversation_id} failed: {e}", exc_info=True)
+            await self._publish({'type': 'error', 'error': str(e), 'detail': type(e).__name__})
+        finally:
+            CHAT_RUNS_TOTAL.inc(outcome=outcome)
+            self.client = None
+            # Give the lock back before the slot, so the session's next queued run can take it
+            try:
+                if self.lease is not None:
+                    await self.lease.release()
+            finally:
+                run_scheduler.release(self.ticket)
+            self.finished = True
+            if self._orphan_timer is not None:
+                self._orphan_timer.cancel()
+                self._orphan_timer = None
+            for subscription in list(self.subscribers):
+                subscription.close()
+            # Followers of the Redis Stream stop at the terminal event written here
+            if self.stream is not None:
+                await self.stream.close()
+            await self._close_event_log()
+            self.span.set_attributes({"run.outcome": outcome, "run.events": self.last_event_id})
+            self.span.end()
+            await tracer.export(self.span.trace)
+
+    async def _close_event_log(self):
+        """Write out the rest of the event log and index it from the conversation row"""
+        if self.event_log is None:
+            return
+        await self.event_log.flush()
+        if self.event_log.failed:
+            return
+        async with AsyncSessionLocal() as db:
+            try:
+                await session_service.record_event_log(
+                    db,
+                    self.conversation_id,
+                    event_log_service.relative_path(self.conversation_id),
+                    self.event_log.count
+                )
+                await db.commit()
+            except Exception as e:
+                logger.warning(f"Failed to record event log of {self.conversation_id}: {e}")
+                await db.rollback()
+
+    async def cancel(self, reason: str = "cancelled") -> bool:
+        """
+        Stop the run
+
+        Claude is asked to interrupt first so the turn ends cleanly and the
+        process stays reusable; if the run has not finished after
+        RUN_CANCEL_INTERRUPT_TIMEOUT the task is cancelled, which terminates the
+        CLI process. Partial output is kept with status aborted either way.
+        """
+        if self.finished or self.task is None:
+            return False
+        if self.cancel_reason is None:
+            self.cancel_reason = reason
+            logger.info(f"Cancelling run for conversation {self.conversation_id}: {reason}")
+
+        if self.client is not None:
+            try:
+                await asyncio.wait_for(self.client.interrupt(), timeout=settings.RUN_CANCEL_INTERRUPT_TIMEOUT)
+                await asyncio.wait({self.task}, timeout=settings.RUN_CANCEL_INTERRUPT_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"Interrupt failed for conversation {self.conversation_id}: {e}")
+
+        if not self.task.done():
+            self.task.cancel()
+            await asyncio.wait({self.task})
+        return True
+
+    def _schedule_orphan_cancel(self):
+        """Cancel the run if nobody subscribes again within the grace period"""
+        grace = settings.RUN_ORPHAN_GRACE_SECONDS
+        if grace <= 0 or self._orphan_timer is not None:
+            return
+        self._orphan_timer = asyncio.get_running_loop().call_later(grace, self._cancel_orphan)
+
+    def _cancel_orphan(self):
+        self._orphan_timer = None
+        if not self.subscribers and not self.finished:
+            self._cancel_task = asyncio.create_task(self.cancel("orphaned"))
+
+    async def interrupt(self) -> bool:
+        """Interrupt the agent's current response; False if it is not talking to Claude yet"""
+        if self.client is None or self.finished:
+            return False
+        await self.client.interrupt()
+        return True
+
+    async def _record(self, source: AsyncIterator[dict]) -> AsyncIterator[dict]:
+        """Feed produced events to the replay recording and store it once the run completed"""
+        try:
+            async for event in source:
+                if self.recording is not None:
+                    self.recording.add(event)
+                yield event
+        finally:
+            await source.aclose()
+
+        if self.recording is not None and self.recording.complete:
+            async with AsyncSessionLocal() as db:
+                conversation = await session_service.get_conversation(db, self.conversation_id)
+            if conversation is not None:
+                await replay_cache.store(self.recording, conversation.assistant_response, conversation.tool_calls)
+
+    async def _replay(self, entry: dict, checkpoint: ResponseCheckpointer) -> AsyncIterator[dict]:
+        """Reproduce a recorded run: its file effects, events and saved response"""
+        logger.info(f"Replaying cached run for conversation {self.conversation_id}")
+        await replay_cache.apply_effects(self.workspace_path, entry["effects"])
+        claude_session_id = await replay_cache.restore_session(self.workspace_path, entry)
+
+        for event_data in entry["events"]:
+            yield event_data
+
+        tool_calls = {call["id"]: call for call in entry.get("tool_calls") or []}
+        await checkpoint.flush(tool_calls, status=ConversationStatus.COMPLETED, response=entry.get("response") or "")
+
+        async with AsyncSessionLocal() as update_db:
+            try:
+                await session_service.update_session_activity(
+                    update_db,
+                    self.session_id,
+                    increment_conversation=True,
+                    claude_session_id=claude_session_id,
+                    fence=self.fence
+                )
+            except Exception as update_error:
+                logger.error(f"Failed to update session activity: {update_error}")
+                await update_db.rollback()
+
+        yield {'type': 'done', 'claude_session_id': claude_session_id, 'replayed': True}
+
+    async def _agent_events(self) -> AsyncIterator[dict]:
+        """Run the agent and yield stream events"""
+        checkpoint = ResponseCheckpointer(self.conversation_id)
+        claude_session_id_from_sdk = None
+        tool_calls = {}  # Tool calls with results, keyed by tool_use_id
+        full_response_from_result = ""  # Store text from ResultMessage
+        query_span = INVALID_SPAN
+        tool_spans = {}  # Open tool use -> tool result spans, keyed by tool_use_id
+
+        try:
+            logger.info(f"Starting stream for session {self.session_id}, message: {self.request.message[:50]}...")
+
+            # Send initial connection event
+            yield {'type': 'connected'}
+
+            # Wait for an admission slot, reporting the queue position meanwhile
+            admission_span = tracer.start_span("run.admission", parent=self.span)
+            async for position in run_scheduler.wait(self.ticket):
+                admission_span.add_event("queued", {"position": position})
+                yield {'type': 'queued', 'position': position}
+            admission_span.end()
+
+            # Runs that were queued (or started in wait mode) take the session's lock only now
+            if self.lease is None:
+                lock_span = tracer.start_span("run.lock", parent=self.span)
+                try:
+                    self._hold(await run_lock_service.acquire(self.session_id))
+                except LockBusyError as e:
+                    lock_span.end()
+                    # Another worker is running this session
+                    await checkpoint.flush(status=ConversationStatus.ABORTED)
+                    yield {'type': 'error', 'error': str(e), 'detail': type(e).__name__}
+                    return
+                lock_span.end()
+
+            # Serve identical prompts on identical workspaces from the replay cache
+            if self.request.replay_cache != "off":
+                replay_span = tracer.start_span("replay_cache.lookup", parent=self.span)
+                self.recording = await replay_cache.prepare(
+                    self.workspace_path,
+                    message=self.request.message,
+                    permission_mode=self.request.permission_mode or "acceptEdits",
+                    max_turns=self.request.max_turns,
+                    resume_state=self.claude_session_id or self.request.resume
+                )
+                entry = None
+                if self.recording is not None and self.request.replay_cache == "use":
+                    entry = await replay_cache.lookup(self.recording)
+                replay_span.set_attribute("replay_cache.hit", entry is not None)
+                replay_span.end()
+                if entry is not None:
+                    self.recording = None
+                    async for event_data in self._replay(entry, checkpoint):
+                        yield event_data
+                    return
+
+            # Get Claude options - use existing Claude session ID if available
+            options = get_claude_options(
+                workspace_path=self.workspace_path,
+                permission_mode=self.request.permission_mode or "acceptEdits",
+                claude_session_id=self.claude_session_id or self.request.resume,
+                max_turns=self.request.max_turns
+            )
+
+            # Reuse the session's live Claude client, spawning one on a miss
+            logger.info("Acquiring Claude SDK client...")
+            acquire_started = time.perf_counter()
+            acquire_span = tracer.start_span("client.acquire", parent=self.span)
+            async with client_pool.acquire(self.session_id, options) as client:
+                self.client = client
+                CHAT_STAGE_SECONDS.observe(time.perf_counter() - acquire_started, stage="client_acquire")
+                acquire_span.end()
+                first_message = first_text = True
+                # Send query and stream responses
+                logger.info("Sending query to Claude...")
+                query_span = tracer.start_span("agent.query", parent=self.span)
+                # Each sdk.message span covers the wait since the previous complete message;
+                # partial stream events in between are counted rather than traced one by one
+                message_wait_started = time.time_ns()
+                stream_events = 0
+                async for message in client.send(self.request.message):
+                    if first_message:
+                        first_message = False
+                        CHAT_STAGE_SECONDS.observe(time.monotonic() - self.started_at, stage="first_sdk_message")
+                        query_span.add_event("first_sdk_message")
+
+                    if HAS_STREAM_EVENT and StreamEvent and isinstance(message, StreamEvent):
+                        stream_events += 1
+                    else:
+                        tracer.start_span(
+                            "sdk.message",
+                            {"message.type": type(message).__name__, "stream_events": stream_events},
+                            start_time=message_wait_started,
+                            parent=query_span
+                        ).end()
+                        message_wait_started = time.time_ns()
+                        stream_events = 0
+
+                    # Handle StreamEvent for real-time streaming
+                    if HAS_STREAM_EVENT and StreamEvent and isinstance(message, StreamEvent):
+                        event = message.event
+                        event_type = event.get("type")
+
+                        # Stream text deltas in real-time
+                        if event_type == "content_block_delta":
+                            delta = event.get("delta", {})
+
+                            # Text delta
+                            if delta.get("type") == "text_delta":
+                                text_chunk = delta.get("text", "")
+                                checkpoint.add_text(text_chunk)
+                                if first_text:
+                                    first_text = False
+                                    CHAT_STAGE_SECONDS.observe(
+                                        time.monotonic() - self.started_at, stage="first_text_delta"
+                                    )
+                                    query_span.add_event("first_text_delta")
+
+                                # Send streaming text chunk
+                                event_data = {
+                                    "type": "text_delta",
+                                    "content": text_chunk
+                                }
+                                yield event_data
+                                await checkpoint.maybe_flush(tool_calls)
+
+                            # Tool input delta (工具调用参数的流式输入)
+                            elif delta.get("type") == "input_json_delta":
+                                partial_json = delta.get("partial_json", "")
+                                event_data = {
+                                    "type": "tool_input_delta",
+                                    "partial_json": partial_json
+                                }
+                                yield event_data
+
+                        # Content block start (文本或工具调用开始)
+                        elif event_type == "content_block_start":
+                            content_block = event.get("content_block", {})
+                            block_type = content_block.get("type")
+
+                            event_data = {
+                                "type": "content_block_start",
+                                "block_type": block_type,
+                                "index": event.get("index")
+                            }
+
+                            # 如果是工具调用,包含工具信息
+                            if block_type == "tool_use":
+                                event_data["tool"] = {
+                                    "id": content_block.get("id"),
+                                    "name": content_block.get("name")
+                                }
+
+                            yield event_data
+
+                        # Send other stream events
+                        elif event_type in ["message_start", "content_block_stop", "message_delta", "message_stop"]:
+                            event_data = {
+                                "type": "stream_event",
+                                "event_type": event_type,
+                                "data": event
+                            }
+                            yield event_data
+
+                    # Handle complete AssistantMessage
+                    elif isinstance(message, AssistantMessage):
+                        for block in message.content:
+                            # Tool use block (工具调用完成)
+                            if isinstance(block, ToolUseBlock):
+                                # Store tool call
+                                tool_call_record = {
+                                    "id": block.id,
+                                    "name": block.name,
+                                    "input": block.input,
+                                    "result": None,
+                                    "is_error": False
+                                }
+                                tool_calls[block.id] = tool_call_record
+                                tool_spans[block.id] = tracer.start_span(
+                                    "tool.use",
+                                    {"tool.name": block.name, "tool.id": block.id},
+                                    parent=query_span
+                                )
+
+                                event_data = {
+                                    "type": "tool_use",
+                                    "tool": {
+                                        "id": block.id,
+                                        "name": block.name,
+                                        "input": block.input
+                                    }
+                                }
+                                yield event_data
+
+                            # Text block (完整文本,通常已通过 delta 发送)
+                            elif isinstance(block, TextBlock):
+                                # Text already streamed via deltas
+                                pass
+
+                    # Handle UserMessage (工具执行结果)
+                    elif isinstance(message, UserMessage):
+                        for block in message.content:
+                            if isinstance(block, ToolResultBlock):
+                                # Large results go to the blob store; events and DB keep a preview
+                                content, content_ref = await blob_store.offload(block.content)
+
+                                # Update tool call with result
+                                tool_call = tool_calls.get(block.tool_use_id)
+                                if tool_call is not None:
+                                    tool_call["result"] = content
+                                    tool_call["is_error"] = block.is_error
+                                    if content_ref:
+                                        tool_call["result_ref"] = content_ref
+                                checkpoint.mark_tool_calls()
+
+                                tool_span = tool_spans.pop(block.tool_use_id, None)
+                                if tool_span is not None:
+                                    tool_span.set_attribute("tool.is_error", bool(block.is_error))
+                                    tool_span.end()
+
+                                event_data = {
+                                    "type": "tool_result",
+                                    "tool_use_id": block.tool_use_id,
+                                    "content": content,
+                                    "is_error": block.is_error
+                                }
+                                if content_ref:
+                                    event_data["content_ref"] = content_ref
+                                yield event_data
+                                await checkpoint.maybe_flush(tool_calls)
+
+                    # Handle ResultMessage
+                    elif isinstance(message, ResultMessage):
+                        # Store the complete response text
+                        full_response_from_result = message.result
+
+                        # Send result message
+                        event_data = {
+                            "type": "result",
+                            "data": {
+                                "subtype": message.subtype,
+                                "is_error": message.is_error,
+                                "duration_ms": message.duration_ms,
+                                "total_cost_usd": message.total_cost_usd,
+                                "num_turns": message.num_turns,
+                                "usage": message.usage,
+                                "result": message.result
+                            }
+                        }
+                        yield event_data
+
+                    # Handle SystemMessage
+                    elif isinstance(message, SystemMessage):
+                        # Capture Claude session ID from system message
+                        if message.subtype == "init" and message.data:
+                            claude_session_id_from_sdk = message.data.get("session_id")
+
+                        # Send system message
+                        event_data = {
+                            "type": "system",
+                            "subtype": message.subtype,
+                            "data": message.data
+                        }
+                        yield event_data
+
+                query_span.end()
+
+            # Write the rest of the response and mark the conversation completed
+            # Use ResultMessage.result if no streaming text was collected
+            finalize_started = time.perf_counter()
+            finalize_span = tracer.start_span("run.finalize", parent=self.span)
+            with tracer.use_span(finalize_span, end_on_exit=True):
+                await checkpoint.flush(
+                    tool_calls,
+                    status=ConversationStatus.ABORTED if self.cancel_reason else ConversationStatus.COMPLETED,
+                    response=None if checkpoint.has_text else full_response_from_result
+                )
+
+                logger.info(
+                    f"Saved response: {checkpoint.text_written} chars, {len(tool_calls)} tool calls, "
+                    f"{checkpoint.checkpoints} checkpoints"
+                )
+
+                # Use a new database session from the same engine
+                async with AsyncSessionLocal() as update_db:
+                    try:
+                        # Update session activity and Claude session ID mapping
+                        await session_service.update_session_activity(
+                            update_db,
+                            self.session_id,
+                            increment_conversation=True,
+                            claude_session_id=claude_session_id_from_sdk,
+                            fence=self.fence
+                        )
+                    except Exception as update_error:
+                        logger.error(f"Failed to update session activity: {update_error}")
+                        await update_db.rollback()
+
+            CHAT_STAGE_SECONDS.observe(time.perf_counter() - finalize_started, stage="finalization")
+
+            # Send completion event with Claude session ID
+            completion_data = {
+                'type': 'done',
+                'claude_session_id': claude_session_id_from_sdk
+            }
+            if self.cancel_reason:
+                completion_data['cancelled'] = self.cancel_reason
+            yield completion_data
+
+        except asyncio.CancelledError:
+            # Keep the partial output of a cancelled run
+            await checkpoint.flush(tool_calls, status=ConversationStatus.ABORTED)
+            raise
+
+        except Exception as e:
+            # Log error
+            logger.error(f"Stream error: {e}", exc_info=True)
+
+            # Keep the partial output of the failed run
+            await checkpoint.flush(tool_calls, status=ConversationStatus.ABORTED)
+
+            # If error is related to session not found, clear the saved claude_session_id
+            error_msg = str(e)
+            if "No conversation found" in error_msg or "session" in error_msg.lower():
+                logger.warning(f"Claude session may be expired, clearing saved session ID")
+                # Clear the invalid claude_session_id
+                async with AsyncSessionLocal() as clear_db:
+                    try:
+                        await session_service.update_session_activity(
+                            clear_db,
+                            self.session_id,
+                            increment_conversation=False,
+                            claude_session_id=None,  # Clear invalid session ID
+                            fence=self.fence
+                        )
+                        logger.info("Cleared invalid Claude session ID")
+                    except:
+                        pass
+
+            # Send error event
+            error_data = {
+                "type": "error",
+                "error": str(e),
+                "detail": str(type(e).__name__),
+                "suggestion": "Claude session may be expired. Please try again with a new message."
+            }
+            yield error_data
+
+        finally:
+            # Close the spans of tools that never returned and of an interrupted query
+            for tool_span in tool_spans.values():
+                tool_span.set_attribute("tool.completed", False)
+                tool_span.end()
+            query_span.end()
+
+
+class RunEngine:
+    """Registry of in-flight agent runs"""
+
+    def __init__(self):
+        self._runs: dict[str, AgentRun] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self.redis = None
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+
+    async def initialize(self):
+        """Listen for cancel requests addressed to runs of this worker"""
+        self.redis = await get_redis()
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen_for_cancels())
+
+    async def _listen_for_cancels(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(CANCEL_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    run = self._runs.get(message["data"])
+                    if run is not None:
+                        asyncio.create_task(self.cancel(run.conversation_id, "cancel requested"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cancel listener failed, resubscribing: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
+
+    async def cancel(self, conversation_id: str, reason: str = "cancel requested") -> bool:
+        """
+        Cancel a run
+
+        Runs of this worker are cancelled directly; otherwise the request is
+        broadcast to the other workers. Returns True if a local run was cancelled.
+        """
+        run = self._runs.get(conversation_id)
+        if run is not None:
+            if await run.cancel(reason):
+                self.cancelled += 1
+                return True
+            return False
+
+        if self.redis is not None:
+            await self.redis.publish(CANCEL_CHANNEL, conversation_id)
+        return False
+
+    def start(
+        self,
+        session_id: str,
+        conversation_id: str,
+        workspace_path: str,
+        claude_session_id: Optional[str],
+        request: ChatRequest,
+        ticket: RunTicket,
+        lease: Optional[RunLease] = None
+    ) -> AgentRun:
+        """Start a run as a background task; it waits for its ticket before running the agent"""
+        run = AgentRun(session_id, conversation_id, workspace_path, claude_session_id, request, ticket, lease)
+        run.task = asyncio.create_task(run.run(), name=f"agent-run-{conversation_id}")
+        run.task.add_done_callback(lambda _: self._finish(run))
+
+        self._runs[conversation_id] = run
+        self.started += 1
+        return run
+
+    def _finish(self, run: AgentRun):
+        if self._runs.get(run.conversation_id) is run:
+            del self._runs[run.conversation_id]
+        self.completed += 1
+
+    def conversation_ids(self) -> list[str]:
+        """Conversations with a run in this process"""
+        return list(self._runs)
+
+    def get(self, conversation_id: str) -> Optional[AgentRun]:
+        """Get the in-flight run of a conversation in this process"""
+        return self._runs.get(conversation_id)
+
+    async def events(
+        self,
+        conversation_id: str,
+        last_event_id: int = 0,
+        event_types: Optional[frozenset] = None
+    ) -> AsyncIterator[tuple[int, bytes]]:
+        """
+        Yield (event_id, payload) for a conversation after last_event_id
+
+        Subscribes to the in-process run when it lives in this worker, otherwise
+        follows the recorded Redis Stream (other workers or finished runs). The
+        run records every event; event_types only narrows what this caller sees.
+        """
+        run = self._runs.get(conversation_id)
+        subscription = run.subscribe(last_event_id, event_types) if run else None
+
+        if subscription is not None:
+            async for event in subscription:
+                yield event.id, event.payload
+            return
+
+        async for event_id, event_type, payload in event_stream_service.follow(conversation_id, last_event_id):
+            if event_types is None or event_type in event_types:
+                yield event_id, payload.encode()
+
+    async def close(self):
+        """Stop the cancel listener and cancel every in-flight run"""
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+
+        runs = list(self._runs.values())
+        for run in runs:
+            run.task.cancel()
+        await asyncio.gather(*(run.task for run in runs), return_exceptions=True)
+
+    def stats(self) -> dict:
+        """Run counters, live subscriber counts and per-run buffer metrics"""
+        return {
+            "active": len(self._runs),
+            "subscribers": sum(len(run.subscribers) for run in self._runs.values()),
+            "started": self.started,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "buffers": {
+                conversation_id: run.buffer_stats()
+                for conversation_id, run in self._runs.items()
+            },
+        }
+
+
+# Global run engine instance
+run_engine = RunEngine()
@@ -0,0 +1,178 @@
+"""
+Distributed per-session run lock
+
+A Redis lease guarantees that only one worker runs a given session at a time.
+The holder renews the lease with a heartbeat; if a worker crashes the lease
+simply expires. Every acquisition gets a fencing token (a per-session counter)
+that the database writes of a run carry, so a holder that lost its lease can
+no longer overwrite the resume state of a newer run.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Callable, Optional
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Renew or delete the lock only while it still holds our value
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LockBusyError(Exception):
+    """Raised when another run holds the session's lock"""
+
+    def __init__(self, session_id: str):
+        super().__init__(f"Session {session_id} is already running a request")
+        self.session_id = session_id
+
+
+class RunLease:
+    """A held run lock with its fencing token"""
+
+    def __init__(self, service: "RunLockService", session_id: str, token: int, value: str):
+        self.service = service
+        self.session_id = session_id
+        self.token = token
+        self.value = value
+        self.lost = False
+        self.on_lost: Optional[Callable[[], None]] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def start_heartbeat(self):
+        self._heartbeat = asyncio.create_task(self._renew_loop())
+
+    async def _renew_loop(self):
+        interval = self.service.heartbeat_ms / 1000
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                renewed = await self.service.renew(self)
+            except Exception as e:
+                logger.warning(f"Failed to renew run lock for session {self.session_id}: {e}")
+                continue
+            if not renewed:
+                self.lost = True
+                logger.error(f"Lost run lock for session {self.session_id} (fence {self.token})")
+                if self.on_lost:
+                    self.on_lost()
+                return
+
+    async def release(self):
+        """Stop renewing and give the lock back"""
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        if not self.lost:
+            try:
+                await self.service.release(self)
+            except Exception as e:
+                # The lease expires on its own
+                logger.warning(f"Failed to release run lock for session {self.session_id}: {e}")
+
+
+class RunLockService:
+    """Redis lease locks keyed by session"""
+
+    def __init__(self):
+        self.redis: Optional[Redis] = None
+        self.enabled = settings.RUN_LOCK_ENABLED
+        self.ttl_ms = settings.RUN_LOCK_TTL_MS
+        self.heartbeat_ms = settings.RUN_LOCK_HEARTBEAT_MS
+        self.mode = settings.RUN_LOCK_MODE
+        self.wait_timeout = settings.RUN_LOCK_WAIT_TIMEOUT
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+        self.acquired = 0
+        self.rejected = 0
+        self.lost = 0
+
+    async def initialize(self):
+        """Initialize Redis connection"""
+        self.redis = await get_redis()
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"runlock:{session_id}"
+
+    @staticmethod
+    def _fence_key(session_id: str) -> str:
+        return f"runlock:fence:{session_id}"
+
+    async def try_acquire(self, session_id: str) -> Optional[RunLease]:
+        """Take the lock if it is free"""
+        value = f"{self.owner}:{uuid.uuid4().hex}"
+        if not await self.redis.set(self._key(session_id), value, nx=True, px=self.ttl_ms):
+            return None
+
+        token = await self.redis.incr(self._fence_key(session_id))
+        lease = RunLease(self, session_id, token, value)
+        lease.start_heartbeat()
+        self.acquired += 1
+        return lease
+
+    async def acquire(self, session_id: str) -> Optional[RunLease]:
+        """
+        Take the session's run lock
+
+        In ``reject`` mode a held lock raises LockBusyError right away; in
+        ``wait`` mode the lock is polled for up to RUN_LOCK_WAIT_TIMEOUT seconds
+        first. Returns None when locking is disabled.
+        """
+        if not self.enabled or not self.redis:
+            return None
+
+        deadline = time.monotonic() + (self.wait_timeout if self.mode == "wait" else 0)
+        delay = 0.05
+        while True:
+            lease = await self.try_acquire(session_id)
+            if lease is not None:
+                return lease
+            if time.monotonic() >= deadline:
+                self.rejected += 1
+                raise LockBusyError(session_id)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    async def renew(self, lease: RunLease) -> bool:
+        """Extend a lease; False if it expired or was taken over"""
+        renewed = await self.redis.eval(RENEW_SCRIPT, 1, self._key(lease.session_id), lease.value, self.ttl_ms)
+        if not renewed:
+            self.lost += 1
+        return bool(renewed)
+
+    async def release(self, lease: RunLease) -> bool:
+        """Delete the lock if it is still ours"""
+        return bool(await self.redis.eval(RELEASE_SCRIPT, 1, self._key(lease.session_id), lease.value))
+
+    def stats(self) -> dict:
+        """Lock counters"""
+        return {
+            "enabled": self.enabled,
+            "mode": self.mode,
+            "acquired": self.acquired,
+            "rejected": self.rejected,
+            "lost": self.lost,
+        }
+
+
+# Global run lock service instance
+run_lock_service = RunLockService()
@@ -0,0 +1,213 @@
+"""
+Run admission control
+
+Caps the number of agent runs (and therefore CLI subprocesses doing work) that
+execute at once, allows at most one active run per session, and queues the
+rest FIFO per session with round-robin fairness across sessions.
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Optional
+
+from app.core.config import settings
+from app.core.metrics import RUN_QUEUE_WAIT_SECONDS
+
+
+class QueueFullError(Exception):
+    """Raised when the run queue is at its depth limit"""
+
+    def __init__(self, depth: int, retry_after: int):
+        super().__init__(f"Run queue is full ({depth} waiting)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class RunTicket:
+    """A run's place in the scheduler"""
+
+    def __init__(self, session_id: str, seq: int):
+        self.session_id = session_id
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.granted_at: Optional[float] = None
+        self.released = False
+        self.granted = asyncio.Event()
+        self.moved = asyncio.Event()
+
+
+class RunScheduler:
+    """Global concurrency cap with per-session serialization and fair queueing"""
+
+    def __init__(self):
+        self.max_concurrent = settings.MAX_CONCURRENT_RUNS
+        self.max_queue_depth = settings.RUN_QUEUE_MAX_DEPTH
+
+        self._running: set[RunTicket] = set()
+        self._active_sessions: set[str] = set()
+        # Per-session FIFO queues; dict order is the round-robin order
+        self._queues: "OrderedDict[str, deque[RunTicket]]" = OrderedDict()
+        self._depth = 0
+        self._seq = 0
+
+        self.admitted = 0
+        self.rejected = 0
+        self.queued_total = 0
+        self.wait_ms_total = 0.0
+        self.max_wait_ms = 0.0
+        self.avg_run_s = 30.0  # EWMA of run duration, seeds Retry-After
+
+    @property
+    def depth(self) -> int:
+        """Number of waiting runs"""
+        return self._depth
+
+    def enqueue(self, session_id: str) -> RunTicket:
+        """
+        Reserve a place for a run
+
+        Raises QueueFullError when the run would have to wait and the queue is
+        already at RUN_QUEUE_MAX_DEPTH.
+        """
+        if not self._can_start_now(session_id) and self._depth >= self.max_queue_depth:
+            self.rejected += 1
+            raise QueueFullError(self._depth, self.retry_after())
+
+        self._seq += 1
+        ticket = RunTicket(session_id, self._seq)
+        self._queues.setdefault(session_id, deque()).append(ticket)
+        self._depth += 1
+        self._dispatch()
+
+        if not ticket.granted.is_set():
+            self.queued_total += 1
+        return ticket
+
+    async def wait(self, ticket: RunTicket) -> AsyncIterator[int]:
+        """Wait until the ticket is granted, yielding the queue position whenever it changes"""
+        last_position = None
+        while not ticket.granted.is_set():
+            position = self.position(ticket)
+            if position != last_position:
+                last_position = position
+                yield position
+
+            ticket.moved.clear()
+            granted = asyncio.ensure_future(ticket.granted.wait())
+            moved = asyncio.ensure_future(ticket.moved.wait())
+            try:
+                await asyncio.wait({granted, moved}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                granted.cancel()
+                moved.cancel()
+
+    def position(self, ticket: RunTicket) -> int:
+        """
+        1-based position in admission order among waiting runs (0 once granted)
+
+        Admission goes round-robin: every queued session's oldest run, in
+        queue order, then every session's second run, and so on. Sessions whose
+        current run is still going are skipped until it ends, so their runs may
+        be overtaken.
+        """
+        if ticket.granted.is_set():
+            return 0
+        queue = self._queues.get(ticket.session_id)
+        if not queue or ticket not in queue:
+            return 0
+
+        rounds = queue.index(ticket)
+        position = 1 + rounds
+        ahead_in_rotation = True
+        for session_id, other in self._queues.items():
+            if session_id == ticket.session_id:
+                ahead_in_rotation = False
+                continue
+            # One run per earlier round, plus one in our round if the session comes first
+            position += min(len(other), rounds + 1 if ahead_in_rotation else rounds)
+        return position
+
+    def release(self, ticket: RunTicket):
+        """Give back a granted slot, or withdraw a waiting ticket"""
+        if ticket.released:
+            return
+        ticket.released = True
+
+        if ticket in self._running:
+            self._running.discard(ticket)
+            self._active_sessions.discard(ticket.session_id)
+            run_s = time.monotonic() - ticket.granted_at
+            self.avg_run_s = 0.8 * self.avg_run_s + 0.2 * run_s
+        else:
+            queue = self._queues.get(ticket.session_id)
+            if queue and ticket in queue:
+                queue.remove(ticket)
+                self._depth -= 1
+                if not queue:
+                    del self._queues[ticket.session_id]
+
+        self._dispatch()
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait, from queue depth and run time"""
+        estimate = self.avg_run_s * (self._depth + 1) / max(1, self.max_concurrent)
+        return int(min(60, max(1, estimate)))
+
+    def _can_start_now(self, session_id: str) -> bool:
+        return (
+            len(self._running) < self.max_concurrent
+            and session_id not in self._active_sessions
+            and session_id not in self._queues
+        )
+
+    def _dispatch(self):
+        """Grant free slots round-robin across sessions without an active run"""
+        granted_any = False
+        while len(self._running) < self.max_concurrent:
+            session_id = next((s for s in self._queues if s not in self._active_sessions), None)
+            if session_id is None:
+                break
+
+            queue = self._queues.pop(session_id)
+            ticket = queue.popleft()
+            if queue:
+                # Re-insert at the end so other sessions go first next time
+                self._queues[session_id] = queue
+            self._depth -= 1
+
+            ticket.granted_at = time.monotonic()
+            wait_ms = (ticket.granted_at - ticket.enqueued_at) * 1000
+            self.wait_ms_total += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            RUN_QUEUE_WAIT_SECONDS.observe(wait_ms / 1000)
+            self.admitted += 1
+
+            self._running.add(ticket)
+            self._active_sessions.add(session_id)
+            ticket.granted.set()
+            granted_any = True
+
+        if granted_any:
+            for queue in self._queues.values():
+                for waiting in queue:
+                    waiting.moved.set()
+
+    def stats(self) -> dict:
+        """Concurrency, queue depth and wait time metrics"""
+        return {
+            "running": len(self._running),
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": self._depth,
+            "max_queue_depth": self.max_queue_depth,
+            "queued_sessions": len(self._queues),
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected": self.rejected,
+            "avg_wait_ms": self.wait_ms_total / self.admitted if self.admitted else 0.0,
+            "max_wait_ms": self.max_wait_ms,
+            "avg_run_s": self.avg_run_s,
+        }
+
+
+# Global run scheduler instance
+run_scheduler = RunScheduler()
@@ -1,17 +1,43 @@
 """
 Session management service
 """
+import logging
 from typing import Optional
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete as sql_delete
+from sqlalchemy import select, update, func, literal, delete as sql_delete
 from pathlib import Path
+from pydantic import ValidationError
 
 from app.models.session import Session
-from app.models.conversation import Conversation
+from app.models.conversation import Conversation, ConversationStatus
+from app.schemas.session import SessionInfo
 from app.services.workspace import workspace_service
 from app.services.cache import cache_service
+from app.services.client_pool import client_pool
+from app.services.standby_pool import standby_pool
+from app.services.event_log import event_log_service
+from app.services.activity import session_activity
+from app.utils.pagination import paginate, page
+from app.services.counters import counter_service, conversations_counter, ACTIVE_SESSIONS, TOTAL_SESSIONS
 from app.core.config import settings
+from app.core.metrics import SESSION_SERVICE_SECONDS, timed
+from app.core.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+
+def count_sessions(active_only: bool = True):
+    """COUNT query seeding the session counters"""
+    stmt = select(func.count()).select_from(Session)
+    if active_only:
+        stmt = stmt.where(Session.is_active == True)
+    return stmt
+
+
+def count_conversations(session_id: str):
+    """COUNT query seeding a session's conversation counter"""
+    return select(func.count()).select_from(Conversation).where(Conversation.session_id == session_id)
 
 
 class SessionService:
@@ -19,33 +45,57 @@ class SessionService:
 
     def __init__(self):
         self.max_sessions = settings.MAX_SESSIONS
+        self.cache_hits = 0
+        self.cache_misses = 0
 
+    @traced("session_service.create_session")
+    @timed(SESSION_SERVICE_SECONDS, operation="create_session")
     async def create_session(
         self,
         db: AsyncSession,
         session_id: Optional[str] = None,
         workspace_name: Optional[str] = None
     ) -> Session:
-        """Create a new session"""
-        import uuid
+        """
+        Create a new session and commit
 
-        # Check session limit
-        count_stmt = select(Session).where(Session.is_active == True)
-        result = await db.execute(count_stmt)
-        active_count = len(result.scalars().all())
-
-        if active_count >= self.max_sessions:
-            raise ValueError(f"Maximum number of sessions ({self.max_sessions}) reached")
-
-        # Generate session ID if not provided (must be UUID format)
-        if not session_id:
-            session_id = str(uuid.uuid4())
+        The session is cached, and a claimed standby client adopted, only once
+        the row is committed.
+        """
+        import uuid
 
-        # Create workspace
-        workspace_path = await workspace_service.create_workspace(
-            session_id=session_id,
-            workspace_name=workspace_name
+        # Check session limit; the counter row lock makes this atomic across workers
+        active_count = await counter_service.add(
+            db, ACTIVE_SESSIONS, 1, count_sessions(), limit=self.max_sessions
         )
+        if active_count is None:
+            raise ValueError(f"Maximum number of sessions ({self.max_sessions}) reached")
+        await counter_service.add(db, TOTAL_SESSIONS, 1, count_sessions(active_only=False))
+
+        # Claim a warm workspace and client when no custom ID or name is requested
+        slot = None
+        try:
+            if not session_id and not workspace_name:
+                slot = await standby_pool.claim()
+
+            if slot:
+                session_id = slot.session_id
+                workspace_path = slot.workspace_path
+            else:
+                # Generate session ID if not provided (must be UUID format)
+                if not session_id:
+                    session_id = str(uuid.uuid4())
+
+                # Create workspace
+                workspace_path = await workspace_service.create_workspace(
+                    session_id=session_id,
+                    workspace_name=workspace_name
+                )
+        except Exception:
+            # Callers may commit after a ValueError, so give the slot back explicitly
+            await counter_service.add(db, ACTIVE_SESSIONS, -1, count_sessions())
+            await counter_service.add(db, TOTAL_SESSIONS, -1, count_sessions(active_only=False))
+            raise
 
         # Create session in database
         session = Session(
@@ -55,28 +105,27 @@ class SessionService:
         )
 
         db.add(session)
-        await db.flush()
-        await db.refresh(session)
+        try:
+            await db.flush()
+            await db.refresh(session)
+            await db.commit()
+        except Exception:
+            if slot:
+                await standby_pool.discard(slot)
+            raise
+
+        if slot:
+            await client_pool.adopt(session_id, slot.client)
 
         # Cache session info
         await self._cache_session(session)
 
         return session
 
+    @traced("session_service.get_session")
+    @timed(SESSION_SERVICE_SECONDS, operation="get_session")
     async def get_session(self, db: AsyncSession, session_id: str) -> Optional[Session]:
-        """Get session by ID"""
-
-        # Try to get from cache first
-        cached = await cache_service.get_session_info(session_id)
-        if cached:
-            # Verify session still exists in DB
-            stmt = select(Session).where(Session.id == session_id)
-            result = await db.execute(stmt)
-            session = result.scalar_one_or_none()
-            if session:
-                return session
-
-        # Get from database
+        """Get the session row by ID, for callers that modify it"""
         stmt = select(Session).where(Session.id == session_id)
         result = await db.execute(stmt)
         session = result.scalar_one_or_none()
@@ -86,90 +135,165 @@ class SessionService:
 
         return session
 
+    @traced("session_service.get_session_info")
+    @timed(SESSION_SERVICE_SECONDS, operation="get_session_info")
+    async def get_session_info(self, db: AsyncSession, session_id: str) -> Optional[SessionInfo]:
+        """
+        Get session info by ID through the cache
+
+        A cache hit is served from Redis without touching the database; every
+        write to a session updates or removes its cache entry.
+        """
+        cached = await cache_service.get_session_info(session_id)
+        if cached:
+            try:
+                info = SessionInfo.model_validate(cached)
+                self.cache_hits += 1
+                return info
+            except ValidationError:
+                # Entry written by an older version
+                pass
+
+        self.cache_misses += 1
+        session = await self.get_session(db, session_id)
+        return SessionInfo.model_validate(session) if session else None
+
+    @traced("session_service.list_sessions")
+    @timed(SESSION_SERVICE_SECONDS, operation="list_sessions")
     async def list_sessions(
         self,
         db: AsyncSession,
         skip: int = 0,
         limit: int = 100,
-        active_only: bool = True
-    ) -> tuple[list[Session], int]:
-        """List all sessions"""
+        active_only: bool = True,
+        cursor: Optional[str] = None
+    ) -> tuple[list[Session], int, Optional[str]]:
+        """
+        List sessions, newest first
+
+        Returns the page, the total and the cursor of the next page (None on
+        the last one). Raises ValueError for a malformed cursor.
+        """
 
         # Build query
         stmt = select(Session)
         if active_only:
             stmt = stmt.where(Session.is_active == True)
-
-        stmt = stmt.order_by(Session.created_at.desc())
+        stmt = paginate(stmt, Session, limit, skip=skip, cursor=cursor, descending=True)
 
         # Count total
-        count_stmt = select(Session)
-        if active_only:
-            count_stmt = count_stmt.where(Session.is_active == True)
-
-        count_result = await db.execute(count_stmt)
-        total = len(count_result.scalars().all())
+        total = await counter_service.get(
+            db,
+            ACTIVE_SESSIONS if active_only else TOTAL_SESSIONS,
+            count_sessions(active_only)
+        )
 
         # Get sessions
-        stmt = stmt.offset(skip).limit(limit)
         result = await db.execute(stmt)
-        sessions = result.scalars().all()
+        sessions, next_cursor = page(list(result.scalars().all()), limit)
 
-        return list(sessions), total
+        return sessions, total, next_cursor
 
+    @traced("session_service.update_session_activity")
+    @timed(SESSION_SERVICE_SECONDS, operation="update_session_activity")
     async def update_session_activity(
         self,
         db: AsyncSession,
         session_id: str,
         increment_conversation: bool = True,
-        claude_session_id: Optional[str] = None
+        claude_session_id: Optional[str] = None,
+        fence: Optional[int] = None
     ) -> Optional[Session]:
-        """Update session last activity and Claude session ID"""
+        """
+        Record session activity and update the Claude session ID
+
+        last_activity and conversation_count are written behind in bulk (see
+        app.services.activity). A new Claude session ID is written and committed
+        right away, then cached; with a fence (the run lock's fencing token) the
+        row is locked and the update is skipped if a newer run already wrote to
+        the session. Returns the row when it was written.
+        """
+        session_activity.record(session_id, increment_conversation)
+        if not claude_session_id:
+            return None
 
         stmt = select(Session).where(Session.id == session_id)
+        if fence is not None:
+            stmt = stmt.with_for_update()
         result = await db.execute(stmt)
         session = result.scalar_one_or_none()
 
         if not session:
             return None
 
-        session.last_activity = datetime.utcnow()
-        if increment_conversation:
-            session.conversation_count += 1
+        if fence is not None:
+            if session.run_fence is not None and session.run_fence > fence:
+                logger.warning(
+                    f"Ignoring stale update for session {session_id} "
+                    f"(fence {fence} < {session.run_fence})"
+                )
+                return session
+            session.run_fence = fence
 
-        # Update Claude session ID if provided
-        if claude_session_id:
-            session.claude_session_id = claude_session_id
+        session.claude_session_id = claude_session_id
 
         await db.flush()
         await db.refresh(session)
+        await db.commit()
 
         # Update cache
         await self._cache_session(session)
 
         return session
 
+    @traced("session_service.delete_session")
+    @timed(SESSION_SERVICE_SECONDS, operation="delete_session")
     async def delete_session(self, db: AsyncSession, session_id: str) -> bool:
-        """Delete a session"""
+        """
+        Delete a session and commit
+
+        The cache entry and event logs are only removed once the delete is
+        committed, so a concurrent read cannot cache the row again and a failed
+        commit leaves the logs of the surviving conversations in place.
+        """
 
         # Get session
         session = await self.get_session(db, session_id)
         if not session:
             return False
 
+        # Stop the session's live Claude client before removing its cwd
+        await client_pool.discard(session_id)
+
         # Delete workspace
         workspace_path = Path(session.workspace_path)
         await workspace_service.delete_workspace(workspace_path)
 
+        # Event logs of the conversations that the cascade is about to remove
+        result = await db.execute(
+            select(Conversation.event_log)
+            .where(Conversation.session_id == session_id, Conversation.event_log.is_not(None))
+        )
+        event_logs = list(result.scalars().all())
+
+        # Counters first, so a missing one is seeded with the session still counted
+        if session.is_active:
+            await counter_service.add(db, ACTIVE_SESSIONS, -1, count_sessions())
+        await counter_service.add(db, TOTAL_SESSIONS, -1, count_sessions(active_only=False))
+        await counter_service.discard(db, conversations_counter(session_id))
+
         # Delete from database (cascade will handle conversations)
         stmt = sql_delete(Session).where(Session.id == session_id)
         await db.execute(stmt)
+        await db.commit()
 
-        # Delete from cache
         await cache_service.delete_session_info(session_id)
+        await event_log_service.delete(event_logs)
 
         return True
 
+    @traced("session_service.create_conversation")
+    @timed(SESSION_SERVICE_SECONDS, operation="create_conversation")
     async def create_conversation(
         self,
         db: AsyncSession,
@@ -181,6 +305,8 @@ class SessionService:
     ) -> Conversation:
         """Create a conversation record"""
 
+        await counter_service.add(db, conversations_counter(session_id), 1, count_conversations(session_id))
+
         conversation = Conversation(
             session_id=session_id,
             user_message=user_message,
@@ -195,6 +321,21 @@ class SessionService:
 
         return conversation
 
+    @traced("session_service.count_conversations")
+    @timed(SESSION_SERVICE_SECONDS, operation="count_conversations")
+    async def count_conversations(self, db: AsyncSession, session_id: str) -> int:
+        """Number of conversations in a session"""
+        return await counter_service.get(db, conversations_counter(session_id), count_conversations(session_id))
+
+    @traced("session_service.get_conversation")
+    @timed(SESSION_SERVICE_SECONDS, operation="get_conversation")
+    async def get_conversation(self, db: AsyncSession, conversation_id: str) -> Optional[Conversation]:
+        """Get a conversation by ID"""
+        result = await db.execute(select(Conversation).where(Conversation.id == conversation_id))
+        return result.scalar_one_or_none()
+
+    @traced("session_service.update_conversation_response")
+    @timed(SESSION_SERVICE_SECONDS, operation="update_conversation_response")
     async def update_conversation_response(
         self,
         db: AsyncSession,
@@ -213,6 +354,7 @@ class SessionService:
 
         conversation.assistant_response = response
         conversation.tool_calls = tool_calls  # Save tool calls
+        conversation.status = ConversationStatus.COMPLETED
         conversation.completed_at = datetime.utcnow()
 
         await db.flush()
@@ -220,19 +362,100 @@ class SessionService:
 
         return conversation
 
-    async def _cache_session(self, session: Session):
-        """Cache session info"""
-        session_info = {
-            "id": session.id,
-            "claude_session_id": session.claude_session_id,
-            "workspace_path": session.workspace_path,
-            "workspace_name": session.workspace_name,
-            "created_at": session.created_at.isoformat(),
-            "last_activity": session.last_activity.isoformat(),
-            "conversation_count": session.conversation_count,
-            "is_active": session.is_active
+    @traced("session_service.checkpoint_conversation")
+    @timed(SESSION_SERVICE_SECONDS, operation="checkpoint_conversation")
+    async def checkpoint_conversation(
+        self,
+        db: AsyncSession,
+        conversation_id: str,
+        text: str = "",
+        tool_calls: Optional[list] = None,
+        status: Optional[str] = None,
+        response: Optional[str] = None
+    ) -> None:
+        """
+        Persist part of an in-flight response without loading the row
+
+        ``text`` is appended to the stored response, while ``response`` replaces
+        it. Tool calls are overwritten when given, and a final status also stamps
+        completed_at.
+        """
+        values = {"checkpointed_at": datetime.utcnow()}
+        if response is not None:
+            values["assistant_response"] = response
+        elif text:
+            values["assistant_response"] = func.coalesce(Conversation.assistant_response, "") + text
+
+        if tool_calls is not None:
+            values["tool_calls"] = tool_calls
+
+        if status:
+            values["status"] = status
+            if status != ConversationStatus.IN_PROGRESS:
+                values["completed_at"] = datetime.utcnow()
+
+        stmt = update(Conversation).where(Conversation.id == conversation_id).values(**values)
+        await db.execute(stmt)
+
+    @traced("session_service.touch_conversations")
+    @timed(SESSION_SERVICE_SECONDS, operation="touch_conversations")
+    async def touch_conversations(self, db: AsyncSession, conversation_ids: list[str]) -> None:
+        """Mark in-flight conversations as still being worked on"""
+        if not conversation_ids:
+            return
+        stmt = (
+            update(Conversation)
+            .where(Conversation.id.in_(conversation_ids))
+            .values(checkpointed_at=datetime.utcnow())
+        )
+        await db.execute(stmt)
+
+    @traced("session_service.abort_stale_conversations")
+    @timed(SESSION_SERVICE_SECONDS, operation="abort_stale_conversations")
+    async def abort_stale_conversations(self, db: AsyncSession, checkpointed_before: datetime) -> int:
+        """Mark in-progress conversations whose run stopped checkpointing as aborted"""
+        stmt = (
+            update(Conversation)
+            .where(
+                # Rendered inline: a generic plan of a prepared statement cannot match
+                # a bound status against the partial index on in-progress rows
+                Conversation.status == literal(ConversationStatus.IN_PROGRESS, literal_execute=True),
+                func.coalesce(Conversation.checkpointed_at, Conversation.created_at) < checkpointed_before
+            )
+            .values(status=ConversationStatus.ABORTED, completed_at=datetime.utcnow())
+        )
+        result = await db.execute(stmt)
+        return result.rowcount
+
+    @traced("session_service.record_event_log")
+    @timed(SESSION_SERVICE_SECONDS, operation="record_event_log")
+    async def record_event_log(
+        self,
+        db: AsyncSession,
+        conversation_id: str,
+        event_log: str,
+        event_count: int
+    ) -> None:
+        """Point a conversation at its finished event log"""
+        stmt = (
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(event_log=event_log, event_count=event_count)
+        )
+        await db.execute(stmt)
+
+    def stats(self) -> dict:
+        """Session cache hit rate"""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": round(self.cache_hits / lookups, 4) if lookups else None
         }
 
+    async def _cache_session(self, session: Session):
+        """Cache session info"""
+        session_info = SessionInfo.model_validate(session).model_dump(mode="json")
         await cache_service.set_session_info(session.id, session_info)
 
 
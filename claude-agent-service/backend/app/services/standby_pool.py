@@ -0,0 +1,194 @@
+"""
+Warm standby pool
+
+Keeps a few pre-initialized workspaces, each with an already connected Claude
+client, so that a brand-new session can be claimed without paying for the
+workspace templates and the CLI cold start on its first message.
+
+Unclaimed workspaces carry a marker naming the worker process that holds their
+client. At startup a worker deletes only the workspaces whose owner is gone, so
+sibling workers and the old workers of a rolling restart keep their pools.
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import socket
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from app.core.config import settings
+from app.services.workspace import workspace_service
+from app.services.client_pool import PooledClient, get_claude_options
+
+logger = logging.getLogger(__name__)
+
+# Marker file present only while a workspace is unclaimed
+STANDBY_MARKER = ".standby"
+
+
+def process_start_time(pid: int) -> Optional[str]:
+    """Start time of a process in clock ticks since boot; None where /proc is unavailable"""
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return None
+    # Fields after the parenthesised command name; starttime is field 22 overall
+    return stat.rsplit(")", 1)[1].split()[19]
+
+
+def owner_alive(owner: dict) -> bool:
+    """Whether the worker process that wrote a standby marker is still running"""
+    if owner.get("host") != socket.gethostname():
+        # Another host shares the workspace root; its processes cannot be checked
+        return True
+    pid = owner.get("pid")
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    # A reused pid belongs to a process started at another time
+    started = owner.get("started")
+    return started is None or process_start_time(pid) in (None, started)
+
+
+@dataclass
+class StandbySlot:
+    """A pre-built workspace and its running client, waiting for a session"""
+    session_id: str
+    workspace_path: Path
+    client: PooledClient
+
+
+class StandbyPool:
+    """Background-maintained pool of warm sessions"""
+
+    def __init__(self):
+        self.size = settings.STANDBY_POOL_SIZE
+        self.low_watermark = settings.STANDBY_POOL_LOW_WATERMARK
+
+        self._slots: deque[StandbySlot] = deque()
+        self._refill_needed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.claims = 0
+        self.empty_claims = 0
+        self.failures = 0
+
+        pid = os.getpid()
+        self.owner = {"host": socket.gethostname(), "pid": pid, "started": process_start_time(pid)}
+
+    async def start(self):
+        """Remove leftovers of dead workers and start filling the pool"""
+        await asyncio.to_thread(self._sweep_stale_workspaces)
+        if self.size <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._refill_loop())
+        self._refill_needed.set()
+
+    async def close(self):
+        """Stop refilling and tear down every unclaimed slot"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+        slots = list(self._slots)
+        self._slots.clear()
+        await asyncio.gather(*(self._destroy(slot) for slot in slots), return_exceptions=True)
+
+    async def claim(self) -> Optional[StandbySlot]:
+        """Take a warm slot, or None if the pool is empty"""
+        slot = None
+        while self._slots:
+            candidate = self._slots.popleft()
+            if candidate.client.alive:
+                slot = candidate
+                break
+            await self._destroy(candidate)
+
+        if slot is None:
+            self.empty_claims += 1
+        else:
+            self.claims += 1
+            (slot.workspace_path / STANDBY_MARKER).unlink(missing_ok=True)
+
+        if len(self._slots) <= self.low_watermark:
+            self._refill_needed.set()
+
+        return slot
+
+    async def discard(self, slot: StandbySlot):
+        """Tear down a claimed slot that could not be turned into a session"""
+        await self._destroy(slot)
+
+    async def _refill_loop(self):
+        """Top the pool back up to its size whenever it reaches the low watermark"""
+        while True:
+            await self._refill_needed.wait()
+            self._refill_needed.clear()
+
+            while len(self._slots) < self.size:
+                try:
+                    self._slots.append(await self._prepare())
+                except Exception as e:
+                    self.failures += 1
+                    logger.error(f"Failed to prepare standby session: {e}")
+                    await asyncio.sleep(5)
+                    self._refill_needed.set()
+                    break
+
+    async def _prepare(self) -> StandbySlot:
+        """Create a workspace and connect a client inside it"""
+        session_id = str(uuid.uuid4())
+        workspace_path = await workspace_service.create_workspace(session_id=session_id)
+        await asyncio.to_thread((workspace_path / STANDBY_MARKER).write_text, json.dumps(self.owner))
+
+        client = PooledClient(session_id, get_claude_options(workspace_path=str(workspace_path)))
+        try:
+            await client.start()
+        except Exception:
+            await workspace_service.delete_workspace(workspace_path)
+            raise
+
+        return StandbySlot(session_id=session_id, workspace_path=workspace_path, client=client)
+
+    async def _destroy(self, slot: StandbySlot):
+        await slot.client.close()
+        await workspace_service.delete_workspace(slot.workspace_path)
+
+    def _sweep_stale_workspaces(self):
+        """Delete unclaimed standby workspaces whose worker has exited"""
+        root = workspace_service.workspace_root
+        for marker in root.glob(f"*/{STANDBY_MARKER}"):
+            try:
+                owner = json.loads(marker.read_text())
+            except FileNotFoundError:
+                # Claimed meanwhile
+                continue
+            except ValueError:
+                # Empty marker written before owners were recorded
+                owner = {}
+            if owner and owner_alive(owner):
+                continue
+            shutil.rmtree(marker.parent, ignore_errors=True)
+
+    def stats(self) -> dict:
+        """Pool fill level and claim counters"""
+        return {
+            "ready": len(self._slots),
+            "size": self.size,
+            "low_watermark": self.low_watermark,
+            "claims": self.claims,
+            "empty_claims": self.empty_claims,
+            "failures": self.failures,
+        }
+
+
+# Global standby pool instance
+standby_pool = StandbyPool()
@@ -8,6 +8,7 @@ from typing import Optional
 import aiofiles
 
 from app.core.config import settings
+from app.core.metrics import WORKSPACE_OPERATION_SECONDS, timed
 
 
 class WorkspaceService:
@@ -22,6 +23,7 @@ class WorkspaceService:
         name = workspace_name or session_id
         return self.workspace_root / name
 
+    @timed(WORKSPACE_OPERATION_SECONDS, operation="create_workspace")
     async def create_workspace(self, session_id: str, workspace_name: Optional[str] = None) -> Path:
         """Create workspace directory"""
         workspace_path = self.get_workspace_path(session_id, workspace_name)
@@ -36,6 +38,7 @@ class WorkspaceService:
 
         return workspace_path
 
+    @timed(WORKSPACE_OPERATION_SECONDS, operation="delete_workspace")
     async def delete_workspace(self, workspace_path: Path) -> bool:
         """Delete workspace directory"""
         if workspace_path.exists():
@@ -0,0 +1,63 @@
+"""
+Keyset pagination cursors
+
+A cursor is an opaque token naming the last row of a page by its
+``(created_at, id)`` key; the next page starts right after that row, so deep
+pages cost the same as the first one instead of scanning skipped rows.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Select, tuple_
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    payload = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Key of a cursor; raises ValueError for a malformed one"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), str(row_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def paginate(
+    stmt: Select,
+    model,
+    limit: int,
+    skip: int = 0,
+    cursor: Optional[str] = None,
+    descending: bool = False
+) -> Select:
+    """
+    Order a select by ``(created_at, id)`` and restrict it to one page
+
+    One extra row is fetched so the caller can tell whether a next page exists
+    (see ``page``). ``skip`` is only applied without a cursor.
+    """
+    key = tuple_(model.created_at, model.id)
+    if cursor is not None:
+        after = tuple_(*decode_cursor(cursor))
+        stmt = stmt.where(key < after if descending else key > after)
+    elif skip:
+        stmt = stmt.offset(skip)
+
+    if descending:
+        stmt = stmt.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        stmt = stmt.order_by(model.created_at.asc(), model.id.asc())
+    return stmt.limit(limit + 1)
+
+
+def page(rows: list, limit: int) -> tuple[list, Optional[str]]:
+    """Rows of a page fetched with ``paginate`` and the cursor of the next one"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
@@ -0,0 +1,62 @@
+"""
+Server-Sent Events encoding
+
+Uses orjson when it is installed and falls back to the stdlib encoder.
+"""
+import json
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+if orjson is not None:
+    JSON_BACKEND = "orjson"
+
+    def dumps(obj: Any) -> bytes:
+        """Encode an object as compact UTF-8 JSON"""
+        return orjson.dumps(obj)
+else:
+    JSON_BACKEND = "json"
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(obj: Any) -> bytes:
+        """Encode an object as compact UTF-8 JSON"""
+        return _encoder.encode(obj).encode("utf-8")
+
+
+class SSEWriter:
+    """
+    Encodes stream events for one chat stream
+
+    The session and conversation IDs are the same for every event of a stream,
+    so they are encoded once and appended to each event body as raw bytes.
+    """
+
+    def __init__(self, session_id: str, conversation_id: str):
+        self.session_id = session_id
+        self.conversation_id = conversation_id
+        self._envelope = (
+            b'"session_id":' + dumps(session_id)
+            + b',"conversation_id":' + dumps(conversation_id) + b'}'
+        )
+
+    def encode(self, event: dict) -> bytes:
+        """Encode an event (without IDs) as a JSON object that includes the IDs"""
+        body = dumps(event)
+        if len(body) == 2:
+            return b'{' + self._envelope
+        return body[:-1] + b',' + self._envelope
+
+    def frame(self, event: dict, event_id: Optional[int] = None) -> bytes:
+        """Encode an event as a complete SSE frame"""
+        return encode_frame(self.encode(event), event_id)
+
+
+def encode_frame(payload: bytes, event_id: Optional[int] = None) -> bytes:
+    """Wrap an already encoded event payload in an SSE frame"""
+    if event_id is None:
+        return b"data: " + payload + b"\n\n"
+    return b"id: " + str(event_id).encode() + b"\ndata: " + payload + b"\n\n"
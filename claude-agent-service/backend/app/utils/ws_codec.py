@@ -0,0 +1,61 @@
+"""
+WebSocket frame encoding
+
+Events are sent as binary msgpack frames when msgpack is installed and
+requested, otherwise as JSON text frames. Client messages are accepted in
+either form regardless of the negotiated encoding.
+"""
+import json
+from typing import Any, Optional, Union
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+from app.utils.sse import SSEWriter
+
+ENCODINGS = ("msgpack", "json") if msgpack is not None else ("json",)
+
+
+class WSCodec:
+    """Encodes run events and decodes client messages for one connection"""
+
+    def __init__(self, encoding: Optional[str] = None):
+        if encoding is None:
+            encoding = ENCODINGS[0]
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unsupported encoding: {encoding} (available: {', '.join(ENCODINGS)})")
+        self.encoding = encoding
+        self.binary = encoding == "msgpack"
+
+    def encode(self, data: dict) -> Union[bytes, str]:
+        """Encode a connection-level message (not tied to a run)"""
+        if self.binary:
+            return msgpack.packb(data)
+        return json.dumps(data, ensure_ascii=False)
+
+    def encode_event(self, writer: SSEWriter, event_id: int, data: dict, payload: bytes) -> Union[bytes, str]:
+        """Encode a run event with its ID and the session/conversation IDs"""
+        if self.binary:
+            message = {"id": event_id}
+            message.update(data)
+            message["session_id"] = writer.session_id
+            message["conversation_id"] = writer.conversation_id
+            return msgpack.packb(message)
+        # Reuse the JSON payload already encoded for SSE subscribers
+        return (b'{"id":' + str(event_id).encode() + b',' + payload[1:]).decode()
+
+    def decode(self, message: dict) -> Any:
+        """Decode a received websocket message (text or bytes)"""
+        text = message.get("text")
+        if text is not None:
+            return json.loads(text)
+
+        data = message.get("bytes") or b""
+        if msgpack is not None:
+            try:
+                return msgpack.unpackb(data)
+            except Exception:
+                pass
+        return json.loads(data)
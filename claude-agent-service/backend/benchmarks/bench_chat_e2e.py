@@ -0,0 +1,304 @@
+"""
+End-to-end chat throughput benchmark
+
+Starts the service under uvicorn in a subprocess with the scripted Claude CLI
+stand-in (benchmarks.fake_cli), SQLite and an in-process fakeredis, then drives
+POST /api/chat/stream from N concurrent sessions and reports time to first
+token (p50/p99), whole-turn latency, events per second and the server's CPU
+time and RSS.
+
+TTFT is measured to the first text_delta, or to the first output event when
+the SDK in use does not stream partial messages.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_chat_e2e [--sessions 20] [--turns 5] [--tokens-per-sec 200]
+    python -m benchmarks.bench_chat_e2e --json results.json
+    python -m benchmarks.bench_chat_e2e --baseline results.json --tolerance 0.1
+
+With --baseline the run exits non-zero when p99 TTFT, p99 turn latency or
+events/s regressed by more than the tolerance. Pass --database-url for a local
+PostgreSQL and --real-redis to use the REDIS_* settings instead of fakeredis.
+Requires the packages in benchmarks/requirements.txt.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Events that are not model output
+PREAMBLE_EVENTS = {"connected", "queued", "system"}
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def serve(port: int, real_redis: bool):
+    """Run the app in this process (the benchmark's server subprocess)"""
+    import uvicorn
+    import app.main
+
+    if not real_redis:
+        import fakeredis
+        from app.core import redis as redis_module
+
+        async def init_fake_redis():
+            redis_module.redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+        app.main.init_redis = init_fake_redis
+
+    uvicorn.run(app.main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_usage(pid: int) -> Optional[dict]:
+    """CPU seconds and RSS of a process from /proc (Linux only)"""
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return None
+
+    memory = {}
+    for line in status.splitlines():
+        key, _, value = line.partition(":")
+        if key in ("VmRSS", "VmHWM"):
+            memory[key] = int(value.split()[0]) * 1024
+    return {
+        # utime and stime are fields 14 and 15 of /proc/<pid>/stat
+        "cpu_seconds": (int(stat[11]) + int(stat[12])) / CLOCK_TICKS,
+        "rss_bytes": memory.get("VmRSS"),
+        "peak_rss_bytes": memory.get("VmHWM"),
+    }
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+def server_env(args, root: Path) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "ANTHROPIC_BEDROCK_BASE_URL": env.get("ANTHROPIC_BEDROCK_BASE_URL", "http://fake-claude"),
+        "ANTHROPIC_AUTH_TOKEN": env.get("ANTHROPIC_AUTH_TOKEN", "fake"),
+        "POSTGRES_PASSWORD": env.get("POSTGRES_PASSWORD", "fake"),
+        "DATABASE_URL_OVERRIDE": args.database_url or f"sqlite+aiosqlite:///{root / 'bench.db'}",
+        "WORKSPACE_ROOT": str(root / "workspace"),
+        "BLOB_STORE_ROOT": str(root / "blobs"),
+        "TRACE_ROOT": str(root / "traces"),
+        "EVENT_LOG_ROOT": str(root / "event_logs"),
+        "CLAUDE_CONFIG_DIR": str(root / "claude"),
+        "STANDBY_POOL_SIZE": str(args.standby),
+        "CLAUDE_TRANSPORT_FACTORY": "benchmarks.fake_cli:create_transport",
+        "FAKE_CLI_TOKENS_PER_SEC": str(args.tokens_per_sec),
+        "FAKE_CLI_TOOL_LATENCY_MS": str(args.tool_latency_ms),
+        "FAKE_CLI_FIRST_TOKEN_MS": str(args.first_token_ms),
+        "FAKE_CLI_CONNECT_MS": str(args.connect_ms),
+        "PYTHONPATH": str(BACKEND_DIR),
+    })
+    if args.script:
+        env["FAKE_CLI_SCRIPT"] = str(Path(args.script).resolve())
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+async def wait_ready(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+
+async def run_turn(client: httpx.AsyncClient, session_id: str, message: str, results: dict):
+    """Stream one chat turn and record its timings"""
+    started = time.perf_counter()
+    first_output = first_text = None
+    events = 0
+
+    async with client.stream("POST", "/api/chat/stream", json={"session_id": session_id, "message": message}) as response:
+        if response.status_code != 200:
+            await response.aread()
+            results["errors"].append(f"HTTP {response.status_code}: {response.text[:200]}")
+            return
+
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            events += 1
+            event_type = json.loads(line[6:]).get("type")
+            now = time.perf_counter()
+            if first_output is None and event_type not in PREAMBLE_EVENTS:
+                first_output = now
+            if first_text is None and event_type == "text_delta":
+                first_text = now
+            if event_type == "error":
+                results["errors"].append(line[6:200])
+
+    finished = time.perf_counter()
+    ttft = first_text or first_output
+    if ttft is not None:
+        results["ttft"].append(ttft - started)
+    results["turn"].append(finished - started)
+    results["events"] += events
+
+
+async def run_session(client: httpx.AsyncClient, turns: int, results: dict):
+    response = await client.post("/api/sessions", json={})
+    response.raise_for_status()
+    session_id = response.json()["id"]
+    for turn in range(turns):
+        await run_turn(client, session_id, f"Benchmark turn {turn}", results)
+
+
+async def drive(args, base_url: str, process: subprocess.Popen) -> dict:
+    limits = httpx.Limits(max_connections=args.sessions * 2, max_keepalive_connections=args.sessions * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        await wait_ready(client, process)
+
+        if args.warmup:
+            warmup = {"ttft": [], "turn": [], "events": 0, "errors": []}
+            await asyncio.gather(*(run_session(client, 1, warmup) for _ in range(args.warmup)))
+
+        results = {"ttft": [], "turn": [], "events": 0, "errors": []}
+        usage_before = process_usage(process.pid)
+        started = time.perf_counter()
+        await asyncio.gather(*(run_session(client, args.turns, results) for _ in range(args.sessions)))
+        wall = time.perf_counter() - started
+        usage_after = process_usage(process.pid)
+
+    report = {
+        "sessions": args.sessions,
+        "turns": len(results["turn"]),
+        "errors": len(results["errors"]),
+        "wall_seconds": wall,
+        "ttft_p50_ms": _ms(percentile(results["ttft"], 0.5)),
+        "ttft_p99_ms": _ms(percentile(results["ttft"], 0.99)),
+        "turn_p50_ms": _ms(percentile(results["turn"], 0.5)),
+        "turn_p99_ms": _ms(percentile(results["turn"], 0.99)),
+        "events": results["events"],
+        "events_per_sec": results["events"] / wall if wall else 0,
+    }
+    if usage_before and usage_after:
+        cpu = usage_after["cpu_seconds"] - usage_before["cpu_seconds"]
+        report.update({
+            "server_cpu_seconds": cpu,
+            "server_cpu_percent": cpu / wall * 100 if wall else 0,
+            "server_rss_mb": usage_after["rss_bytes"] / 2**20,
+            "server_peak_rss_mb": usage_after["peak_rss_bytes"] / 2**20,
+        })
+    for error in results["errors"][:5]:
+        print(f"  error: {error}", file=sys.stderr)
+    return report
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return seconds * 1000 if seconds is not None else None
+
+
+def print_report(report: dict):
+    print(f"{report['sessions']} sessions, {report['turns']} turns, {report['errors']} errors "
+          f"in {report['wall_seconds']:.2f}s")
+    for label, key in (("TTFT", "ttft"), ("turn", "turn")):
+        p50, p99 = report[f"{key}_p50_ms"], report[f"{key}_p99_ms"]
+        if p50 is not None:
+            print(f"{label:<12} p50 {p50:>9.1f} ms   p99 {p99:>9.1f} ms")
+    print(f"{'events':<12} {report['events']:,} ({report['events_per_sec']:,.0f}/s)")
+    if "server_cpu_seconds" in report:
+        print(f"{'server CPU':<12} {report['server_cpu_seconds']:.2f}s ({report['server_cpu_percent']:.0f}% of one core)")
+        print(f"{'server RSS':<12} {report['server_rss_mb']:.0f} MB (peak {report['server_peak_rss_mb']:.0f} MB)")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of this run against a baseline report"""
+    regressions = []
+    for key in ("ttft_p99_ms", "turn_p99_ms"):
+        if report.get(key) and baseline.get(key) and report[key] > baseline[key] * (1 + tolerance):
+            regressions.append(f"{key}: {report[key]:.1f} > {baseline[key]:.1f}")
+    if baseline.get("events_per_sec") and report["events_per_sec"] < baseline["events_per_sec"] * (1 - tolerance):
+        regressions.append(f"events_per_sec: {report['events_per_sec']:.0f} < {baseline['events_per_sec']:.0f}")
+    if report["errors"] > baseline.get("errors", 0):
+        regressions.append(f"errors: {report['errors']} > {baseline.get('errors', 0)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent sessions")
+    parser.add_argument("--turns", type=int, default=5, help="Sequential turns per session")
+    parser.add_argument("--warmup", type=int, default=2, help="Sessions run once before measuring")
+    parser.add_argument("--tokens-per-sec", type=float, default=200, help="Fake CLI text rate (0 = unthrottled)")
+    parser.add_argument("--tool-latency-ms", type=float, default=100, help="Fake CLI tool latency")
+    parser.add_argument("--first-token-ms", type=float, default=200, help="Fake CLI latency before streaming")
+    parser.add_argument("--connect-ms", type=float, default=300, help="Fake CLI startup time")
+    parser.add_argument("--script", help="Fake CLI script (JSON) or recorded turn (JSONL)")
+    parser.add_argument("--standby", type=int, default=0, help="STANDBY_POOL_SIZE of the server")
+    parser.add_argument("--database-url", help="SQLAlchemy URL instead of a temporary SQLite file")
+    parser.add_argument("--real-redis", action="store_true", help="Use the REDIS_* settings instead of fakeredis")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra server setting")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--baseline", help="Fail on regressions against this report")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed regression against the baseline")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.real_redis)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="bench-chat-") as tmp:
+        root = Path(tmp)
+        port = free_port()
+        command = [sys.executable, "-m", "benchmarks.bench_chat_e2e", "--serve", str(port)]
+        if args.real_redis:
+            command.append("--real-redis")
+        process = subprocess.Popen(command, cwd=BACKEND_DIR, env=server_env(args, root), stdout=subprocess.DEVNULL)
+        try:
+            report = asyncio.run(drive(args, f"http://127.0.0.1:{port}", process))
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+    if args.baseline:
+        regressions = compare(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+SSE encoding micro-benchmark
+
+Compares the original per-event encoding (rebuild the dict with the session and
+conversation IDs, stdlib json.dumps, str frame) against SSEWriter.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_sse_encoding [--events 200000]
+"""
+import argparse
+import json
+import time
+import uuid
+
+from app.utils.sse import JSON_BACKEND, SSEWriter
+
+
+def sample_events() -> list[dict]:
+    """A representative mix: mostly text deltas plus tool and stream events"""
+    events = [{"type": "text_delta", "content": "我来帮你分析这段代码 "} for _ in range(40)]
+    events += [{"type": "tool_input_delta", "partial_json": '{"file_path": "/workspace/src/'} for _ in range(8)]
+    events.append({
+        "type": "tool_use",
+        "tool": {"id": "toolu_01", "name": "Read", "input": {"file_path": "/workspace/README.md"}}
+    })
+    events.append({
+        "type": "tool_result",
+        "tool_use_id": "toolu_01",
+        "content": "# Claude Agent Workspace\n" * 20,
+        "is_error": False
+    })
+    events.append({
+        "type": "stream_event",
+        "event_type": "message_delta",
+        "data": {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": 124}}
+    })
+    return events
+
+
+def encode_baseline(events: list[dict], session_id: str, conversation_id: str) -> int:
+    total = 0
+    for event in events:
+        event_data = dict(event)
+        event_data["session_id"] = session_id
+        event_data["conversation_id"] = conversation_id
+        frame = f"data: {json.dumps(event_data)}\n\n"
+        total += len(frame.encode("utf-8"))
+    return total
+
+
+def encode_writer(events: list[dict], session_id: str, conversation_id: str) -> int:
+    writer = SSEWriter(session_id, conversation_id)
+    total = 0
+    for event in events:
+        total += len(writer.frame(event))
+    return total
+
+
+def run(name: str, encode, events: list[dict], rounds: int) -> float:
+    session_id = str(uuid.uuid4())
+    conversation_id = str(uuid.uuid4())
+
+    started = time.perf_counter()
+    size = 0
+    for _ in range(rounds):
+        size = encode(events, session_id, conversation_id)
+    elapsed = time.perf_counter() - started
+
+    rate = rounds * len(events) / elapsed
+    print(f"{name:<12} {rate:>12,.0f} events/s   {size / len(events):>8.1f} bytes/event")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200_000, help="Approximate number of events to encode")
+    args = parser.parse_args()
+
+    events = sample_events()
+    rounds = max(1, args.events // len(events))
+
+    print(f"JSON backend: {JSON_BACKEND}, {rounds * len(events):,} events\n")
+    before = run("json.dumps", encode_baseline, events, rounds)
+    after = run("SSEWriter", encode_writer, events, rounds)
+    print(f"\nspeedup: {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+SSE stream compression benchmark
+
+Encodes a representative turn with SSEWriter and reports bytes on the wire and
+compressor CPU time for identity, gzip and brotli (when installed), flushing
+after every event or after every batch of coalesced events.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_stream_compression [--turns 200] [--batch 8]
+"""
+import argparse
+import time
+import uuid
+
+from app.utils.compression import ENCODINGS, StreamCompressor
+from app.utils.sse import SSEWriter
+from benchmarks.bench_sse_encoding import sample_events
+
+
+def turn_frames(repeat: int) -> list[bytes]:
+    """SSE frames of one turn: the sample event mix repeated"""
+    writer = SSEWriter(str(uuid.uuid4()), str(uuid.uuid4()))
+    events = sample_events() * repeat + [{"type": "done", "claude_session_id": str(uuid.uuid4())}]
+    return [writer.frame(event, event_id) for event_id, event in enumerate(events, 1)]
+
+
+def compress_turn(frames: list[bytes], encoding: str, batch: int) -> int:
+    """Compress one turn, flushing every `batch` frames; returns bytes written"""
+    compressor = StreamCompressor(encoding)
+    total = 0
+    for start in range(0, len(frames), batch):
+        total += len(compressor.compress(b"".join(frames[start:start + batch])))
+    total += len(compressor.finish())
+    return total
+
+
+def run(name: str, frames: list[bytes], turns: int, encoding, batch: int, raw_size: int):
+    started = time.process_time()
+    size = raw_size
+    for _ in range(turns):
+        size = compress_turn(frames, encoding, batch) if encoding else raw_size
+    cpu = time.process_time() - started
+
+    per_event_us = cpu / (turns * len(frames)) * 1_000_000
+    print(
+        f"{name:<18} {size:>10,} bytes/turn   {size / raw_size:>6.1%}   "
+        f"{per_event_us:>7.2f} µs CPU/event"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200, help="Number of turns to compress")
+    parser.add_argument("--repeat", type=int, default=10, help="Sample event mixes per turn")
+    parser.add_argument("--batch", type=int, default=8, help="Events per flush in the batched runs")
+    args = parser.parse_args()
+
+    frames = turn_frames(args.repeat)
+    raw_size = sum(len(frame) for frame in frames)
+    print(f"{len(frames)} events/turn, {args.turns} turns, encodings: {', '.join(ENCODINGS)}\n")
+
+    run("identity", frames, args.turns, None, 1, raw_size)
+    for encoding in reversed(ENCODINGS):
+        run(f"{encoding} per event", frames, args.turns, encoding, 1, raw_size)
+        run(f"{encoding} per {args.batch}", frames, args.turns, encoding, args.batch, raw_size)
+        run(f"{encoding} whole turn", frames, args.turns, encoding, len(frames), raw_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Scripted stand-in for the Claude CLI
+
+FakeCLITransport implements the SDK Transport interface: it answers the
+control protocol (initialize, interrupt) and plays back a script for every
+query instead of running the CLI, streaming text at a configurable token rate
+and holding tool results back for a configurable latency. No model is called.
+
+Enable it in the service with
+    CLAUDE_TRANSPORT_FACTORY=benchmarks.fake_cli:create_transport
+
+and tune it with environment variables:
+    FAKE_CLI_SCRIPT           JSON script (see below) or JSONL recording; built-in turn by default
+    FAKE_CLI_TOKENS_PER_SEC   text streaming rate (default 50, 0 = no delay)
+    FAKE_CLI_TOOL_LATENCY_MS  delay before each tool result (default 200)
+    FAKE_CLI_FIRST_TOKEN_MS   model latency before a turn starts streaming (default 500)
+    FAKE_CLI_CONNECT_MS       CLI startup time (default 300)
+
+A JSON script holds one list of steps per turn; queries cycle through them:
+    {"turns": [[{"text": "Let me look."},
+                {"tool": "Bash", "input": {"command": "ls"}, "result": "a.txt", "latency_ms": 50},
+                {"text": "There is one file."}]]}
+
+A JSONL file is one recorded turn of raw CLI stream-json messages (as printed by
+``claude -p --output-format stream-json --include-partial-messages``); text
+deltas are paced at the token rate and tool results by the tool latency.
+
+Like the CLI, every turn is appended to the session's transcript under
+CLAUDE_CONFIG_DIR (default ~/.claude), so copies of it can be resumed.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+
+from claude_agent_sdk import ClaudeAgentOptions
+from claude_agent_sdk._internal.transport import Transport
+
+from app.services.client_pool import claude_transcript_path
+
+MODEL = "fake-claude"
+
+DEFAULT_SCRIPT = {
+    "turns": [[
+        {"text": "I'll start by looking at the files in the workspace so that I know what we are working with."},
+        {"tool": "Bash", "input": {"command": "ls -la", "description": "List files"},
+         "result": "total 8\ndrwxr-xr-x 2 user user 4096 .\n-rw-r--r-- 1 user user  120 README.md\n"},
+        {"text": (
+            "The workspace only contains a README. Here is a short summary of what it says, followed by "
+            "a few suggestions on how to structure the project: keep the source in a src directory, add "
+            "tests next to it, and describe how to run everything in the README so that new contributors "
+            "can get started quickly. Let me know which of these you would like me to set up first."
+        )},
+    ]]
+}
+
+TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+_CLOSED = object()
+
+
+def load_script(path: Optional[str]) -> list[list[dict]]:
+    """Turns of a script file as lists of steps"""
+    if not path:
+        return DEFAULT_SCRIPT["turns"]
+
+    content = Path(path).read_text(encoding="utf-8")
+    if path.endswith(".jsonl"):
+        return [[{"message": json.loads(line)} for line in content.splitlines() if line.strip()]]
+    return json.loads(content)["turns"]
+
+
+class FakeCLITransport(Transport):
+    """SDK transport that plays back a script instead of running the CLI"""
+
+    def __init__(
+        self,
+        options: ClaudeAgentOptions,
+        turns: list[list[dict]],
+        tokens_per_sec: float = 50,
+        tool_latency_ms: float = 200,
+        first_token_ms: float = 500,
+        connect_ms: float = 300
+    ):
+        self.options = options
+        self.turns = turns
+        self.token_delay = 1 / tokens_per_sec if tokens_per_sec > 0 else 0
+        self.tool_latency = tool_latency_ms / 1000
+        self.first_token_delay = first_token_ms / 1000
+        self.connect_delay = connect_ms / 1000
+        self.session_id = options.resume or str(uuid.uuid4())
+
+        self._out: asyncio.Queue = asyncio.Queue()
+        self._ready = False
+        self._turn_index = 0
+        self._turn: Optional[asyncio.Task] = None
+        self._interrupted = asyncio.Event()
+
+    async def connect(self) -> None:
+        await asyncio.sleep(self.connect_delay)
+        self._ready = True
+
+    def is_ready(self) -> bool:
+        return self._ready
+
+    async def end_input(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        self._ready = False
+        if self._turn is not None and not self._turn.done():
+            self._turn.cancel()
+        self._out.put_nowait(_CLOSED)
+
+    async def read_messages(self) -> AsyncIterator[dict[str, Any]]:
+        while True:
+            message = await self._out.get()
+            if message is _CLOSED:
+                return
+            yield message
+
+    async def write(self, data: str) -> None:
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            message = json.loads(line)
+            if message.get("type") == "control_request":
+                self._control(message)
+            elif message.get("type") == "user":
+                self._append_transcript({"type": "user", "message": message.get("message")})
+                steps = self.turns[self._turn_index % len(self.turns)]
+                self._turn_index += 1
+                self._interrupted.clear()
+                self._turn = asyncio.create_task(self._play(steps))
+
+    def _append_transcript(self, entry: dict):
+        """Add one line to the session transcript"""
+        path = claude_transcript_path(str(self.options.cwd), self.session_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        line = {**entry, "sessionId": self.session_id, "cwd": str(self.options.cwd)}
+        with path.open("a", encoding="utf-8") as transcript:
+            transcript.write(json.dumps(line) + "\n")
+
+    def _control(self, message: dict):
+        """Acknowledge control requests; interrupt stops the current turn"""
+        if message["request"].get("subtype") == "interrupt":
+            self._interrupted.set()
+        self._out.put_nowait({
+            "type": "control_response",
+            "response": {"subtype": "success", "request_id": message["request_id"], "response": {}},
+        })
+
+    async def _pause(self, delay: float) -> bool:
+        """Sleep unless interrupted; False once the turn was interrupted"""
+        if self._interrupted.is_set():
+            return False
+        if delay <= 0:
+            return True
+        try:
+            await asyncio.wait_for(self._interrupted.wait(), delay)
+            return False
+        except asyncio.TimeoutError:
+            return True
+
+    def _stream_event(self, event: dict) -> dict:
+        return {"type": "stream_event", "uuid": str(uuid.uuid4()), "session_id": self.session_id, "event": event}
+
+    async def _play(self, steps: list[dict]):
+        started = time.monotonic()
+        text_parts: list[str] = []
+        output_tokens = 0
+        completed = False
+
+        self._out.put_nowait({
+            "type": "system",
+            "subtype": "init",
+            "session_id": self.session_id,
+            "cwd": str(self.options.cwd),
+            "tools": ["Bash", "Read", "Write", "Edit"],
+            "model": MODEL,
+            "permissionMode": self.options.permission_mode,
+        })
+
+        if await self._pause(self.first_token_delay):
+            completed = True
+            for step in steps:
+                if "message" in step:
+                    played = await self._play_recorded(step["message"], text_parts)
+                elif "tool" in step:
+                    played = await self._play_tool(step)
+                else:
+                    played, tokens = await self._play_text(step.get("text", ""), text_parts)
+                    output_tokens += tokens
+                if not played:
+                    completed = False
+                    break
+
+        self._append_transcript({
+            "type": "assistant",
+            "message": {"model": MODEL, "content": [{"type": "text", "text": "".join(text_parts)}]},
+        })
+        elapsed_ms = int((time.monotonic() - started) * 1000)
+        self._out.put_nowait({
+            "type": "result",
+            "subtype": "success" if completed else "error_during_execution",
+            "duration_ms": elapsed_ms,
+            "duration_api_ms": elapsed_ms,
+            "is_error": not completed,
+            "num_turns": self._turn_index,
+            "session_id": self.session_id,
+            "total_cost_usd": 0.0,
+            "usage": {"input_tokens": 0, "output_tokens": output_tokens},
+            "result": "".join(text_parts),
+        })
+
+    async def _play_text(self, text: str, text_parts: list[str]) -> tuple[bool, int]:
+        """Stream one text block token by token"""
+        tokens = TOKEN_PATTERN.findall(text)
+        self._out.put_nowait(self._stream_event({"type": "message_start", "message": {"model": MODEL}}))
+        self._out.put_nowait(self._stream_event({
+            "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}
+        }))
+        for index, token in enumerate(tokens):
+            if not await self._pause(self.token_delay):
+                return False, index
+            text_parts.append(token)
+            self._out.put_nowait(self._stream_event({
+                "type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": token}
+            }))
+        self._out.put_nowait(self._stream_event({"type": "content_block_stop", "index": 0}))
+        self._out.put_nowait({
+            "type": "assistant",
+            "message": {"model": MODEL, "content": [{"type": "text", "text": text}]},
+        })
+        self._out.put_nowait(self._stream_event({"type": "message_stop"}))
+        return True, len(tokens)
+
+    async def _play_tool(self, step: dict) -> bool:
+        """Stream a tool call, wait for the tool latency, then return its result"""
+        tool_id = f"toolu_{uuid.uuid4().hex[:24]}"
+        tool_input = step.get("input", {})
+        self._out.put_nowait(self._stream_event({"type": "message_start", "message": {"model": MODEL}}))
+        self._out.put_nowait(self._stream_event({
+            "type": "content_block_start",
+            "index": 0,
+            "content_block": {"type": "tool_use", "id": tool_id, "name": step["tool"], "input": {}},
+        }))
+        self._out.put_nowait(self._stream_event({
+            "type": "content_block_delta",
+            "index": 0,
+            "delta": {"type": "input_json_delta", "partial_json": json.dumps(tool_input)},
+        }))
+        self._out.put_nowait(self._stream_event({"type": "content_block_stop", "index": 0}))
+        self._out.put_nowait({
+            "type": "assistant",
+            "message": {
+                "model": MODEL,
+                "content": [{"type": "tool_use", "id": tool_id, "name": step["tool"], "input": tool_input}],
+            },
+        })
+        self._out.put_nowait(self._stream_event({"type": "message_stop"}))
+
+        latency = step["latency_ms"] / 1000 if "latency_ms" in step else self.tool_latency
+        if not await self._pause(latency):
+            return False
+        self._out.put_nowait({
+            "type": "user",
+            "message": {"role": "user", "content": [{
+                "type": "tool_result",
+                "tool_use_id": tool_id,
+                "content": step.get("result", ""),
+                "is_error": step.get("is_error", False),
+            }]},
+        })
+        return True
+
+    async def _play_recorded(self, message: dict, text_parts: list[str]) -> bool:
+        """Replay one recorded CLI message, pacing text deltas and tool results"""
+        message_type = message.get("type")
+        if message_type in ("system", "result"):
+            # Sent by the player itself with this session's ID
+            return True
+
+        delay = 0
+        if message_type == "stream_event":
+            delta = message.get("event", {}).get("delta", {})
+            if delta.get("type") == "text_delta":
+                delay = self.token_delay
+                text_parts.append(delta.get("text", ""))
+            message = {**message, "session_id": self.session_id}
+        elif message_type == "user":
+            content = message.get("message", {}).get("content")
+            if isinstance(content, list) and any(block.get("type") == "tool_result" for block in content):
+                delay = self.tool_latency
+
+        if not await self._pause(delay):
+            return False
+        self._out.put_nowait(message)
+        return True
+
+
+def create_transport(options: ClaudeAgentOptions) -> FakeCLITransport:
+    """CLAUDE_TRANSPORT_FACTORY entry point configured from FAKE_CLI_* variables"""
+    return FakeCLITransport(
+        options,
+        load_script(os.getenv("FAKE_CLI_SCRIPT")),
+        tokens_per_sec=float(os.getenv("FAKE_CLI_TOKENS_PER_SEC", "50")),
+        tool_latency_ms=float(os.getenv("FAKE_CLI_TOOL_LATENCY_MS", "200")),
+        first_token_ms=float(os.getenv("FAKE_CLI_FIRST_TOKEN_MS", "500")),
+        connect_ms=float(os.getenv("FAKE_CLI_CONNECT_MS", "300")),
+    )
@@ -0,0 +1,56 @@
+"""
+Test configuration
+
+Settings are read when app modules are imported, so the environment is set up
+here first. Claude runs through the scripted stand-in from the benchmarks, and
+Redis is an in-process fakeredis.
+"""
+import os
+import tempfile
+
+_root = tempfile.mkdtemp(prefix="claude-agent-tests-")
+
+for key, value in {
+    "ANTHROPIC_BEDROCK_BASE_URL": "http://localhost",
+    "ANTHROPIC_AUTH_TOKEN": "test",
+    "POSTGRES_PASSWORD": "test",
+    "DATABASE_URL_OVERRIDE": f"sqlite+aiosqlite:///{_root}/test.db",
+    "WORKSPACE_ROOT": f"{_root}/workspace",
+    "BLOB_STORE_ROOT": f"{_root}/blobs",
+    "TRACE_ROOT": f"{_root}/traces",
+    "EVENT_LOG_ROOT": f"{_root}/event_logs",
+    "CLAUDE_CONFIG_DIR": f"{_root}/claude",
+    "CLAUDE_TRANSPORT_FACTORY": "benchmarks.fake_cli:create_transport",
+    "FAKE_CLI_CONNECT_MS": "0",
+    "FAKE_CLI_FIRST_TOKEN_MS": "0",
+    "FAKE_CLI_TOKENS_PER_SEC": "20",
+    "FAKE_CLI_TOOL_LATENCY_MS": "10",
+    "STANDBY_POOL_SIZE": "0",
+}.items():
+    os.environ.setdefault(key, value)
+
+import fakeredis  # noqa: E402
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    """The app with its lifespan, backed by fakeredis"""
+    import app.main
+    from app.core import redis as redis_module
+
+    async def init_fake_redis():
+        redis_module.redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    monkeypatch.setattr(app.main, "init_redis", init_fake_redis)
+
+    async with app.main.app.router.lifespan_context(app.main.app):
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            yield client
@@ -0,0 +1,39 @@
+"""
+Tests for write-behind session activity
+"""
+import pytest
+
+from app.core.database import AsyncSessionLocal
+from app.services.activity import session_activity
+from app.services.cache import cache_service
+from app.services.session import session_service
+
+
+@pytest.mark.anyio
+async def test_flush_refreshes_cached_session_info_in_place(client):
+    session_id = (await client.post("/api/sessions", json={})).json()["id"]
+    async with AsyncSessionLocal() as db:
+        before = await session_service.get_session_info(db, session_id)
+    assert before.conversation_count == 0
+
+    session_activity.record(session_id)
+    session_activity.record(session_id)
+    await session_activity.flush()
+
+    cached = await cache_service.get_session_info(session_id)
+    assert cached is not None
+    assert cached["conversation_count"] == 2
+    assert cached["claude_session_id"] == before.claude_session_id
+
+    hits = session_service.cache_hits
+    async with AsyncSessionLocal() as db:
+        after = await session_service.get_session_info(db, session_id)
+    assert session_service.cache_hits == hits + 1
+    assert after.conversation_count == 2
+    assert after.last_activity > before.last_activity
+
+
+@pytest.mark.anyio
+async def test_update_leaves_uncached_keys_alone(client):
+    assert not await cache_service.update_session_info("missing", {"conversation_count": 1})
+    assert await cache_service.get_session_info("missing") is None
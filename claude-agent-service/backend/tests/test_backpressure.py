@@ -0,0 +1,62 @@
+"""
+Tests for subscriber buffers
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.services.backpressure import SubscriberBuffer
+from app.services.run_engine import RunEvent
+
+
+def make_event(event_id: int, data: dict, payload: bytes = None) -> RunEvent:
+    return RunEvent(event_id, data["type"], data, payload if payload is not None else json.dumps(data).encode())
+
+
+def text(event_id: int) -> RunEvent:
+    return make_event(event_id, {"type": "tool_use", "id": event_id})
+
+
+@pytest.mark.anyio
+async def test_spill_keeps_every_event_in_order():
+    buffer = SubscriberBuffer(make_event, max_size=4, policy="spill")
+    for event_id in range(1, 51):
+        buffer.put(text(event_id))
+    buffer.close()
+
+    received = []
+    while (event := await buffer.get()) is not None:
+        received.append(event)
+        if event.id == 10:
+            # Events arriving while the client drains the spill file stay in order
+            for late_id in range(51, 61):
+                buffer.closed = False
+                buffer.put(text(late_id))
+            buffer.close()
+    buffer.discard()
+
+    assert [event.id for event in received] == list(range(1, 61))
+    assert received[-1].payload == text(60).payload
+    assert buffer.stats()["spilled"] == 56
+
+
+@pytest.mark.anyio
+async def test_spill_writes_do_not_run_on_the_event_loop(monkeypatch):
+    buffer = SubscriberBuffer(make_event, max_size=1, policy="spill")
+    threads = []
+    to_thread = asyncio.to_thread
+
+    async def recording_to_thread(func, *args):
+        threads.append(func.__name__)
+        return await to_thread(func, *args)
+
+    monkeypatch.setattr(asyncio, "to_thread", recording_to_thread)
+    for event_id in range(1, 4):
+        buffer.put(text(event_id))
+    assert threads == []
+
+    buffer.close()
+    assert [(await buffer.get()).id for _ in range(3)] == [1, 2, 3]
+    assert "_write_records" in threads and "_read_records" in threads
+    buffer.discard()
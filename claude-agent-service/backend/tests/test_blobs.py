@@ -0,0 +1,44 @@
+"""
+Tests for serving offloaded blobs
+"""
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api import blobs
+from app.services.blob_store import blob_store
+
+app = FastAPI()
+app.include_router(blobs.router)
+
+
+async def fetch(digest: str) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(f"/api/blobs/{digest}")
+
+
+@pytest.mark.anyio
+async def test_offloaded_json_is_served_as_json():
+    content = [{"line": i, "text": "x" * 100} for i in range(2000)]
+    _, reference = await blob_store.offload(content)
+
+    response = await fetch(reference["sha256"])
+    assert response.headers["content-type"] == "application/json; charset=utf-8"
+    assert response.json() == content
+
+
+@pytest.mark.anyio
+async def test_offloaded_text_is_served_as_text():
+    _, reference = await blob_store.offload("café\n" * 20000)
+
+    response = await fetch(reference["sha256"])
+    assert response.headers["content-type"] == "text/plain; charset=utf-8"
+
+
+@pytest.mark.anyio
+async def test_blob_without_media_type_is_sniffed():
+    binary = await blob_store.put(bytes(range(256)) * 10)
+    text = await blob_store.put("plain workspace file\n".encode())
+
+    assert (await fetch(binary)).headers["content-type"] == "application/octet-stream"
+    assert (await fetch(text)).headers["content-type"] == "text/plain; charset=utf-8"
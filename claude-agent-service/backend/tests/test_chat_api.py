@@ -0,0 +1,82 @@
+"""
+Tests for starting chat runs through the API
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.services.event_log import event_log_service
+from app.services.run_lock import run_lock_service
+from app.services.run_scheduler import run_scheduler
+
+
+async def stream(client: httpx.AsyncClient, session_id: str, message: str) -> tuple[int, list[dict]]:
+    async with client.stream("POST", "/api/chat/stream", json={"session_id": session_id, "message": message}) as response:
+        events = [
+            json.loads(line[len("data: "):])
+            async for line in response.aiter_lines()
+            if line.startswith("data: ")
+        ]
+        return response.status_code, events
+
+
+@pytest.fixture(autouse=True)
+def slow_tools(monkeypatch):
+    # Long enough that the second request arrives while the first one runs
+    monkeypatch.setenv("FAKE_CLI_TOKENS_PER_SEC", "0")
+    monkeypatch.setenv("FAKE_CLI_TOOL_LATENCY_MS", "300")
+
+
+@pytest.mark.anyio
+async def test_concurrent_requests_for_a_session_queue_instead_of_conflicting(client):
+    session_id = (await client.post("/api/sessions", json={})).json()["id"]
+
+    first = asyncio.create_task(stream(client, session_id, "first"))
+    await asyncio.sleep(0.1)
+    second = asyncio.create_task(stream(client, session_id, "second"))
+    (first_status, first_events), (second_status, second_events) = await asyncio.gather(first, second)
+
+    assert (first_status, second_status) == (200, 200)
+    assert first_events[-1]["type"] == "done"
+    assert second_events[-1]["type"] == "done"
+    assert [event["position"] for event in second_events if event["type"] == "queued"] == [1]
+    assert "queued" not in {event["type"] for event in first_events}
+
+
+@pytest.mark.anyio
+async def test_back_to_back_runs_hand_over_the_session_lock(client, monkeypatch):
+    release = run_lock_service.release
+
+    async def slow_release(lease):
+        # A Redis round trip that lets the next queued run get scheduled meanwhile
+        await asyncio.sleep(0.05)
+        return await release(lease)
+
+    monkeypatch.setattr(run_lock_service, "release", slow_release)
+    session_id = (await client.post("/api/sessions", json={})).json()["id"]
+
+    runs = [asyncio.create_task(stream(client, session_id, f"turn {turn}")) for turn in range(3)]
+    results = await asyncio.gather(*runs)
+
+    assert [status for status, _ in results] == [200, 200, 200]
+    assert [events[-1]["type"] for _, events in results] == ["done", "done", "done"]
+
+
+@pytest.mark.anyio
+async def test_run_that_cannot_open_its_event_log_frees_the_session(client, monkeypatch):
+    async def unwritable(conversation_id):
+        raise PermissionError("EVENT_LOG_ROOT is not writable")
+
+    session_id = (await client.post("/api/sessions", json={})).json()["id"]
+    open_log = event_log_service.open
+    monkeypatch.setattr(event_log_service, "open", unwritable)
+    status, events = await stream(client, session_id, "first")
+    assert status == 200
+    assert [event["type"] for event in events] == ["error"]
+    assert run_scheduler.stats()["running"] == 0
+
+    monkeypatch.setattr(event_log_service, "open", open_log)
+    _, events = await stream(client, session_id, "second")
+    assert events[-1]["type"] == "done"
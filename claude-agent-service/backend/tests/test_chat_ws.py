@@ -0,0 +1,34 @@
+"""
+Tests for forwarding run events over a WebSocket
+"""
+import asyncio
+
+import pytest
+
+from app.api.chat_ws import ChatConnection
+from app.schemas.chat import ChatRequest
+from app.services.run_engine import AgentRun
+from app.services.run_scheduler import RunTicket
+from app.utils.ws_codec import WSCodec
+
+
+class BrokenCodec(WSCodec):
+    def encode_event(self, *args, **kwargs):
+        raise ValueError("cannot encode")
+
+
+@pytest.mark.anyio
+async def test_forward_failure_releases_the_subscription(monkeypatch):
+    run = AgentRun("session", "conv", "/tmp", None, ChatRequest(message="hello"), RunTicket("session", 1))
+    orphaned = []
+    monkeypatch.setattr(run, "_schedule_orphan_cancel", lambda: orphaned.append(True))
+
+    forward = asyncio.create_task(ChatConnection(None, BrokenCodec())._forward(run))
+    await asyncio.sleep(0)
+    assert len(run.subscribers) == 1
+
+    await run._publish({"type": "connected"})
+    await asyncio.wait_for(forward, 1)
+
+    assert not run.subscribers
+    assert orphaned == [True]
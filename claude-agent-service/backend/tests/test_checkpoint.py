@@ -0,0 +1,82 @@
+"""
+Tests for recovering conversations of stopped runs
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.core.database import AsyncSessionLocal, init_db
+from app.models.conversation import Conversation, ConversationStatus
+from app.models.session import Session
+from app.services.checkpoint import StaleConversationSweeper
+from app.services.session import session_service
+
+
+async def add_conversation(db, session_id, age_seconds, status=ConversationStatus.IN_PROGRESS):
+    conversation = Conversation(
+        session_id=session_id,
+        user_message="hi",
+        assistant_response="partial",
+        status=status,
+        checkpointed_at=datetime.utcnow() - timedelta(seconds=age_seconds)
+    )
+    db.add(conversation)
+    await db.flush()
+    return conversation.id
+
+
+@pytest.mark.anyio
+async def test_sweep_aborts_only_conversations_without_recent_checkpoints():
+    await init_db()
+    session_id = str(uuid.uuid4())
+    async with AsyncSessionLocal() as db:
+        db.add(Session(id=session_id, workspace_path=f"/tmp/{session_id}", workspace_name=session_id))
+        await db.flush()
+        crashed = await add_conversation(db, session_id, 600)
+        fresh = await add_conversation(db, session_id, 1)
+        live = await add_conversation(db, session_id, 600)
+        finished = await add_conversation(db, session_id, 600, ConversationStatus.COMPLETED)
+        await db.commit()
+
+    sweeper = StaleConversationSweeper()
+    sweeper._live = lambda: [live]
+    assert await sweeper.sweep() == 1
+
+    async with AsyncSessionLocal() as db:
+        rows = {
+            conversation_id: await db.get(Conversation, conversation_id)
+            for conversation_id in (crashed, fresh, live, finished)
+        }
+    assert rows[crashed].status == ConversationStatus.ABORTED
+    assert rows[crashed].completed_at is not None
+    assert rows[crashed].assistant_response == "partial"
+    assert rows[fresh].status == ConversationStatus.IN_PROGRESS
+    assert rows[live].status == ConversationStatus.IN_PROGRESS
+    assert rows[live].checkpointed_at > datetime.utcnow() - timedelta(seconds=5)
+    assert rows[finished].status == ConversationStatus.COMPLETED
+
+
+@pytest.mark.anyio
+async def test_sweep_uses_the_in_progress_index():
+    await init_db()
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE conversations"):
+            statements.append((statement, parameters))
+
+    async with AsyncSessionLocal() as db:
+        engine = (await db.connection()).engine.sync_engine
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            await session_service.abort_stale_conversations(db, datetime.utcnow() - timedelta(hours=1))
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+        statement, parameters = statements[0]
+        plan = await (await db.connection()).exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        details = [row[-1] for row in plan.all()]
+        await db.rollback()
+
+    assert any("ix_conversations_in_progress_checkpoint" in detail for detail in details), details
@@ -0,0 +1,93 @@
+"""
+Tests for the Claude client pool
+"""
+import asyncio
+
+import pytest
+
+from app.services.client_pool import ClaudeClientPool, PooledClient, get_claude_options
+
+
+@pytest.mark.anyio
+async def test_send_raises_when_client_task_dies_mid_turn(tmp_path):
+    pooled = PooledClient("test", get_claude_options(str(tmp_path)))
+    await pooled.start()
+
+    received = []
+
+    async def consume():
+        async for message in pooled.send("hello"):
+            received.append(message)
+
+    consumer = asyncio.create_task(consume())
+    while not received:
+        await asyncio.sleep(0.01)
+
+    pooled._task.cancel()
+
+    with pytest.raises(RuntimeError, match="stopped"):
+        await asyncio.wait_for(consumer, timeout=5)
+    assert not pooled.alive
+
+
+@pytest.mark.anyio
+async def test_send_raises_for_turn_queued_behind_a_dying_turn(tmp_path):
+    pooled = PooledClient("test", get_claude_options(str(tmp_path)))
+    await pooled.start()
+
+    first = pooled.send("first")
+    await first.__anext__()
+    second = asyncio.create_task(pooled.send("second").__anext__())
+    await asyncio.sleep(0.01)
+
+    pooled._task.cancel()
+
+    with pytest.raises(RuntimeError, match="stopped"):
+        await asyncio.wait_for(second, timeout=5)
+    async def drain():
+        async for _ in first:
+            pass
+
+    with pytest.raises(RuntimeError, match="stopped"):
+        await asyncio.wait_for(drain(), timeout=5)
+
+
+@pytest.mark.anyio
+async def test_adopted_clients_count_against_the_pool_size(tmp_path):
+    pool = ClaudeClientPool()
+    pool.max_size = 1
+    options = get_claude_options(str(tmp_path))
+    async with pool.acquire("active", options):
+        pass
+
+    standby = PooledClient("standby", options)
+    await standby.start()
+    await pool.adopt("claimed", standby)
+
+    assert pool.stats()["size"] == 1
+    assert pool.evictions == 1
+    async with pool.acquire("claimed", options) as pooled:
+        assert pooled is standby
+    await pool.close()
+
+
+@pytest.mark.anyio
+async def test_client_is_replaced_when_the_resume_session_changes(tmp_path):
+    pool = ClaudeClientPool()
+    async with pool.acquire("session", get_claude_options(str(tmp_path))) as first:
+        async for _ in first.send("hello"):
+            pass
+    assert first.claude_session_id is not None
+
+    # The next turn resumes the session the client is already on
+    async with pool.acquire("session", get_claude_options(str(tmp_path), claude_session_id=first.claude_session_id)) as pooled:
+        assert pooled is first
+
+    # A replayed or cleared session needs a process started from that state
+    async with pool.acquire("session", get_claude_options(str(tmp_path), claude_session_id="replayed")) as pooled:
+        assert pooled is not first
+        assert pooled.claude_session_id == "replayed"
+    async with pool.acquire("session", get_claude_options(str(tmp_path))) as pooled:
+        assert pooled.claude_session_id is None
+    assert (pool.hits, pool.misses) == (1, 3)
+    await pool.close()
@@ -0,0 +1,64 @@
+"""
+Tests for merging stream deltas per time window
+"""
+import asyncio
+
+import pytest
+
+from app.services.coalesce import DeltaCoalescer, coalesce_events
+
+
+def text(content: str) -> dict:
+    return {"type": "text_delta", "content": content}
+
+
+def test_consecutive_deltas_merge_until_another_event():
+    coalescer = DeltaCoalescer(window_ms=1000, max_bytes=1000)
+    ready = []
+    for event in [text("Hel"), text("lo"), {"type": "tool_use", "name": "Read"}, text("!")]:
+        ready.extend(coalescer.push(event))
+    ready.extend(coalescer.flush())
+
+    assert ready == [text("Hello"), {"type": "tool_use", "name": "Read"}, text("!")]
+
+
+def test_delta_type_switch_flushes_the_batch():
+    coalescer = DeltaCoalescer(window_ms=1000, max_bytes=1000)
+    ready = coalescer.push(text("a")) + coalescer.push({"type": "tool_input_delta", "partial_json": "{"})
+    ready += coalescer.push({"type": "tool_input_delta", "partial_json": "}"}) + coalescer.flush()
+
+    assert ready == [text("a"), {"type": "tool_input_delta", "partial_json": "{}"}]
+
+
+def test_batch_is_flushed_once_it_reaches_max_bytes():
+    coalescer = DeltaCoalescer(window_ms=1000, max_bytes=4)
+    assert coalescer.push(text("ab")) == []
+    assert coalescer.push(text("cd")) == [text("abcd")]
+    assert coalescer.deadline is None
+
+
+@pytest.mark.anyio
+async def test_pending_batch_is_sent_when_the_window_expires_while_idle():
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def source():
+        while (event := await queue.get()) is not None:
+            yield event
+
+    received = []
+
+    async def consume():
+        async for event in coalesce_events(source(), DeltaCoalescer(window_ms=20, max_bytes=1000)):
+            received.append(event)
+
+    consumer = asyncio.create_task(consume())
+    queue.put_nowait(text("a"))
+    queue.put_nowait(text("b"))
+    await asyncio.sleep(0.1)
+    # Sent although the source has produced nothing since
+    assert received == [text("ab")]
+
+    queue.put_nowait(text("c"))
+    queue.put_nowait(None)
+    await asyncio.wait_for(consumer, 1)
+    assert received == [text("ab"), text("c")]
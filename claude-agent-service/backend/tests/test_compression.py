@@ -0,0 +1,81 @@
+"""
+Tests for response compression negotiation and per-event flushing
+"""
+import zlib
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.core.config import settings
+from app.utils import compression
+from app.utils.compression import JSONCompressionMiddleware, compress_stream, negotiate
+
+app = FastAPI()
+app.add_middleware(JSONCompressionMiddleware, minimum_size=100)
+
+
+@app.get("/small")
+async def small():
+    return {"ok": True}
+
+
+@app.get("/large")
+async def large():
+    return {"items": ["x" * 10] * 100}
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip;q=0.5, br;q=0.8", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("*", "br"),
+    ("gzip;q=0, br;q=0", None),
+    ("GZIP;q=bogus, deflate", None),
+])
+def test_negotiate_picks_the_best_accepted_encoding(header, expected, monkeypatch):
+    monkeypatch.setattr(compression, "ENCODINGS", ("br", "gzip"))
+    assert negotiate(header) == expected
+
+
+def test_negotiate_without_brotli_falls_back_to_gzip(monkeypatch):
+    monkeypatch.setattr(compression, "ENCODINGS", ("gzip",))
+    assert negotiate("br, gzip;q=0.1") == "gzip"
+    assert negotiate("br") is None
+
+
+def test_compression_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "COMPRESSION_ENABLED", False)
+    assert negotiate("gzip, br") is None
+
+
+@pytest.mark.anyio
+async def test_every_streamed_chunk_decodes_on_arrival():
+    frames = [f"id: {event_id}\ndata: {{\"n\":{event_id}}}\n\n".encode() for event_id in range(1, 4)]
+
+    async def source():
+        for frame in frames:
+            yield frame
+
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    decoded = [decoder.decompress(chunk) async for chunk in compress_stream(source(), "gzip")]
+    assert decoded[:3] == frames
+    assert decoder.eof
+
+
+@pytest.mark.anyio
+async def test_only_large_json_responses_are_compressed():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/large", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert response.json() == {"items": ["x" * 10] * 100}
+
+        response = await client.get("/small", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+
+        response = await client.get("/large", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
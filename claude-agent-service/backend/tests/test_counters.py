@@ -0,0 +1,58 @@
+"""
+Tests for the maintained session and conversation counters
+"""
+import pytest
+from sqlalchemy import func, select
+
+from app.core.database import AsyncSessionLocal
+from app.models.counter import Counter
+from app.models.session import Session
+from app.services.counters import ACTIVE_SESSIONS, counter_service
+from app.services.session import session_service
+
+
+async def total(client) -> int:
+    return (await client.get("/api/sessions", params={"limit": 1})).json()["total"]
+
+
+@pytest.mark.anyio
+async def test_session_total_follows_creates_and_deletes(client):
+    before = await total(client)
+    created = [(await client.post("/api/sessions", json={})).json()["id"] for _ in range(3)]
+    assert await total(client) == before + 3
+
+    await client.delete(f"/api/sessions/{created[0]}")
+    assert await total(client) == before + 2
+
+
+@pytest.mark.anyio
+async def test_session_limit_is_enforced_by_the_counter(client, monkeypatch):
+    monkeypatch.setattr(session_service, "max_sessions", await total(client) + 1)
+
+    assert (await client.post("/api/sessions", json={})).status_code == 201
+    response = await client.post("/api/sessions", json={})
+    assert response.status_code == 400
+    assert "Maximum number of sessions" in response.json()["detail"]
+    assert await total(client) == session_service.max_sessions
+
+
+@pytest.mark.anyio
+async def test_missing_counter_is_seeded_from_a_count(client):
+    await client.post("/api/sessions", json={})
+    async with AsyncSessionLocal() as db:
+        await counter_service.discard(db, ACTIVE_SESSIONS)
+        await db.commit()
+        assert await db.scalar(select(Counter.value).where(Counter.name == ACTIVE_SESSIONS)) is None
+        expected = await db.scalar(select(func.count()).select_from(Session).where(Session.is_active == True))
+
+    assert await total(client) == expected
+
+
+@pytest.mark.anyio
+async def test_conversation_count_is_kept_per_session(client):
+    session_id = (await client.post("/api/sessions", json={})).json()["id"]
+    async with AsyncSessionLocal() as db:
+        for turn in range(3):
+            await session_service.create_conversation(db, session_id, f"turn {turn}")
+        await db.commit()
+        assert await session_service.count_conversations(db, session_id) == 3
@@ -0,0 +1,61 @@
+"""
+Tests for the event log record format and writer
+"""
+import pytest
+
+from app.services.event_log import EventLogWriter, encode_record, iter_records, read_event_log
+
+EVENTS = [
+    (1, {"type": "connected"}),
+    (2, {"type": "text_delta", "content": "héllo ✓"}),
+    (3, {"type": "tool_result", "content": [{"line": 1}], "is_error": False, "blob": None}),
+    (4, {"type": "done", "claude_session_id": "abc"}),
+]
+
+
+def test_records_round_trip():
+    buffer = b"".join(encode_record(event_id, data) for event_id, data in EVENTS)
+    assert list(iter_records(buffer)) == EVENTS
+
+
+def test_torn_record_at_the_end_is_ignored():
+    buffer = b"".join(encode_record(event_id, data) for event_id, data in EVENTS)
+    last = encode_record(5, {"type": "cancelled"})
+
+    for cut in (1, 4, len(last) - 1):
+        assert list(iter_records(buffer + last[:cut])) == EVENTS
+
+
+@pytest.mark.anyio
+async def test_writer_buffers_until_flushed(tmp_path):
+    path = tmp_path / "conv.events"
+    path.write_bytes(b"")
+    writer = EventLogWriter(path, flush_bytes=1 << 20, flush_interval=60)
+
+    for event_id, data in EVENTS[:2]:
+        await writer.append(event_id, data)
+    assert path.read_bytes() == b""
+
+    for event_id, data in EVENTS[2:]:
+        await writer.append(event_id, data)
+    await writer.flush()
+    assert list(read_event_log(str(path))) == EVENTS
+    assert writer.count == len(EVENTS)
+
+
+@pytest.mark.anyio
+async def test_writer_flushes_once_the_buffer_is_large(tmp_path):
+    path = tmp_path / "conv.events"
+    writer = EventLogWriter(path, flush_bytes=1, flush_interval=60)
+
+    await writer.append(*EVENTS[0])
+    assert list(read_event_log(str(path))) == EVENTS[:1]
+
+
+@pytest.mark.anyio
+async def test_write_failure_stops_the_log_without_raising(tmp_path):
+    writer = EventLogWriter(tmp_path / "missing" / "conv.events", flush_bytes=1, flush_interval=60)
+
+    await writer.append(*EVENTS[0])
+    await writer.append(*EVENTS[1])
+    assert writer.failed
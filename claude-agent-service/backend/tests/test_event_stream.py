@@ -0,0 +1,74 @@
+"""
+Tests for the batched Redis Stream writer
+"""
+import asyncio
+import json
+
+import fakeredis.aioredis
+import pytest
+
+from app.services.event_stream import EventStreamService
+
+
+@pytest.fixture
+def service():
+    service = EventStreamService()
+    service.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    return service
+
+
+@pytest.mark.anyio
+async def test_writer_records_every_event_in_order(service):
+    writer = service.writer("conv")
+    for event_id in range(1, 101):
+        writer.add(event_id, "text_delta", f"payload-{event_id}")
+        if event_id % 7 == 0:
+            await asyncio.sleep(0)
+    writer.add(101, "done", "payload-101")
+    await writer.close()
+
+    events = [event async for event in service.follow("conv", 0, block_ms=10)]
+    assert [event_id for event_id, _, _ in events] == list(range(1, 102))
+    assert events[-1] == (101, "done", "payload-101")
+    assert await service.redis.ttl(service._key("conv")) > 0
+
+
+@pytest.mark.anyio
+async def test_add_does_not_wait_for_redis(service):
+    written = asyncio.Event()
+    append_batch = service.append_batch
+
+    async def slow_append_batch(conversation_id, events):
+        await written.wait()
+        return await append_batch(conversation_id, events)
+
+    service.append_batch = slow_append_batch
+    writer = service.writer("conv")
+    for event_id in range(1, 4):
+        writer.add(event_id, "text_delta", "x")
+    assert not await service.redis.exists(service._key("conv"))
+
+    written.set()
+    await writer.close()
+    assert await service.redis.xlen(service._key("conv")) == 3
+
+
+@pytest.mark.anyio
+async def test_follow_reports_trimmed_events_as_a_gap(service):
+    writer = service.writer("conv")
+    for event_id in range(1, 11):
+        writer.add(event_id, "text_delta", f"payload-{event_id}")
+    writer.add(11, "done", "payload-11")
+    await writer.close()
+    await service.redis.xtrim(service._key("conv"), maxlen=5, approximate=False)
+
+    events = [event async for event in service.follow("conv", 2, block_ms=10)]
+    assert [(event_id, event_type) for event_id, event_type, _ in events[:2]] == [(6, "gap"), (7, "text_delta")]
+    assert json.loads(events[0][2]) == {
+        "type": "gap", "from_event_id": 3, "to_event_id": 6, "conversation_id": "conv"
+    }
+    assert [event_id for event_id, _, _ in events[1:]] == list(range(7, 12))
+
+    # Nothing is reported when the requested events are all still there
+    events = [event async for event in service.follow("conv", 6, block_ms=10)]
+    assert "gap" not in {event_type for _, event_type, _ in events}
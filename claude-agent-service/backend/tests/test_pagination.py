@@ -0,0 +1,54 @@
+"""
+Tests for keyset pagination of sessions and message history
+"""
+import httpx
+import pytest
+
+from app.core.database import AsyncSessionLocal
+from app.services.session import session_service
+
+
+async def walk(client: httpx.AsyncClient, url: str, items: str, limit: int) -> list[dict]:
+    """Every item of a paginated listing, following next_cursor"""
+    collected = []
+    response = (await client.get(url, params={"limit": limit})).json()
+    while True:
+        assert len(response[items]) <= limit
+        collected.extend(response[items])
+        if response["next_cursor"] is None:
+            return collected
+        response = (await client.get(url, params={"limit": limit, "cursor": response["next_cursor"]})).json()
+
+
+@pytest.mark.anyio
+async def test_session_pages_return_every_session_once_newest_first(client):
+    created = [(await client.post("/api/sessions", json={})).json()["id"] for _ in range(5)]
+
+    sessions = await walk(client, "/api/sessions", "sessions", limit=2)
+    ids = [session["id"] for session in sessions]
+    assert len(ids) == len(set(ids))
+    assert set(created) <= set(ids)
+    assert len(ids) == (await client.get("/api/sessions")).json()["total"]
+
+    keys = [(session["created_at"], session["id"]) for session in sessions]
+    assert keys == sorted(keys, reverse=True)
+
+
+@pytest.mark.anyio
+async def test_message_pages_follow_conversation_order(client):
+    session_id = (await client.post("/api/sessions", json={})).json()["id"]
+    async with AsyncSessionLocal() as db:
+        for turn in range(5):
+            await session_service.create_conversation(db, session_id, f"turn {turn}")
+        await db.commit()
+
+    url = f"/api/sessions/{session_id}/messages"
+    messages = await walk(client, url, "messages", limit=2)
+    assert [message["content"] for message in messages] == [f"turn {turn}" for turn in range(5)]
+    assert (await client.get(url)).json()["total"] == 10
+
+
+@pytest.mark.anyio
+async def test_malformed_cursor_is_rejected(client):
+    response = await client.get("/api/sessions", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
@@ -0,0 +1,58 @@
+"""
+Tests for replaying recorded runs into another workspace
+"""
+import json
+
+import fakeredis.aioredis
+import pytest
+
+from app.services.client_pool import claude_transcript_path
+from app.services.replay_cache import ReplayCache
+
+EVENTS = [
+    {"type": "connected"},
+    {"type": "system", "subtype": "init", "data": {"session_id": "recorded", "cwd": "/elsewhere"}},
+    {"type": "text_delta", "content": "Done."},
+    {"type": "result", "subtype": "success"},
+    {"type": "done", "claude_session_id": "recorded"},
+]
+
+
+@pytest.fixture
+def cache():
+    cache = ReplayCache()
+    cache.enabled = True
+    cache.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    return cache
+
+
+async def record(cache: ReplayCache, workspace) -> dict:
+    recording = await cache.prepare(str(workspace), "hello", "acceptEdits", None, None)
+    for event in EVENTS:
+        recording.add(event)
+    await cache.store(recording, "Done.", [])
+    return await cache.lookup(await cache.prepare(str(workspace), "hello", "acceptEdits", None, None))
+
+
+@pytest.mark.anyio
+async def test_replay_skips_init_and_restores_the_session(cache, tmp_path):
+    original, replaying = tmp_path / "original", tmp_path / "replaying"
+    original.mkdir()
+    replaying.mkdir()
+    transcript = claude_transcript_path(str(original), "recorded")
+    transcript.parent.mkdir(parents=True)
+    transcript.write_text(json.dumps({"type": "user", "sessionId": "recorded", "cwd": str(original)}) + "\n")
+
+    entry = await record(cache, original)
+    assert [event["type"] for event in entry["events"]] == ["text_delta", "result"]
+
+    assert await cache.restore_session(str(replaying), entry) == "recorded"
+    restored = claude_transcript_path(str(replaying), "recorded").read_text()
+    assert json.loads(restored)["cwd"] == str(replaying)
+
+
+@pytest.mark.anyio
+async def test_run_without_transcript_is_not_cached(cache, tmp_path):
+    assert await record(cache, tmp_path) is None
+    assert cache.stores == 0
+    assert cache.skipped == 1
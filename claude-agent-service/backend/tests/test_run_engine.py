@@ -0,0 +1,79 @@
+"""
+Tests for per-subscriber event filtering
+"""
+import fakeredis.aioredis
+import pytest
+
+from app.schemas.chat import ChatRequest, EventSubscription
+from app.services.event_stream import event_stream_service
+from app.services.run_engine import AgentRun, RunEngine
+from app.services.run_scheduler import RunTicket
+
+EVENTS = [
+    {"type": "connected"},
+    {"type": "system", "subtype": "init"},
+    {"type": "text_delta", "content": "Hi"},
+    {"type": "stream_event", "event": {}},
+    {"type": "result", "subtype": "success"},
+    {"type": "done", "claude_session_id": "abc"},
+]
+
+
+def make_run(events=None) -> AgentRun:
+    request = ChatRequest(message="hello", events=events)
+    return AgentRun("session", "conv", "/tmp", None, request, RunTicket("session", 1))
+
+
+async def drain(subscription) -> list[str]:
+    return [event.type async for event in subscription]
+
+
+@pytest.fixture
+def redis():
+    previous = event_stream_service.redis
+    event_stream_service.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    yield event_stream_service.redis
+    event_stream_service.redis = previous
+
+
+@pytest.mark.anyio
+async def test_requester_profile_does_not_narrow_the_run(redis):
+    run = make_run(EventSubscription(profile="minimal"))
+    run.stream = event_stream_service.writer(run.conversation_id)
+
+    minimal = run.subscribe(event_types=run.request.event_types())
+    observer = run.subscribe()
+    for data in EVENTS:
+        await run._publish(data)
+    run.finished = True
+    minimal.close()
+    observer.close()
+    await run.stream.close()
+
+    everything = [data["type"] for data in EVENTS]
+    assert await drain(minimal) == ["text_delta", "result", "done"]
+    assert await drain(observer) == everything
+    assert [event.type for event in run.recent] == everything
+
+    recorded = [event async for event in event_stream_service.follow(run.conversation_id, 0, block_ms=10)]
+    assert [event_type for _, event_type, _ in recorded] == everything
+
+
+@pytest.mark.anyio
+async def test_resume_from_stream_applies_the_filter(redis):
+    writer = event_stream_service.writer("conv")
+    for event_id, data in enumerate(EVENTS, start=1):
+        writer.add(event_id, data["type"], "{}")
+    await writer.close()
+
+    engine = RunEngine()
+    ui = EventSubscription(profile="ui").event_types()
+    ids = [event_id async for event_id, _ in engine.events("conv", 0, ui)]
+    assert ids == [1, 3, 5, 6]
+    assert len([event_id async for event_id, _ in engine.events("conv", 0)]) == len(EVENTS)
+
+
+def test_full_profile_means_no_filter():
+    assert make_run().request.event_types() is None
+    assert make_run(EventSubscription(profile="full")).request.event_types() is None
+    assert "done" in make_run(EventSubscription(include=["text_delta"])).request.event_types()
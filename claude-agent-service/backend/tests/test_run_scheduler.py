@@ -0,0 +1,45 @@
+"""
+Tests for run admission order and queue positions
+"""
+import pytest
+
+from app.core.metrics import RUN_QUEUE_WAIT_SECONDS
+from app.services.run_scheduler import RunScheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = RunScheduler()
+    scheduler.max_concurrent = 1
+    return scheduler
+
+
+def admitted_count() -> int:
+    return sum(value for name, _, value in RUN_QUEUE_WAIT_SECONDS.samples() if name.endswith("_count"))
+
+
+@pytest.mark.anyio
+async def test_positions_follow_round_robin_admission(scheduler):
+    running = scheduler.enqueue("busy")
+    tickets = [scheduler.enqueue(session_id) for session_id in ("a", "a", "a", "b", "c")]
+    by_name = dict(zip(["a1", "a2", "a3", "b1", "c1"], tickets))
+
+    positions = {name: scheduler.position(ticket) for name, ticket in by_name.items()}
+    assert positions == {"a1": 1, "b1": 2, "c1": 3, "a2": 4, "a3": 5}
+
+    order = []
+    current = running
+    for _ in tickets:
+        scheduler.release(current)
+        current = next(ticket for ticket in tickets if ticket.granted.is_set() and not ticket.released)
+        order.append(next(name for name, ticket in by_name.items() if ticket is current))
+    assert order == sorted(positions, key=positions.get)
+
+
+@pytest.mark.anyio
+async def test_admissions_are_recorded_in_the_wait_histogram(scheduler):
+    before = admitted_count()
+    first = scheduler.enqueue("a")
+    scheduler.enqueue("b")
+    scheduler.release(first)
+    assert admitted_count() == before + 2
@@ -0,0 +1,76 @@
+"""
+Tests for the sessions API
+"""
+import pytest
+
+from app.core.database import AsyncSessionLocal
+from app.models.session import Session
+from app.services.cache import cache_service
+from app.services.session import session_service
+
+
+@pytest.mark.anyio
+async def test_delete_invalidates_the_cache_after_commit(client, monkeypatch):
+    session_id = (await client.post("/api/sessions", json={})).json()["id"]
+    assert (await client.get(f"/api/sessions/{session_id}")).status_code == 200
+
+    visible_at_invalidation = []
+    delete_session_info = cache_service.delete_session_info
+
+    async def spy(deleted_id):
+        async with AsyncSessionLocal() as other:
+            visible_at_invalidation.append(await other.get(Session, deleted_id) is not None)
+        return await delete_session_info(deleted_id)
+
+    monkeypatch.setattr(cache_service, "delete_session_info", spy)
+
+    assert (await client.delete(f"/api/sessions/{session_id}")).status_code == 200
+    assert visible_at_invalidation == [False]
+    assert await cache_service.get_session_info(session_id) is None
+    assert (await client.get(f"/api/sessions/{session_id}")).status_code == 404
+
+
+@pytest.fixture
+def cached(monkeypatch):
+    """Session IDs written to the session cache"""
+    written = []
+    set_session_info = cache_service.set_session_info
+
+    async def spy(session_id, info, ttl=None):
+        written.append(session_id)
+        return await set_session_info(session_id, info, ttl)
+
+    monkeypatch.setattr(cache_service, "set_session_info", spy)
+    return written
+
+
+async def fail_commit():
+    raise RuntimeError("commit failed")
+
+
+@pytest.mark.anyio
+async def test_session_is_cached_only_once_created(client, cached):
+    async with AsyncSessionLocal() as db:
+        db.commit = fail_commit
+        with pytest.raises(RuntimeError):
+            await session_service.create_session(db)
+    assert cached == []
+
+    async with AsyncSessionLocal() as db:
+        session = await session_service.create_session(db)
+    assert cached == [session.id]
+
+
+@pytest.mark.anyio
+async def test_claude_session_id_is_cached_only_once_saved(client, cached):
+    session_id = (await client.post("/api/sessions", json={})).json()["id"]
+    cached.clear()
+
+    async with AsyncSessionLocal() as db:
+        db.commit = fail_commit
+        with pytest.raises(RuntimeError):
+            await session_service.update_session_activity(db, session_id, claude_session_id="never-saved")
+    assert cached == []
+    async with AsyncSessionLocal() as db:
+        info = await session_service.get_session_info(db, session_id)
+    assert info.claude_session_id is None
@@ -0,0 +1,36 @@
+"""
+Tests for sweeping standby workspaces at startup
+"""
+import json
+import socket
+import subprocess
+import sys
+
+from app.services.standby_pool import STANDBY_MARKER, StandbyPool
+from app.services.workspace import workspace_service
+
+
+def make_workspace(name: str, marker: str):
+    path = workspace_service.workspace_root / name
+    path.mkdir(parents=True)
+    (path / STANDBY_MARKER).write_text(marker)
+    return path
+
+
+def test_sweep_keeps_workspaces_of_live_workers():
+    exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    dead_pid = int(exited.stdout)
+
+    pool = StandbyPool()
+    # Held by a running worker (this process)
+    live = make_workspace("standby-live", json.dumps(StandbyPool().owner))
+    other_host = make_workspace("standby-other-host", json.dumps({"host": socket.gethostname() + "-x", "pid": 1}))
+    dead = make_workspace("standby-dead", json.dumps({"host": socket.gethostname(), "pid": dead_pid}))
+    legacy = make_workspace("standby-legacy", "")
+
+    pool._sweep_stale_workspaces()
+
+    assert live.exists()
+    assert other_host.exists()
+    assert not dead.exists()
+    assert not legacy.exists()
@@ -34,6 +34,13 @@ echo ""
 echo "New tables/columns added:"
 echo "  • sessions.claude_session_id"
 echo "  • conversations.tool_calls (JSON)"
+echo "  • conversations.status"
+echo "  • sessions.run_fence"
+echo "  • conversations.event_log, conversations.event_count"
+echo "  • counters (maintained session and conversation counts)"
+echo "  • indexes conversations(session_id, created_at), sessions(is_active, created_at)"
+echo "  • conversations.checkpointed_at"
+echo "  • partial index on in-progress conversations"
 echo ""
 echo "You can now restart the backend:"
 echo "  docker-compose restart backend"